@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Attachment Index for extracted document ZIPs (used by rex_submission)
+Author: Izaz Ahamed
+------------------------------------------------------------
+✅ One walk of the extracted folder (subfolders included), then O(1) lookups
+   by (invoice number, document type)
+✅ Document type read from the file name: commercial-invoice / invoice / inv / ci,
+   bill-of-lading / bol / bl / obl
+✅ Invoice numbers compared without case, spaces or punctuation
+   (INV-2025/01, inv 2025 01 and INV202501 are the same key)
+✅ Fuzzy fallback for odd names: the invoice number as a run of whole tokens
+   of a typed name (never part of a token: 5001 does not match 2025_001);
+   several such files raise AmbiguousAttachment. Then the legacy "invoice and
+   type anywhere in the name" rule, with the same boundary and ambiguity checks
+"""
+
+import os, re, time, logging
+
+logger = logging.getLogger("AttachmentIndex")
+
+# Multi-word spellings, matched on the squashed name first
+DOC_TYPE_PHRASES = {
+    "invoice": ("commercialinvoice",),
+    "bol": ("billoflading", "billofloading"),
+}
+DOC_TYPE_ALIASES = {
+    "invoice": ("invoice", "cinvoice"),
+    "bol": ("bol", "bl", "obl", "hbl", "mbl"),
+}
+# Only trusted when no other type is named: "INV" is also a common invoice-number prefix
+WEAK_ALIASES = {
+    "invoice": ("inv", "ci"),
+}
+ATTACHMENT_EXTENSIONS = (".pdf",)
+
+
+class AmbiguousAttachment(LookupError):
+    """More than one file could be the attachment; none is picked"""
+
+
+def squash(text):
+    """Upper-case alphanumerics only: "inv-2025/01 " → "INV202501" """
+    return re.sub(r"[^A-Za-z0-9]", "", str(text or "")).upper()
+
+
+def _doc_type(tokens, squashed):
+    """(document type, positions of the tokens that named it) for a tokenised file stem;
+    phrases win over single-word aliases, which win over weak aliases"""
+    for doc_type, phrases in DOC_TYPE_PHRASES.items():
+        if any(p.upper() in squashed for p in phrases):
+            return doc_type, []
+    for aliases in (DOC_TYPE_ALIASES, WEAK_ALIASES):
+        for doc_type, names in aliases.items():
+            hits = [i for i, t in enumerate(tokens) if t.lower() in names]
+            if hits:
+                return doc_type, hits
+    return None, []
+
+
+def _tokens(text):
+    return [t.upper() for t in re.split(r"[^A-Za-z0-9]+", str(text or "")) if t]
+
+
+def _has_token_run(tokens, key):
+    """True if some contiguous run of whole tokens spells key ("INV", "2025", "01" → INV202501)"""
+    for start in range(len(tokens)):
+        run = ""
+        for token in tokens[start:]:
+            run += token
+            if run == key:
+                return True
+            if not key.startswith(run):
+                break
+    return False
+
+
+def _contains_whole(name, needle):
+    """needle in name, not continuing a neighbouring number or word
+    ("1" is not in "A12", but "2025001" is in "2025001bol")"""
+    for m in re.finditer(re.escape(needle), name):
+        before = name[m.start() - 1] if m.start() else ""
+        after = name[m.end()] if m.end() < len(name) else ""
+        if (before.isdigit() and needle[0].isdigit()) or (before.isalpha() and needle[0].isalpha()):
+            continue
+        if (after.isdigit() and needle[-1].isdigit()) or (after.isalpha() and needle[-1].isalpha()):
+            continue
+        return True
+    return False
+
+
+def _invoice_keys(tokens, squashed, doc_type, positions):
+    """Candidate invoice keys of a typed file name: the name minus one type token
+    (or minus the type phrase)"""
+    if positions:
+        return [squash("".join(tokens[:i] + tokens[i + 1:])) for i in positions]
+    key = squashed
+    for p in DOC_TYPE_PHRASES[doc_type]:
+        key = key.replace(p.upper(), "")
+    return [key]
+
+
+class AttachmentIndex:
+    def __init__(self, root, log=None):
+        self.root = os.path.abspath(root)
+        self.log = log or logger
+        self.exact = {}           # (invoice key, doc type) -> path
+        self.by_type = {}         # doc type -> [(stem tokens, path)]
+        self.files = []           # [(file name, path)] for the legacy fallback
+        self.ambiguous = 0
+        started = time.time()
+        self._build()
+        self.build_ms = (time.time() - started) * 1000
+        self.log.info(f"🗂️ Indexed {len(self.files)} attachment(s) in {self.build_ms:.0f}ms "
+                      f"({len(self.exact)} invoice/document pair(s))")
+
+    def _build(self):
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in sorted(filenames):
+                stem, ext = os.path.splitext(name)
+                if ext.lower() not in ATTACHMENT_EXTENSIONS or name.startswith("."):
+                    continue
+                path = os.path.join(dirpath, name)
+                self.files.append((name, path))
+                tokens = [t for t in re.split(r"[^A-Za-z0-9]+", stem) if t]
+                squashed = squash(stem)
+                doc_type, positions = _doc_type(tokens, squashed)
+                if doc_type is None:
+                    continue
+                self.by_type.setdefault(doc_type, []).append((_tokens(stem), path))
+                for key in _invoice_keys(tokens, squashed, doc_type, positions):
+                    if not key:
+                        continue
+                    known = self.exact.setdefault((key, doc_type), path)
+                    if known != path:
+                        self.ambiguous += 1
+                        self.log.warning(f"⚠️ Two {doc_type} files for {key}: keeping "
+                                         f"{os.path.basename(known)}, ignoring {name}")
+
+    def find(self, invoice_no, doc_type):
+        """Absolute path of the attachment, or None; raises AmbiguousAttachment when the
+        fuzzy step finds several files"""
+        key = squash(invoice_no)
+        if not key:
+            return None
+        path = self.exact.get((key, doc_type))
+        if path:
+            return path
+
+        # Fuzzy: the invoice number inside a typed name with extra words (dates, shipper codes, ...)
+        candidates = [p for tokens, p in self.by_type.get(doc_type, []) if _has_token_run(tokens, key)]
+        if len(candidates) > 1:
+            names = ", ".join(sorted(os.path.basename(p) for p in candidates))
+            raise AmbiguousAttachment(f"{len(candidates)} {doc_type} files match {invoice_no}: {names}")
+        if candidates:
+            return candidates[0]
+
+        # Legacy rule: invoice number and type name anywhere in the file name
+        candidates = [p for name, p in self.files
+                      if _contains_whole(name, str(invoice_no)) and doc_type.lower() in name.lower()]
+        if len(candidates) > 1:
+            names = ", ".join(sorted(os.path.basename(p) for p in candidates))
+            raise AmbiguousAttachment(f"{len(candidates)} {doc_type} files name {invoice_no}: {names}")
+        return candidates[0] if candidates else None
+
+    def __len__(self):
+        return len(self.files)
@@ -7,75 +7,95 @@ Platform: Smart Process Flow
 ------------------------------------------------------------
 ✅ Logs into https://exp.bb.org.bd/ords/f?p=112
 ✅ Reads records from CSV (ADSCODE2, EXP_SERIAL2, EXP_YEAR2)
-✅ Downloads EXP PDFs directly from iframe links
-✅ Merges all downloaded PDFs into a single combined file
+✅ Downloads EXP PDFs directly from iframe links (background, session-authenticated)
+✅ Appends each downloaded PDF to the combined file as soon as it lands
+✅ Persistent lookup cache per portal login — repeated EXPs skip the portal (--no-cache to bypass)
+✅ Row checkpoint journal — a restarted job resumes where it stopped
+✅ Soft reset + re-login when a row leaves the browser unusable, periodic recycling
+✅ Encrypted session vault — a still-valid portal session from an earlier job is
+   reused and the interactive login skipped
+✅ --test-only: one real login and nothing else (credential check in seconds)
+✅ Portal circuit breaker: while exp.bb.org.bd is down, remaining rows fail at once
+   and an unreachable portal exits 3 instead of reporting bad credentials
 ✅ Compatible with headless VPS (no GUI required)
 ✅ Includes automatic recovery on failures
 ------------------------------------------------------------
 """
 
-import os, sys, time, csv, logging, urllib.request
-import undetected_chromedriver as uc
+import os, sys, time, csv, logging
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
-from PyPDF2 import PdfMerger
+
+from browser_pool import get_pool, DriverHealth
+from circuit_breaker import CircuitBreaker, EXIT_PORTAL_DOWN
+from form_fill import FormFiller, FormFillStats
+from job_journal import JobJournal, row_key
+from lookup_cache import LookupCache, owner_key, CACHE_BYPASS
+from pdf_downloader import SessionDownloader
+from progress import JobProgress
+from rate_governor import RateGovernor
+from session_vault import SessionVault, resume as resume_session, save as save_session
+from report_writer import StreamingPdfReport
+from wait_engine import WaitEngine
 
 # ---------------------------------------------------------------------
-# ARGUMENTS
+# CONFIGURATION (set per job by configure())
 # ---------------------------------------------------------------------
-if len(sys.argv) < 6:
-    print("❌ Usage: python3 bb_exp_search.py <input_csv> <output_dir> <job_id> <username> <password> [--fast-mode]")
-    sys.exit(1)
+BASE_URL = "https://exp.bb.org.bd/ords/f?p=112"
+USAGE = ("❌ Usage: python3 bb_exp_search.py <input_csv> <output_dir> <job_id> <username> <password> "
+         "[--fast-mode] [--no-cache] [--test-only] [--spf-user=<id>]")
+LOGGED_IN_MARKER = (By.PARTIAL_LINK_TEXT, "Transaction")
+# APEX shows a rejected login in the page's alert region (Universal Theme) or error div (legacy themes)
+LOGIN_ERROR_MARKER = (By.CSS_SELECTOR, "#t_Alert_Notification, .t-Alert--warning, .htmldbStdErr, .htmldbUlErr")
 
-CSV_FILE = sys.argv[1]
-OUTPUT_DIR = sys.argv[2]
-JOB_ID = sys.argv[3]
-USERNAME = sys.argv[4]
-PASSWORD = sys.argv[5]
-FAST_MODE = "--fast-mode" in sys.argv
+CSV_FILE = OUTPUT_DIR = JOB_ID = USERNAME = PASSWORD = SPF_USER = None
+FAST_MODE = False
+NO_CACHE = CACHE_BYPASS
+DOWNLOAD_DIR = COMBINED_PDF = None
+DOWNLOADER = None
+REPORT = None
+WAITS = None
+CACHE = None
+JOURNAL = None
+HEALTH = None
+PROGRESS = None
+FORM_STATS = FormFillStats()
+VAULT = None
+BREAKER = None
 
-BASE_URL = "https://exp.bb.org.bd/ords/f?p=112"
-DOWNLOAD_DIR = os.path.join(OUTPUT_DIR, "downloads")
-COMBINED_PDF = os.path.join(DOWNLOAD_DIR, f"EXP_Combined_{JOB_ID}.pdf")
+def configure(csv_file, output_dir, job_id, username, password, fast_mode=False, no_cache=CACHE_BYPASS,
+              spf_user=None):
+    """Bind job arguments and (re)initialise logging for this job"""
+    global CSV_FILE, OUTPUT_DIR, JOB_ID, USERNAME, PASSWORD, FAST_MODE, NO_CACHE, DOWNLOAD_DIR, COMBINED_PDF
+    global SPF_USER
+    CSV_FILE, OUTPUT_DIR, JOB_ID, SPF_USER = csv_file, output_dir, job_id, spf_user
+    USERNAME, PASSWORD, FAST_MODE, NO_CACHE = username, password, fast_mode, no_cache
+    DOWNLOAD_DIR = os.path.join(OUTPUT_DIR, "downloads")
+    COMBINED_PDF = os.path.join(DOWNLOAD_DIR, f"EXP_Combined_{JOB_ID}.pdf")
 
-# ---------------------------------------------------------------------
-# LOGGING SETUP
-# ---------------------------------------------------------------------
-os.makedirs(DOWNLOAD_DIR, exist_ok=True)
-log_file = os.path.join(OUTPUT_DIR, f"exp_download_{JOB_ID}.log")
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    handlers=[logging.FileHandler(log_file), logging.StreamHandler(sys.stdout)]
-)
+    os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+    log_file = os.path.join(OUTPUT_DIR, f"exp_download_{JOB_ID}.log")
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(message)s",
+        handlers=[logging.FileHandler(log_file), logging.StreamHandler(sys.stdout)],
+        force=True
+    )
 
-logging.info("🚀 Starting Bangladesh Bank EXP automation")
-logging.info(f"📁 Input CSV: {CSV_FILE}")
-logging.info(f"📂 Output Directory: {OUTPUT_DIR}")
-logging.info(f"🆔 Job ID: {JOB_ID}")
-logging.info(f"👤 Username: {USERNAME}")
-logging.info(f"⚙️ Fast Mode: {'ON' if FAST_MODE else 'OFF'}")
+    logging.info("🚀 Starting Bangladesh Bank EXP automation")
+    logging.info(f"📁 Input CSV: {CSV_FILE}")
+    logging.info(f"📂 Output Directory: {OUTPUT_DIR}")
+    logging.info(f"🆔 Job ID: {JOB_ID}")
+    logging.info(f"👤 Username: {USERNAME}")
+    logging.info(f"⚙️ Fast Mode: {'ON' if FAST_MODE else 'OFF'}")
 
 # ---------------------------------------------------------------------
 # BROWSER SETUP
 # ---------------------------------------------------------------------
 def get_browser():
-    options = uc.ChromeOptions()
-    options.add_argument("--headless=new")
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    options.add_argument("--disable-gpu")
-    options.add_argument("--disable-quic")
-    options.add_argument("--disable-http2")
-    options.add_argument("--disable-ipv6")
-    options.add_argument("--window-size=1366,768")
-    prefs = {"download.default_directory": DOWNLOAD_DIR}
-    options.add_experimental_option("prefs", prefs)
-    driver = uc.Chrome(options=options)
-    driver.set_page_load_timeout(60)
-    return driver
+    return get_pool().lease("bb_exp", download_dir=DOWNLOAD_DIR)
 
 # ---------------------------------------------------------------------
 # SCREENSHOT HELPER
@@ -91,28 +111,98 @@ def save_screenshot(driver, name):
 # ---------------------------------------------------------------------
 # LOGIN
 # ---------------------------------------------------------------------
-def login(driver):
+def login_attempt(driver):
+    """One interactive login: True when logged in, False when the portal answered with its
+    login error. Raises TimeoutException when it shows neither in time (slow or hung portal,
+    credentials not checked) and if the login page itself does not load."""
+    driver.get(BASE_URL)
+    WebDriverWait(driver, 20).until(EC.presence_of_element_located((By.ID, "P101_USERNAME")))
+
+    driver.find_element(By.ID, "P101_USERNAME").send_keys(USERNAME)
+    driver.find_element(By.ID, "P101_PASSWORD").send_keys(PASSWORD)
+    driver.find_element(By.LINK_TEXT, "Login").click()
+
+    try:
+        WebDriverWait(driver, 25).until(
+            lambda d: d.find_elements(*LOGGED_IN_MARKER) or d.find_elements(*LOGIN_ERROR_MARKER))
+    except TimeoutException:
+        raise TimeoutException("no answer to the login within 25s")
+    return bool(driver.find_elements(*LOGGED_IN_MARKER))
+
+def login(driver, exit_on_failure=True, use_vault=True):
+    if use_vault and VAULT and resume_session(VAULT, driver, "bb_exp", LOGGED_IN_MARKER,
+                                              http_marker=LOGGED_IN_MARKER[1]):
+        return True
+    rejected = False
     for attempt in range(3):
         try:
             logging.info(f"🔐 Attempting login ({attempt+1}/3)...")
-            driver.get(BASE_URL)
-            WebDriverWait(driver, 20).until(EC.presence_of_element_located((By.ID, "P101_USERNAME")))
-
-            driver.find_element(By.ID, "P101_USERNAME").send_keys(USERNAME)
-            driver.find_element(By.ID, "P101_PASSWORD").send_keys(PASSWORD)
-            driver.find_element(By.LINK_TEXT, "Login").click()
-
-            WebDriverWait(driver, 25).until(EC.presence_of_element_located((By.PARTIAL_LINK_TEXT, "Transaction")))
+            rejected = False
+            if not login_attempt(driver):
+                rejected = True
+                raise RuntimeError("the portal rejected the credentials")
             logging.info("✅ Login successful.")
+            if VAULT:
+                save_session(VAULT, driver, "bb_exp")
             return True
 
         except Exception as e:
             save_screenshot(driver, f"error_login_fail_{attempt+1}")
             logging.warning(f"⚠️ Login attempt {attempt+1} failed: {e}")
+            if BREAKER:
+                BREAKER.record(False)
             time.sleep(5)
     logging.error("❌ All login attempts failed.")
+    if not exit_on_failure:
+        return False
+    if BREAKER and BREAKER.is_open():
+        logging.error("❌ Portal unreachable — credentials were not checked")
+        sys.exit(EXIT_PORTAL_DOWN)
+    if not rejected:
+        logging.error("❌ Portal did not answer the login — credentials were not checked")
+        sys.exit(1)
     sys.exit(2)
 
+def probe_login():
+    """--test-only: a single real login, no search page and no CSV.
+    Exit code 0 = credentials work, 2 = rejected by the portal, 1 = no answer in time,
+    EXIT_PORTAL_DOWN = portal unreachable (1, 3: credentials not checked)."""
+    global VAULT, BREAKER
+    VAULT = SessionVault(SPF_USER, USERNAME, PASSWORD, log=logging.getLogger())
+    BREAKER = CircuitBreaker.for_url(BASE_URL, log=logging.getLogger())
+    driver = None
+    started = time.time()
+    try:
+        if BREAKER.is_open():
+            logging.error("❌ Portal unreachable (circuit open) — credentials were not checked")
+            print("CONNECTION error: portal unreachable, credentials not checked", file=sys.stderr)
+            return EXIT_PORTAL_DOWN
+        driver = get_browser()
+        try:
+            ok = login_attempt(driver)
+        except Exception as e:
+            if BREAKER.record(False) or BREAKER.is_open():
+                logging.error(f"❌ Portal unreachable — credentials were not checked: {e}")
+                print(f"CONNECTION error: {e}", file=sys.stderr)
+                return EXIT_PORTAL_DOWN
+            logging.error(f"❌ No answer from the portal ({time.time() - started:.1f}s) — "
+                          f"credentials were not checked: {e}")
+            print(f"Login timeout: {e}" if isinstance(e, TimeoutException) else f"CONNECTION error: {e}",
+                  file=sys.stderr)
+            return 1
+        if not ok:
+            logging.error(f"❌ Credentials rejected ({time.time() - started:.1f}s)")
+            return 2
+        BREAKER.record(True)
+        logging.info(f"✅ Credentials valid ({time.time() - started:.1f}s)")
+        # The next real job starts from this session instead of logging in again
+        save_session(VAULT, driver, "bb_exp")
+        return 0
+    finally:
+        if driver:
+            get_pool().release(driver)
+        VAULT = BREAKER = None
+
 # ---------------------------------------------------------------------
 # OPEN SEARCH PAGE
 # ---------------------------------------------------------------------
@@ -126,15 +216,14 @@ def open_search_page(driver):
 # ---------------------------------------------------------------------
 # PROCESS SINGLE EXP ENTRY
 # ---------------------------------------------------------------------
-def process_exp(driver, adscode, exp_serial, exp_year):
+def process_exp(driver, adscode, exp_serial, exp_year, index=None):
     try:
         WebDriverWait(driver, 25).until(EC.presence_of_element_located((By.ID, "P92_ADSCODE2")))
-        for f_id in ["P92_ADSCODE2", "P92_EXP_SERIAL2", "P92_EXP_YEAR2"]:
-            driver.find_element(By.ID, f_id).clear()
-
-        driver.find_element(By.ID, "P92_ADSCODE2").send_keys(adscode)
-        driver.find_element(By.ID, "P92_EXP_SERIAL2").send_keys(exp_serial)
-        driver.find_element(By.ID, "P92_EXP_YEAR2").send_keys(exp_year)
+        FormFiller(driver, FORM_STATS).fill({
+            "P92_ADSCODE2": adscode,
+            "P92_EXP_SERIAL2": exp_serial,
+            "P92_EXP_YEAR2": exp_year,
+        })
         driver.find_element(By.LINK_TEXT, "Search").click()
 
         WebDriverWait(driver, 25).until(EC.presence_of_element_located((By.LINK_TEXT, "Print EXP")))
@@ -142,9 +231,9 @@ def process_exp(driver, adscode, exp_serial, exp_year):
         logging.info(f"🖨️ Opening Print EXP for {adscode}-{exp_serial}-{exp_year}")
 
         # Wait for iframe with direct PDF
-        time.sleep(3)
-        iframe = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.XPATH, "//iframe[contains(@src, 'PRINT_REPORT')]"))
+        iframe = WAITS.until(
+            EC.presence_of_element_located((By.XPATH, "//iframe[contains(@src, 'PRINT_REPORT')]")),
+            "print iframe", replaces=3, timeout=13
         )
         pdf_url = iframe.get_attribute("src")
         if not pdf_url.startswith("http"):
@@ -153,8 +242,10 @@ def process_exp(driver, adscode, exp_serial, exp_year):
         logging.info(f"🔗 Direct PDF link: {pdf_url}")
 
         pdf_filename = os.path.join(DOWNLOAD_DIR, f"EXP_{adscode}_{exp_serial}_{exp_year}.pdf")
-        urllib.request.urlretrieve(pdf_url, pdf_filename)
-        logging.info(f"✅ Downloaded: {pdf_filename}")
+        future = DOWNLOADER.submit(pdf_url, pdf_filename, driver=driver)
+        record = (adscode, exp_serial, exp_year)
+        future.add_done_callback(lambda f: add_to_report(f, pdf_filename, index, record))
+        logging.info(f"📥 Download queued: {pdf_filename}")
 
         # Back to search page
         try:
@@ -167,63 +258,214 @@ def process_exp(driver, adscode, exp_serial, exp_year):
 
         WebDriverWait(driver, 20).until(EC.presence_of_element_located((By.ID, "P92_ADSCODE2")))
         logging.info(f"✅ Completed {adscode}-{exp_serial}-{exp_year}\n")
+        return True
 
     except Exception as e:
         save_screenshot(driver, f"fatal_{adscode}_{exp_serial}")
         logging.error(f"❌ Failed for {adscode}-{exp_serial}-{exp_year}: {e}")
+        if PROGRESS and index is not None:
+            PROGRESS.row_error(index, e)
         try:
             driver.get("https://exp.bb.org.bd/ords/f?p=112:92:::::")
             WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "P92_ADSCODE2")))
             logging.info("🔄 Recovered search page.")
         except Exception:
             pass
+        return False
+
+# ---------------------------------------------------------------------
+# BROWSER HEALTH
+# ---------------------------------------------------------------------
+def restore_session(driver):
+    """Log in again and reopen the search page on a reset or relaunched browser"""
+    global WAITS
+    WAITS = WaitEngine(driver, "bb_exp", WAITS.stats if WAITS else None)
+    if not login(driver, exit_on_failure=False):
+        raise RuntimeError("re-login failed")
+    open_search_page(driver)
+
+def on_search_page(driver):
+    try:
+        return bool(driver.find_elements(By.ID, "P92_ADSCODE2"))
+    except Exception:
+        return False
+
+def after_row(driver, ok):
+    """Escalate to a soft reset only when a failed row left no usable search page;
+    recycle the browser after N rows or high memory. Returns the (possibly new) driver"""
+    try:
+        if not ok and not on_search_page(driver):
+            HEALTH.recover()
+        HEALTH.row_done()
+    except Exception as e:
+        logging.error(f"❌ Browser recovery failed: {e}")
+    return HEALTH.driver
 
 # ---------------------------------------------------------------------
 # MERGE PDFs
 # ---------------------------------------------------------------------
+def add_to_report(future, pdf_filename, index, record=None):
+    """Download-complete callback: stream the PDF into the combined report, cache and journal"""
+    if future.exception() is not None:
+        if PROGRESS:
+            PROGRESS.row_error(index, future.exception())
+            PROGRESS.row_finished(index, key="-".join(record or ()))
+        return
+    if PROGRESS:
+        PROGRESS.row_finished(index, pdf_filename, key="-".join(record or ()))
+    if REPORT:
+        REPORT.append(pdf_filename, index)
+    if record:
+        if CACHE:
+            CACHE.store("bb_exp", owner_key(USERNAME, *record), pdf_filename, {"job_id": JOB_ID})
+        if JOURNAL:
+            JOURNAL.record(row_key(index, *record), [pdf_filename])
+
 def merge_pdfs():
-    pdfs = [os.path.join(DOWNLOAD_DIR, f) for f in os.listdir(DOWNLOAD_DIR) if f.lower().endswith(".pdf")]
-    if not pdfs:
+    if not REPORT or not REPORT.finalize():
         logging.warning("⚠️ No PDFs found to merge.")
-        return
-    merger = PdfMerger()
-    for f in sorted(pdfs):
-        merger.append(f)
-    merger.write(COMBINED_PDF)
-    merger.close()
+        return False
     logging.info(f"📄 Combined PDF created: {COMBINED_PDF}")
+    return True
+
+# ---------------------------------------------------------------------
+# INPUT + CACHE
+# ---------------------------------------------------------------------
+def read_records():
+    records = []
+    with open(CSV_FILE, newline='', encoding='utf-8') as csvfile:
+        for row in csv.DictReader(csvfile):
+            adscode = row.get("ADSCODE2", "").strip()
+            exp_serial = row.get("EXP_SERIAL2", "").strip()
+            exp_year = row.get("EXP_YEAR2", "").strip() or "2025"
+            if adscode and exp_serial:
+                records.append((adscode, exp_serial, exp_year))
+    return records
+
+def serve_known_rows(records):
+    """Skip rows done in an earlier run, link cache hits into the download folder;
+    returns [(index, record)] still to fetch"""
+    pending = []
+    for index, record in enumerate(records, 1):
+        adscode, exp_serial, exp_year = record
+        pdf_filename = os.path.join(DOWNLOAD_DIR, f"EXP_{adscode}_{exp_serial}_{exp_year}.pdf")
+        if JOURNAL.done(row_key(index, *record)):
+            logging.info(f"⏭️ Already done in earlier run: {adscode}-{exp_serial}-{exp_year}")
+            source = "resumed"
+        elif CACHE.link("bb_exp", owner_key(USERNAME, *record), pdf_filename):
+            JOURNAL.record(row_key(index, *record), [pdf_filename])
+            source = "cached"
+        else:
+            pending.append((index, record))
+            continue
+        PROGRESS.row_finished(index, pdf_filename, source=source, key="-".join(record))
+        REPORT.append(pdf_filename, index)
+    return pending
+
+def skip_row(index, record):
+    """Fail a row without touching the portal (circuit open)"""
+    PROGRESS.row_error(index, BREAKER.skip())
+    PROGRESS.row_finished(index, key="-".join(record))
 
 # ---------------------------------------------------------------------
 # MAIN
 # ---------------------------------------------------------------------
-def main():
+def run():
+    """Process the configured job, returns the process exit code"""
+    global DOWNLOADER, REPORT, WAITS, CACHE, JOURNAL, HEALTH, PROGRESS, FORM_STATS, VAULT, BREAKER
+    driver = WAITS = HEALTH = None
+    FORM_STATS = FormFillStats()
+    VAULT = SessionVault(SPF_USER, USERNAME, PASSWORD, log=logging.getLogger())
+    BREAKER = CircuitBreaker.for_url(BASE_URL, log=logging.getLogger())
     try:
-        driver = get_browser()
-        login(driver)
-        open_search_page(driver)
-
-        with open(CSV_FILE, newline='', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            count = 0
-            for row in reader:
-                adscode = row.get("ADSCODE2", "").strip()
-                exp_serial = row.get("EXP_SERIAL2", "").strip()
-                exp_year = row.get("EXP_YEAR2", "").strip() or "2025"
-                if not adscode or not exp_serial:
+        CACHE = LookupCache(bypass=NO_CACHE, log=logging.getLogger())
+        JOURNAL = JobJournal(OUTPUT_DIR, JOB_ID, log=logging.getLogger())
+        REPORT = StreamingPdfReport(COMBINED_PDF)
+        records = read_records()
+        PROGRESS = JobProgress(OUTPUT_DIR, total=len(records), job_id=JOB_ID)
+        pending = serve_known_rows(records)
+        count = len(records)
+
+        if pending and not BREAKER.ready():
+            for index, row in pending:
+                skip_row(index, row)
+            pending = []
+
+        if pending:
+            driver = get_browser()
+            WAITS = WaitEngine(driver, "bb_exp")
+            HEALTH = DriverHealth(driver, on_new_session=restore_session, log=logging.getLogger())
+            login(driver)
+            DOWNLOADER = SessionDownloader(driver, logger=logging.getLogger())
+            open_search_page(driver)
+
+            governor = RateGovernor.for_url(BASE_URL, log=logging.getLogger())
+            for index, (adscode, exp_serial, exp_year) in pending:
+                if not BREAKER.ready():
+                    skip_row(index, (adscode, exp_serial, exp_year))
                     continue
-                count += 1
-                process_exp(driver, adscode, exp_serial, exp_year)
+                governor.acquire()
+                PROGRESS.row_started(index, f"{adscode}-{exp_serial}-{exp_year}")
+                started = time.time()
+                ok = process_exp(driver, adscode, exp_serial, exp_year, index=index)
+                latency = time.time() - started
+                governor.report(latency, server_error=BREAKER.record(ok))
+                if not ok:
+                    PROGRESS.row_finished(index, key=f"{adscode}-{exp_serial}-{exp_year}")
+                driver = after_row(driver, ok)
 
-        driver.quit()
+            get_pool().release(driver)
+            driver = None
+            WAITS.stats.log_summary(logging.getLogger())
+            HEALTH.log_summary()
+            FORM_STATS.log_summary(logging.getLogger())
+            governor.log_summary()
+            BREAKER.log_summary()
+            progress = DOWNLOADER.wait_all()
+            logging.info(f"📥 Downloads finished: {progress['completed']}/{progress['total']} ok, {progress['failed']} failed")
+        CACHE.log_summary(logging.getLogger())
         logging.info(f"✅ All {count} EXP records processed. Now merging PDFs...")
-        merge_pdfs()
+        if merge_pdfs():
+            PROGRESS.artifact(COMBINED_PDF)
+        PROGRESS.finish(**BREAKER.summary())
+        if BREAKER.skipped and not PROGRESS.ok:
+            return EXIT_PORTAL_DOWN
         logging.info("🎉 Finished all operations successfully.")
-        sys.exit(0)
+        return 0
 
     except Exception as e:
         logging.error(f"❌ Fatal error in main: {e}")
-        sys.exit(1)
+        return 1
+    finally:
+        if DOWNLOADER:
+            DOWNLOADER.close()
+            DOWNLOADER = None
+        if REPORT:
+            REPORT.abort()
+            REPORT = None
+        if CACHE:
+            CACHE.close()
+            CACHE = None
+        if JOURNAL:
+            JOURNAL.close()
+            JOURNAL = None
+        PROGRESS = None
+        VAULT = BREAKER = None
+        if driver:
+            get_pool().release(driver, discard=True)
+
+def main(argv=None):
+    argv = sys.argv if argv is None else argv
+    if len(argv) < 6:
+        print(USAGE)
+        return 1
+    spf_user = next((a.split("=", 1)[1] for a in argv if a.startswith("--spf-user=")), None)
+    configure(argv[1], argv[2], argv[3], argv[4], argv[5], fast_mode="--fast-mode" in argv,
+              no_cache=CACHE_BYPASS or "--no-cache" in argv, spf_user=spf_user)
+    if "--test-only" in argv:
+        return probe_login()
+    return run()
 
 # ---------------------------------------------------------------------
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
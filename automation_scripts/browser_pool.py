@@ -0,0 +1,617 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Warm Chrome Pool (shared by all Smart Process Flow automation scripts)
+Author: Izaz Ahamed
+------------------------------------------------------------
+✅ Keeps pre-launched headless Chrome instances alive per portal
+✅ lease() / release() API — scripts never launch Chrome themselves
+✅ Per-portal launch profiles (driver flavour, window size, flags)
+✅ Liveness check before every lease, sanitise on every release
+✅ Thread-safe (usable from parallel workers inside one job)
+✅ Driver health layer: liveness probe, CDP soft reset, relaunch only as a
+   last resort, recycling after N rows or when renderer RSS grows too large
+✅ uc launches reuse a cached pre-patched chromedriver (driver_cache);
+   launch times are recorded per portal
+✅ Profiles are tmpfs clones of pre-warmed per-portal templates, with the
+   recorded consent state replayed on every lease (profile_templates)
+✅ Per-portal network block lists (network_policy), re-applied after soft resets
+"""
+
+import os, time, logging, shutil, threading, atexit
+from urllib.parse import urlparse
+
+import driver_cache
+import network_policy
+import profile_templates
+from driver_cache import CHROME_BINARIES
+
+logger = logging.getLogger("BrowserPool")
+
+# -----------------------------------------------------------------------------
+# CONFIGURATION
+# -----------------------------------------------------------------------------
+POOL_SIZE = int(os.environ.get("SPF_BROWSER_POOL_SIZE", "2"))
+LEASE_TIMEOUT = int(os.environ.get("SPF_BROWSER_LEASE_TIMEOUT", "120"))
+RECYCLE_ROWS = int(os.environ.get("SPF_RECYCLE_ROWS", "200"))
+RECYCLE_RSS_MB = int(os.environ.get("SPF_RECYCLE_RSS_MB", "1500"))
+RSS_CHECK_EVERY = 5
+
+PRIVATE_ARGS = [
+    "--incognito",
+    "--disable-cache",
+    "--disable-application-cache",
+    "--disk-cache-size=0",
+    "--disable-plugins-discovery",
+    "--no-first-run",
+    "--no-default-browser-check",
+]
+
+# driver: "uc" = undetected_chromedriver, "selenium" = plain chromedriver
+PORTAL_PROFILES = {
+    "maersk": {
+        "driver": "uc",
+        "window_size": "1360,768",
+        "args": PRIVATE_ARGS + ["--disable-extensions", "--mute-audio", "--start-maximized"],
+    },
+    "cpatos": {
+        "driver": "uc",
+        "window_size": "1360,768",
+        "args": PRIVATE_ARGS + ["--mute-audio", "--disable-extensions"],
+    },
+    "customs": {
+        "driver": "uc",
+        "window_size": "1360,768",
+        "args": list(PRIVATE_ARGS),
+    },
+    "bb_exp": {
+        "driver": "uc",
+        "window_size": "1366,768",
+        "args": ["--disable-quic", "--disable-http2", "--disable-ipv6"],
+        "page_load_timeout": 60,
+    },
+    "epb": {
+        "driver": "selenium",
+        "window_size": "1920,1080",
+        "args": ["--incognito"],
+    },
+}
+
+
+# -----------------------------------------------------------------------------
+# SITE DATA
+# -----------------------------------------------------------------------------
+def _origin(url):
+    parts = urlparse(url or "")
+    return f"{parts.scheme}://{parts.netloc}" if parts.scheme in ("http", "https") and parts.netloc else None
+
+
+def clear_site_data(driver, seed=None):
+    """Delete cookies and the web storage of every origin the browser holds data for.
+    Storage.clearDataForOrigin takes one exact origin (no wildcard), so the origins are
+    collected first: open pages and frames, every cookie domain and the seeded origin"""
+    origins = set()
+    for target in driver.execute_cdp_cmd("Target.getTargets", {}).get("targetInfos", []):
+        origins.add(_origin(target.get("url")))
+    for cookie in driver.execute_cdp_cmd("Network.getAllCookies", {}).get("cookies", []):
+        host = cookie.get("domain", "").lstrip(".")
+        if host:
+            origins.update((f"https://{host}", f"http://{host}"))
+    if seed:
+        origins.add(seed.get("origin"))
+    origins.discard(None)
+
+    driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+    for origin in sorted(origins):
+        driver.execute_cdp_cmd("Storage.clearDataForOrigin", {"origin": origin, "storageTypes": "all"})
+    return len(origins)
+
+
+# -----------------------------------------------------------------------------
+# POOLED BROWSER
+# -----------------------------------------------------------------------------
+class PooledBrowser:
+    def __init__(self, driver, portal, headless, profile_dir):
+        self.driver = driver
+        self.portal = portal
+        self.headless = headless
+        self.profile_dir = profile_dir
+        self.launched_at = time.time()
+        self.idle_since = self.launched_at
+        self.leases = 0
+        self.download_dir = None
+        self.seed = profile_templates.load_seed(portal)
+        self.seed_script_id = None
+
+    @property
+    def key(self):
+        return (self.portal, self.headless)
+
+
+class BrowserPool:
+    def __init__(self, size=POOL_SIZE):
+        self.size = size     # Chromes alive at once (idle + leased + launching), across all portals
+        self._idle = {}      # (portal, headless) -> [PooledBrowser]
+        self._leased = {}    # id(driver) -> PooledBrowser
+        self._launching = 0
+        self._checking = 0   # idle browsers popped for a liveness check (outside the lock)
+        self._cond = threading.Condition()
+        self._closed = False
+        self.launches = {}   # portal -> [(seconds, driver source)]
+
+    # -------------------------------------------------------------
+    # Launch
+    # -------------------------------------------------------------
+    def _build_options(self, portal, headless, profile_dir):
+        profile = PORTAL_PROFILES[portal]
+        if profile["driver"] == "uc":
+            import undetected_chromedriver as uc
+            opts = uc.ChromeOptions()
+        else:
+            from selenium.webdriver.chrome.options import Options
+            opts = Options()
+
+        if headless:
+            opts.add_argument("--headless=new")
+        opts.add_argument("--no-sandbox")
+        opts.add_argument("--disable-dev-shm-usage")
+        opts.add_argument("--disable-gpu")
+        opts.add_argument("--disable-blink-features=AutomationControlled")
+        opts.add_argument(f"--window-size={profile['window_size']}")
+        for arg in profile["args"]:
+            opts.add_argument(arg)
+        opts.add_argument("--user-data-dir=" + profile_dir)
+        if network_policy.blocked_patterns(portal):
+            network_policy.enable_metering(opts)
+
+        for path in CHROME_BINARIES:
+            if os.path.exists(path):
+                opts.binary_location = path
+                break
+        return opts
+
+    def launch_driver(self, portal, headless, profile_dir):
+        """Start Chrome for a portal profile on the given user-data-dir; returns (driver, driver source)"""
+        if portal not in PORTAL_PROFILES:
+            raise ValueError(f"Unknown portal profile: {portal}")
+        profile = PORTAL_PROFILES[portal]
+        if profile["driver"] == "uc":
+            driver, source = self._launch_uc(portal, headless, profile_dir)
+        else:
+            from selenium import webdriver
+            opts = self._build_options(portal, headless, profile_dir)
+            driver, source = webdriver.Chrome(options=opts), "selenium"
+        if profile.get("page_load_timeout"):
+            driver.set_page_load_timeout(profile["page_load_timeout"])
+        self._apply_network_policy(driver, portal)
+        return driver, source
+
+    def _apply_network_policy(self, driver, portal):
+        try:
+            network_policy.apply(driver, portal)
+        except Exception as e:
+            logger.warning("⚠️ Network policy not applied for %s: %s", portal, e)
+
+    def _launch(self, portal, headless):
+        if portal not in PORTAL_PROFILES:
+            raise ValueError(f"Unknown portal profile: {portal}")
+
+        started = time.time()
+        profile_dir = profile_templates.clone_profile(portal)
+        try:
+            driver, source = self.launch_driver(portal, headless, profile_dir)
+        except Exception:
+            shutil.rmtree(profile_dir, ignore_errors=True)
+            raise
+
+        elapsed = time.time() - started
+        with self._cond:
+            self.launches.setdefault(portal, []).append((elapsed, source))
+        logger.info("🧩 Chrome launched for %s in %.1fs (%s driver)", portal, elapsed, source)
+        return PooledBrowser(driver, portal, headless, profile_dir)
+
+    def _launch_uc(self, portal, headless, profile_dir):
+        """uc.Chrome on the cached patched driver; uc patches its own copy only if the cache is unusable"""
+        import undetected_chromedriver as uc
+        opts = self._build_options(portal, headless, profile_dir)
+        binary = opts.binary_location or None
+        try:
+            path, major = driver_cache.ensure_driver(binary)
+        except Exception as e:
+            logger.warning("⚠️ chromedriver cache unavailable, uc will patch its own: %s", e)
+            return uc.Chrome(options=opts, use_subprocess=True), "uc-patched"
+        try:
+            return uc.Chrome(options=opts, use_subprocess=True, driver_executable_path=path,
+                             version_main=major), "cached"
+        except Exception as e:
+            if driver_cache.VERSION_MISMATCH not in str(e):
+                raise
+        # Chrome was upgraded under us: rebuild the entry once and retry (uc options are single-use)
+        driver_cache.invalidate(binary)
+        path, major = driver_cache.ensure_driver(binary)
+        opts = self._build_options(portal, headless, profile_dir)
+        return uc.Chrome(options=opts, use_subprocess=True, driver_executable_path=path,
+                         version_main=major), "cached"
+
+    def launch_stats(self):
+        """portal -> {"count", "avg_s", "max_s", "sources"} for every launch of this process"""
+        with self._cond:
+            launches = {p: list(v) for p, v in self.launches.items()}
+        stats = {}
+        for portal, entries in launches.items():
+            times = [t for t, _ in entries]
+            sources = {}
+            for _, src in entries:
+                sources[src] = sources.get(src, 0) + 1
+            stats[portal] = {"count": len(times), "avg_s": round(sum(times) / len(times), 2),
+                             "max_s": round(max(times), 2), "sources": sources}
+        return stats
+
+    def _count(self):
+        """Every browser holding a slot (caller holds the lock)"""
+        idle = sum(len(browsers) for browsers in self._idle.values())
+        return idle + len(self._leased) + self._launching + self._checking
+
+    def _evict_idle(self):
+        """Pop the longest-idle browser of any profile to free its slot, or None (caller holds the lock)"""
+        oldest = None
+        for browsers in self._idle.values():
+            for browser in browsers:
+                if oldest is None or browser.idle_since < oldest.idle_since:
+                    oldest = browser
+        if oldest is not None:
+            self._idle[oldest.key].remove(oldest)
+            if not self._idle[oldest.key]:
+                del self._idle[oldest.key]
+        return oldest
+
+    def _discard(self, browser):
+        try:
+            browser.driver.quit()
+        except Exception:
+            pass
+        shutil.rmtree(browser.profile_dir, ignore_errors=True)
+
+    # -------------------------------------------------------------
+    # Health + sanitising
+    # -------------------------------------------------------------
+    def is_healthy(self, browser):
+        try:
+            if not browser.driver.window_handles:
+                return False
+            browser.driver.execute_script("return 1")
+            return True
+        except Exception:
+            return False
+
+    def sanitise(self, browser):
+        """Close stray tabs and wipe cookies/storage so the next lease starts clean"""
+        driver = browser.driver
+        handles = driver.window_handles
+        for handle in handles[1:]:
+            driver.switch_to.window(handle)
+            driver.close()
+        driver.switch_to.window(handles[0])
+        driver.switch_to.default_content()
+        clear_site_data(driver, browser.seed)
+        driver.get("about:blank")
+
+    # -------------------------------------------------------------
+    # Lease / release
+    # -------------------------------------------------------------
+    def lease(self, portal, headless=True, download_dir=None, timeout=LEASE_TIMEOUT):
+        """Return a ready WebDriver for the given portal profile"""
+        key = (portal, headless)
+        deadline = time.time() + timeout
+        browser = None
+
+        while browser is None:
+            candidate = evicted = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise RuntimeError("Browser pool is shut down")
+                    idle = self._idle.get(key, [])
+                    if idle:
+                        candidate = idle.pop()
+                        self._checking += 1
+                        break
+                    if self._count() < self.size:
+                        self._launching += 1
+                        break
+                    # Pool full: an idle browser of another portal gives up its slot
+                    evicted = self._evict_idle()
+                    if evicted is not None:
+                        self._launching += 1
+                        break
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise TimeoutError(f"No browser available for {portal} after {timeout}s")
+                    self._cond.wait(remaining)
+
+            if candidate is None:
+                if evicted is not None:
+                    logger.info("♻️ Pool full, closing idle %s browser for %s", evicted.portal, portal)
+                    self._discard(evicted)
+                try:
+                    browser = self._launch(portal, headless)
+                finally:
+                    with self._cond:
+                        self._launching -= 1
+                        if browser is not None:
+                            self._leased[id(browser.driver)] = browser
+                        self._cond.notify_all()
+                break
+
+            # Liveness check (and quitting a dead browser) can block for seconds: never under the lock
+            healthy = self.is_healthy(candidate)
+            if not healthy:
+                logger.warning("♻️ Dropping dead %s browser from pool", portal)
+                self._discard(candidate)
+            with self._cond:
+                self._checking -= 1
+                if healthy:
+                    self._leased[id(candidate.driver)] = candidate
+                    browser = candidate
+                self._cond.notify_all()
+
+        browser.leases += 1
+        browser.download_dir = download_dir
+        if download_dir:
+            os.makedirs(download_dir, exist_ok=True)
+            self._apply_download_dir(browser)
+        self._apply_seed(browser)
+        if network_policy.blocked_patterns(portal):
+            try:
+                browser.driver.get_log("performance")     # the job's network counters start from zero
+            except Exception:
+                pass
+        return browser.driver
+
+    def release(self, driver, discard=False):
+        """Return a driver to the pool (sanitised) or quit it if it is unusable"""
+        if driver is None:
+            return
+        with self._cond:
+            browser = self._leased.pop(id(driver), None)
+        if browser is None:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+            return
+
+        keep = not discard and not self._closed
+        if keep:
+            try:
+                self.sanitise(browser)
+            except Exception as e:
+                logger.warning("⚠️ Sanitise failed for %s browser: %s", browser.portal, e)
+                keep = False
+
+        with self._cond:
+            if keep and self._count() < self.size:
+                browser.idle_since = time.time()
+                self._idle.setdefault(browser.key, []).append(browser)
+                browser = None
+            self._cond.notify_all()
+        if browser is not None:
+            self._discard(browser)
+
+    # -------------------------------------------------------------
+    # Recovery
+    # -------------------------------------------------------------
+    def _apply_download_dir(self, browser):
+        browser.driver.execute_cdp_cmd("Page.setDownloadBehavior", {
+            "behavior": "allow",
+            "downloadPath": os.path.abspath(browser.download_dir)
+        })
+
+    def _apply_seed(self, browser):
+        """Replay the template's consent cookies/localStorage (sanitise and soft reset wipe them)"""
+        if not browser.seed:
+            return
+        try:
+            browser.seed_script_id = profile_templates.apply_seed(browser.driver, browser.seed,
+                                                                  browser.seed_script_id)
+        except Exception as e:
+            logger.warning("⚠️ Could not apply %s profile seed: %s", browser.portal, e)
+
+    def is_seeded(self, driver):
+        """True if the driver's portal consent state was pre-set from a template"""
+        with self._cond:
+            browser = self._leased.get(id(driver))
+        return bool(browser and browser.seed)
+
+    def soft_reset(self, driver):
+        """Clear cookies/storage, drop every window and continue in a fresh target.
+        Much cheaper than a relaunch; returns False if the browser is not usable afterwards"""
+        with self._cond:
+            browser = self._leased.get(id(driver))
+        try:
+            clear_site_data(driver, browser.seed if browser else None)
+            old_handles = driver.window_handles
+            driver.switch_to.new_window("tab")
+            fresh = driver.current_window_handle
+            for handle in old_handles:
+                driver.switch_to.window(handle)
+                driver.close()
+            driver.switch_to.window(fresh)
+            if browser is not None:
+                browser.seed_script_id = None      # init scripts belonged to the closed target
+                self._apply_network_policy(driver, browser.portal)
+                if browser.download_dir:
+                    self._apply_download_dir(browser)
+                self._apply_seed(browser)
+            driver.execute_script("return 1")
+            return True
+        except Exception as e:
+            logger.warning("⚠️ Soft reset failed: %s", e)
+            return False
+
+    def relaunch(self, driver):
+        """Replace a leased driver with a freshly launched one of the same profile"""
+        with self._cond:
+            browser = self._leased.get(id(driver))
+        if browser is None:
+            raise ValueError("Driver is not leased from this pool")
+        portal, headless, download_dir = browser.portal, browser.headless, browser.download_dir
+        self.release(driver, discard=True)
+        return self.lease(portal, headless=headless, download_dir=download_dir)
+
+    def grow(self, size):
+        """Raise the pool capacity (e.g. for a job running several browsers at once)"""
+        with self._cond:
+            self.size = max(self.size, size)
+            self._cond.notify_all()
+
+    def warm(self, portal, headless=True, count=None):
+        """Pre-launch browsers so the next lease() returns immediately"""
+        count = self.size if count is None else count
+        with self._cond:
+            missing = count - len(self._idle.get((portal, headless), []))
+        drivers = [self.lease(portal, headless) for _ in range(max(0, missing))]
+        for driver in drivers:
+            self.release(driver)
+
+    def shutdown(self):
+        with self._cond:
+            self._closed = True
+            browsers = [b for idle in self._idle.values() for b in idle] + list(self._leased.values())
+            self._idle.clear()
+            self._leased.clear()
+            self._cond.notify_all()
+        for browser in browsers:
+            self._discard(browser)
+
+
+# -----------------------------------------------------------------------------
+# DRIVER HEALTH
+# -----------------------------------------------------------------------------
+def _process_table():
+    """pid -> (ppid, rss_kb, is_renderer) for every process visible in /proc"""
+    table = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "rb") as f:
+                stat = f.read().rsplit(b")", 1)[1].split()
+            with open(f"/proc/{entry}/cmdline", "rb") as f:
+                cmdline = f.read()
+            with open(f"/proc/{entry}/statm", "rb") as f:
+                rss_pages = int(f.read().split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        table[int(entry)] = (int(stat[1]), rss_pages * os.sysconf("SC_PAGE_SIZE") // 1024,
+                             b"--type=renderer" in cmdline)
+    return table
+
+
+def renderer_rss_mb(driver):
+    """Total RSS of the Chrome renderer processes behind driver (Linux /proc), or None"""
+    roots = {pid for pid in (getattr(driver, "browser_pid", None),
+                             getattr(getattr(getattr(driver, "service", None), "process", None), "pid", None)) if pid}
+    if not roots or not os.path.isdir("/proc"):
+        return None
+    table = _process_table()
+    children = {}
+    for pid, (ppid, _, _) in table.items():
+        children.setdefault(ppid, []).append(pid)
+    total_kb, stack, seen = 0, list(roots), set()
+    while stack:
+        pid = stack.pop()
+        if pid in seen:
+            continue
+        seen.add(pid)
+        if pid in table and table[pid][2]:
+            total_kb += table[pid][1]
+        stack.extend(children.get(pid, []))
+    return total_kb / 1024
+
+
+class DriverHealth:
+    """Keeps one leased driver usable for a whole job.
+
+    on_new_session(driver) re-establishes portal state (navigate, login, ...)
+    after a reset or relaunch; it must raise if that fails."""
+
+    def __init__(self, driver, on_new_session=None, log=None, pool=None,
+                 recycle_rows=RECYCLE_ROWS, recycle_rss_mb=RECYCLE_RSS_MB):
+        self.driver = driver
+        self.on_new_session = on_new_session
+        self.log = log or logger
+        self.pool = pool or get_pool()
+        self.recycle_rows = recycle_rows
+        self.recycle_rss_mb = recycle_rss_mb
+        self.rows = 0
+        self.soft_resets = self.relaunches = 0
+
+    def probe(self):
+        """Liveness: window handles answer and JS executes"""
+        try:
+            return bool(self.driver.window_handles) and self.driver.execute_script("return 1") == 1
+        except Exception:
+            return False
+
+    def _new_session(self):
+        if self.on_new_session:
+            self.on_new_session(self.driver)
+
+    def _relaunch(self, reason):
+        self.log.info(f"♻️ Relaunching Chrome ({reason})")
+        self.driver = self.pool.relaunch(self.driver)
+        self.relaunches += 1
+        self.rows = 0
+        self._new_session()
+        return self.driver
+
+    def recover(self, reason="row failed"):
+        """Soft reset first; relaunch only if the reset (or re-login) fails. Returns the driver"""
+        if self.probe() and self.pool.soft_reset(self.driver):
+            try:
+                self._new_session()
+                self.soft_resets += 1
+                self.log.info(f"🧽 Soft reset done ({reason})")
+                return self.driver
+            except Exception as e:
+                self.log.warning(f"⚠️ Session setup after soft reset failed: {e}")
+        return self._relaunch(reason)
+
+    def row_done(self):
+        """Call after every row; recycles the browser after N rows or on high renderer RSS"""
+        self.rows += 1
+        if self.recycle_rows and self.rows >= self.recycle_rows:
+            return self._relaunch(f"{self.rows} rows on this browser")
+        if self.recycle_rss_mb and self.rows % RSS_CHECK_EVERY == 0:
+            rss = renderer_rss_mb(self.driver)
+            if rss is not None and rss > self.recycle_rss_mb:
+                self.log.info(f"🧠 Renderer RSS {rss:.0f} MB > {self.recycle_rss_mb} MB, resetting")
+                self.recover("renderer memory")
+                rss = renderer_rss_mb(self.driver)
+                if rss is not None and rss > self.recycle_rss_mb:
+                    return self._relaunch(f"renderer RSS still {rss:.0f} MB")
+        return self.driver
+
+    def summary(self):
+        return {"rows": self.rows, "soft_resets": self.soft_resets, "relaunches": self.relaunches}
+
+    def log_summary(self, log=None):
+        if self.soft_resets or self.relaunches:
+            (log or self.log).info(f"🩺 Browser health: {self.soft_resets} soft reset(s), {self.relaunches} relaunch(es)")
+
+
+# -----------------------------------------------------------------------------
+# PROCESS-WIDE POOL
+# -----------------------------------------------------------------------------
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool()
+            atexit.register(_pool.shutdown)
+        return _pool
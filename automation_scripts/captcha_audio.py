@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+In-Memory reCAPTCHA Audio Pipeline (used by egm_download)
+Author: Izaz Ahamed
+------------------------------------------------------------
+✅ fetch → decode → recognise entirely in memory (no temp files, no name clashes)
+✅ Runs on a shared worker pool, safe for concurrent jobs and threads
+✅ Pluggable recognizer backends: google (online), vosk + sphinx (offline CPU)
+✅ Several backends can race — first usable transcript wins
+✅ Per-stage timings (fetch / decode / recognise) recorded for every challenge
+"""
+
+import io, os, time, shutil, logging, threading, subprocess, urllib.request
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait as wait_futures
+
+logger = logging.getLogger("CaptchaAudio")
+
+# -----------------------------------------------------------------------------
+# CONFIGURATION
+# -----------------------------------------------------------------------------
+CAPTCHA_WORKERS = int(os.environ.get("SPF_CAPTCHA_WORKERS", "4"))
+# Comma-separated, tried concurrently; e.g. "google,vosk"
+CAPTCHA_RECOGNIZERS = [r.strip() for r in os.environ.get("SPF_CAPTCHA_RECOGNIZERS", "google").split(",") if r.strip()]
+VOSK_MODEL_PATH = os.environ.get("SPF_VOSK_MODEL", "/opt/vosk-model-small-en-us")
+FETCH_TIMEOUT = 20
+PIPELINE_TIMEOUT = 45
+SAMPLE_RATE = 16000
+
+
+class CaptchaAudioError(Exception):
+    pass
+
+
+# -----------------------------------------------------------------------------
+# STAGES
+# -----------------------------------------------------------------------------
+def fetch_audio(url, timeout=FETCH_TIMEOUT):
+    """Download the challenge MP3 into memory"""
+    req = urllib.request.Request(url, headers={"User-Agent": "Mozilla/5.0"})
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        data = resp.read()
+    if not data:
+        raise CaptchaAudioError("empty audio response")
+    return data
+
+
+def decode_to_wav(mp3_bytes):
+    """MP3 bytes → 16 kHz mono WAV bytes, piped through ffmpeg (stdin → stdout)"""
+    ffmpeg = shutil.which("ffmpeg")
+    if not ffmpeg:
+        raise CaptchaAudioError("ffmpeg not found")
+    proc = subprocess.run(
+        [ffmpeg, "-hide_banner", "-loglevel", "error", "-i", "pipe:0",
+         "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "wav", "pipe:1"],
+        input=mp3_bytes, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=FETCH_TIMEOUT
+    )
+    if proc.returncode != 0 or not proc.stdout:
+        raise CaptchaAudioError(f"ffmpeg decode failed: {proc.stderr.decode(errors='ignore').strip()[:200]}")
+    return proc.stdout
+
+
+# -----------------------------------------------------------------------------
+# RECOGNIZER BACKENDS
+# -----------------------------------------------------------------------------
+def _sr_audio(wav_bytes):
+    import speech_recognition as sr
+    recog = sr.Recognizer()
+    with sr.AudioFile(io.BytesIO(wav_bytes)) as source:
+        return recog, recog.record(source)
+
+
+def recognize_google(wav_bytes):
+    recog, audio = _sr_audio(wav_bytes)
+    return recog.recognize_google(audio)
+
+
+def recognize_sphinx(wav_bytes):
+    recog, audio = _sr_audio(wav_bytes)
+    return recog.recognize_sphinx(audio)
+
+
+_vosk_model = None
+_vosk_lock = threading.Lock()
+
+
+def recognize_vosk(wav_bytes):
+    """Offline CPU recognition; the model is loaded once per process"""
+    global _vosk_model
+    import json, wave
+    import vosk
+
+    with _vosk_lock:
+        if _vosk_model is None:
+            vosk.SetLogLevel(-1)
+            _vosk_model = vosk.Model(VOSK_MODEL_PATH)
+    with wave.open(io.BytesIO(wav_bytes), "rb") as wav:
+        rec = vosk.KaldiRecognizer(_vosk_model, wav.getframerate())
+        while True:
+            frames = wav.readframes(4000)
+            if not frames:
+                break
+            rec.AcceptWaveform(frames)
+    return json.loads(rec.FinalResult()).get("text", "")
+
+
+RECOGNIZERS = {
+    "google": recognize_google,
+    "sphinx": recognize_sphinx,
+    "vosk": recognize_vosk,
+}
+
+
+def register_recognizer(name, func):
+    """Plug in another backend: func(wav_bytes) -> transcript"""
+    RECOGNIZERS[name] = func
+
+
+# -----------------------------------------------------------------------------
+# STATS
+# -----------------------------------------------------------------------------
+class CaptchaStats:
+    """Per-stage timings for every challenge of a job"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.runs = []
+
+    def record(self, timings):
+        with self._lock:
+            self.runs.append(dict(timings))
+
+    def log_summary(self, log=None):
+        log = log or logger
+        with self._lock:
+            runs = list(self.runs)
+        if not runs:
+            return
+        ok = sum(1 for r in runs if r.get("ok"))
+        stages = {}
+        for r in runs:
+            for k, v in r.items():
+                if k.endswith("_ms"):
+                    stages.setdefault(k[:-3], []).append(v)
+        detail = ", ".join(f"{k} avg {sum(v) / len(v):.0f}ms" for k, v in stages.items())
+        log.info(f"🎧 Audio captcha: {ok}/{len(runs)} transcribed ({detail})")
+
+
+# -----------------------------------------------------------------------------
+# PIPELINE
+# -----------------------------------------------------------------------------
+class AudioCaptchaPipeline:
+    def __init__(self, recognizers=None, stats=None, log=None):
+        self.recognizers = [r for r in (recognizers or CAPTCHA_RECOGNIZERS) if r in RECOGNIZERS]
+        if not self.recognizers:
+            raise CaptchaAudioError(f"No known recognizer in {recognizers or CAPTCHA_RECOGNIZERS}")
+        self.stats = stats or CaptchaStats()
+        self.log = log or logger
+
+    def _recognize(self, wav_bytes, timings):
+        """Race the configured backends; first non-empty transcript wins"""
+        started = time.time()
+        pool = get_executor("recognize")
+        futures = {pool.submit(RECOGNIZERS[name], wav_bytes): name for name in self.recognizers}
+        errors = []
+        pending = set(futures)
+        while pending:
+            done, pending = wait_futures(pending, timeout=PIPELINE_TIMEOUT, return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                name = futures[future]
+                try:
+                    text = (future.result() or "").strip()
+                except Exception as e:
+                    errors.append(f"{name}: {e}")
+                    continue
+                if text:
+                    for other in pending:
+                        other.cancel()
+                    timings["recognize_ms"] = (time.time() - started) * 1000
+                    timings["backend"] = name
+                    return text
+                errors.append(f"{name}: empty transcript")
+        timings["recognize_ms"] = (time.time() - started) * 1000
+        raise CaptchaAudioError("; ".join(errors) or "recognition timed out")
+
+    def _run(self, url):
+        timings = {"ok": False}
+        try:
+            t = time.time()
+            mp3 = fetch_audio(url)
+            timings["fetch_ms"] = (time.time() - t) * 1000
+
+            t = time.time()
+            wav = decode_to_wav(mp3)
+            timings["decode_ms"] = (time.time() - t) * 1000
+
+            text = self._recognize(wav, timings)
+            timings["ok"] = True
+            self.log.info(f"⏱️ Captcha audio: fetch {timings['fetch_ms']:.0f}ms, decode {timings['decode_ms']:.0f}ms, "
+                          f"recognise {timings['recognize_ms']:.0f}ms ({timings['backend']})")
+            return text
+        finally:
+            self.stats.record(timings)
+
+    def submit(self, url):
+        """Start solving in the background; returns a future with the transcript"""
+        return get_executor("pipeline").submit(self._run, url)
+
+    def solve(self, url, timeout=PIPELINE_TIMEOUT):
+        return self.submit(url).result(timeout=timeout)
+
+
+# -----------------------------------------------------------------------------
+# PROCESS-WIDE WORKER POOLS
+# -----------------------------------------------------------------------------
+# Pipelines and recognizer backends use separate pools so a pipeline waiting
+# on its backends can never starve them of workers
+_executors = {}
+_executor_lock = threading.Lock()
+
+
+def get_executor(kind):
+    with _executor_lock:
+        if kind not in _executors:
+            _executors[kind] = ThreadPoolExecutor(max_workers=CAPTCHA_WORKERS, thread_name_prefix=f"captcha-{kind}")
+        return _executors[kind]
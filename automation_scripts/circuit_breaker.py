@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cross-Job Portal Circuit Breaker (shared by all automation scripts)
+Author: Izaz Ahamed
+------------------------------------------------------------
+✅ One breaker per portal host, shared by every job and worker process
+   (SQLite in WAL mode, like the rate governor)
+✅ A failed row is checked with one cheap HTTP probe; only failures where the
+   portal itself does not answer (connection error, timeout, 5xx) count
+✅ Opens after BREAKER_THRESHOLD consecutive outage failures: remaining rows of
+   every job fail at once with PortalUnavailable instead of waiting out timeouts
+✅ Half-open after BREAKER_OPEN_SECONDS: a single process probes, success closes
+   the breaker for everyone
+✅ SPF_BREAKER_PAUSE=<seconds> waits that long for the portal before giving up
+   (default 0: fail fast and free the queue slot); SPF_CIRCUIT_BREAKER=0 turns it off
+"""
+
+import os, time, sqlite3, logging, threading
+from urllib.parse import urlparse
+
+logger = logging.getLogger("CircuitBreaker")
+
+# -----------------------------------------------------------------------------
+# CONFIGURATION
+# -----------------------------------------------------------------------------
+BREAKER_ENABLED = os.environ.get("SPF_CIRCUIT_BREAKER", "1") != "0"
+BREAKER_DB = os.environ.get(
+    "SPF_BREAKER_DB",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "circuit_breaker.sqlite3")
+)
+BREAKER_THRESHOLD = int(os.environ.get("SPF_BREAKER_THRESHOLD", "3"))
+BREAKER_OPEN_SECONDS = float(os.environ.get("SPF_BREAKER_OPEN_SECONDS", "60"))
+BREAKER_PAUSE = float(os.environ.get("SPF_BREAKER_PAUSE", "0"))
+PROBE_TIMEOUT = 8
+PROBE_INTERVAL = 15         # seconds between probes while pausing
+EXIT_PORTAL_DOWN = 3        # script exit code: portal unreachable, no row delivered
+
+# Cheap page per host for the probe (defaults to the URL the breaker was built from)
+PROBE_URLS = {
+    "customs.gov.bd": "https://customs.gov.bd/portal/",
+}
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS breakers (
+    host       TEXT PRIMARY KEY,
+    state      TEXT NOT NULL,
+    failures   INTEGER NOT NULL DEFAULT 0,
+    opened_at  REAL NOT NULL DEFAULT 0,
+    probing_at REAL NOT NULL DEFAULT 0,
+    last_error TEXT
+);
+"""
+
+
+class PortalUnavailable(Exception):
+    """Row not attempted: the portal's circuit breaker is open"""
+
+
+def probe(url, timeout=PROBE_TIMEOUT):
+    """(portal answered, error text) for one plain GET; TLS errors count as answered —
+    the host is up, and Chrome does not share requests' CA bundle"""
+    try:
+        import requests
+    except ImportError:
+        return True, None
+    try:
+        resp = requests.get(url, timeout=timeout, stream=True, headers={"User-Agent": "Mozilla/5.0"})
+        resp.close()
+    except requests.exceptions.SSLError:
+        return True, None
+    except requests.RequestException as e:
+        return False, f"{type(e).__name__}: {str(e)[:200]}"
+    if resp.status_code >= 500:
+        return False, f"HTTP {resp.status_code}"
+    return True, None
+
+
+class CircuitBreaker:
+    """Outage detector for one portal host; thread-safe, one SQLite connection per thread"""
+
+    def __init__(self, host, probe_url=None, db_path=BREAKER_DB, enabled=BREAKER_ENABLED, log=None):
+        self.host = host
+        self.probe_url = PROBE_URLS.get(host) or probe_url or f"https://{host}/"
+        self.db_path = db_path
+        self.enabled = enabled
+        self.log = log or logger
+        self.trips = 0
+        self.skipped = 0
+        self.probes = 0
+        self.last_error = None
+        self._paused = False
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        if self.enabled:
+            try:
+                os.makedirs(os.path.dirname(db_path), exist_ok=True)
+                self._db().executescript(SCHEMA)
+            except sqlite3.Error as e:
+                self.log.warning(f"⚠️ Circuit breaker unavailable ({e}), rows always attempted")
+                self.enabled = False
+
+    @classmethod
+    def for_url(cls, url, **kwargs):
+        return cls(urlparse(url).hostname or url, probe_url=url, **kwargs)
+
+    # -------------------------------------------------------------
+    # Storage helpers
+    # -------------------------------------------------------------
+    def _db(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _load(self, db):
+        row = db.execute("SELECT state, failures, opened_at, probing_at, last_error FROM breakers WHERE host=?",
+                         (self.host,)).fetchone()
+        if row is None:
+            db.execute("INSERT INTO breakers (host, state) VALUES (?, ?)", (self.host, CLOSED))
+            return CLOSED, 0, 0.0, 0.0, None
+        return row
+
+    def _transaction(self, fn):
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(db, time.time())
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+        return result
+
+    def _disable(self, e):
+        self.log.warning(f"⚠️ Circuit breaker error ({e}), rows always attempted")
+        self.enabled = False
+
+    def _probe(self):
+        with self._lock:
+            self.probes += 1
+        return probe(self.probe_url)
+
+    # -------------------------------------------------------------
+    # Public API
+    # -------------------------------------------------------------
+    def allow(self):
+        """True if a row may hit the portal now; an expired open breaker is probed
+        here (by one process only) and closed again if the portal answers"""
+        if not self.enabled:
+            return True
+        if not self.is_open():
+            return True           # the common case: one read, no write lock
+
+        def check(db, now):
+            state, _, opened_at, probing_at, last_error = self._load(db)
+            self.last_error = last_error or self.last_error
+            if state == CLOSED:
+                return "go"
+            if now - opened_at < BREAKER_OPEN_SECONDS:
+                return "blocked"
+            if state == HALF_OPEN and now - probing_at < PROBE_TIMEOUT * 2:
+                return "blocked"      # another job is probing right now
+            db.execute("UPDATE breakers SET state=?, probing_at=? WHERE host=?", (HALF_OPEN, now, self.host))
+            return "probe"
+
+        try:
+            verdict = self._transaction(check)
+        except sqlite3.Error as e:
+            self._disable(e)
+            return True
+        if verdict != "probe":
+            return verdict == "go"
+
+        alive, error = self._probe()
+
+        def settle(db, now):
+            if alive:
+                db.execute("UPDATE breakers SET state=?, failures=0, last_error=NULL WHERE host=?",
+                           (CLOSED, self.host))
+            else:
+                db.execute("UPDATE breakers SET state=?, opened_at=?, last_error=? WHERE host=?",
+                           (OPEN, now, error, self.host))
+
+        try:
+            self._transaction(settle)
+        except sqlite3.Error as e:
+            self._disable(e)
+            return True
+        if alive:
+            self.log.info(f"🔌 {self.host} answers again, circuit closed")
+        else:
+            self.last_error = error
+            self.log.info(f"🔌 {self.host} still down ({error}), circuit stays open")
+        return alive
+
+    def ready(self):
+        """allow(), but when the breaker is open wait up to SPF_BREAKER_PAUSE seconds
+        (once per job) for the portal to come back; False means skip the row"""
+        if self.allow():
+            return True
+        deadline = time.time() + (0 if self._paused else BREAKER_PAUSE)
+        if not self._paused and BREAKER_PAUSE > 0:
+            self.log.info(f"⏸️ {self.host} is down, pausing up to {BREAKER_PAUSE:.0f}s for it to come back")
+        self._paused = True
+        while time.time() < deadline:
+            time.sleep(max(0.0, min(PROBE_INTERVAL, deadline - time.time())))
+            if self.allow():
+                return True
+        return False
+
+    def record(self, ok):
+        """Feed one row's outcome back. A failed row counts toward opening the breaker
+        only if the portal also fails the probe (a "not found" row is not an outage);
+        returns True when it did, i.e. the portal itself did not answer"""
+        if not self.enabled:
+            return False
+        if ok:
+            try:
+                self._db().execute("UPDATE breakers SET state=?, failures=0 WHERE host=? "
+                                   "AND (failures > 0 OR state != ?)", (CLOSED, self.host, CLOSED))
+            except sqlite3.Error as e:
+                self._disable(e)
+            return False
+
+        alive, error = self._probe()
+
+        def update(db, now):
+            state, failures, _, _, _ = self._load(db)
+            if alive:
+                db.execute("UPDATE breakers SET failures=0 WHERE host=?", (self.host,))
+                return False, 0
+            failures += 1
+            tripped = state == CLOSED and failures >= BREAKER_THRESHOLD
+            if tripped or state != CLOSED:
+                db.execute("UPDATE breakers SET state=?, failures=?, opened_at=?, last_error=? WHERE host=?",
+                           (OPEN, failures, now, error, self.host))
+            else:
+                db.execute("UPDATE breakers SET failures=?, last_error=? WHERE host=?", (failures, error, self.host))
+            return tripped, failures
+
+        try:
+            tripped, failures = self._transaction(update)
+        except sqlite3.Error as e:
+            self._disable(e)
+            return not alive
+        if alive:
+            return False
+        self.last_error = error
+        if tripped:
+            with self._lock:
+                self.trips += 1
+            self.log.error(f"🔌 {self.host} down after {failures} consecutive failure(s) ({error}), circuit open "
+                           f"for {BREAKER_OPEN_SECONDS:.0f}s")
+        else:
+            self.log.warning(f"⚠️ {self.host} did not answer the probe ({error}), "
+                             f"{failures}/{BREAKER_THRESHOLD} before the circuit opens")
+        return True
+
+    def is_open(self):
+        if not self.enabled:
+            return False
+        try:
+            row = self._db().execute("SELECT state FROM breakers WHERE host=?", (self.host,)).fetchone()
+        except sqlite3.Error:
+            return False
+        return bool(row) and row[0] != CLOSED
+
+    def skip(self):
+        """Count one row failed without trying; returns the error to record against it"""
+        with self._lock:
+            self.skipped += 1
+            first = self.skipped == 1
+        if first:
+            self.log.error(f"⛔ {self.host} is unreachable (circuit open), failing the remaining rows without trying")
+        detail = f": {self.last_error}" if self.last_error else ""
+        return PortalUnavailable(f"{self.host} is unreachable, row not attempted (circuit open{detail})")
+
+    def summary(self):
+        """Extra job_summary fields (empty when no row was skipped)"""
+        with self._lock:
+            skipped = self.skipped
+        return {"portal_down": self.host, "rows_skipped": skipped} if skipped else {}
+
+    def log_summary(self, log=None):
+        with self._lock:
+            trips, skipped, probes = self.trips, self.skipped, self.probes
+        if not (trips or skipped or probes):
+            return
+        (log or self.log).info(f"🔌 Breaker {self.host}: {probes} probe(s), {trips} trip(s), "
+                               f"{skipped} row(s) skipped while open")
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+CTG Port (CPATOS) HTTP Fast Path
+Author: Izaz Ahamed
+-------------------------------------------------------------
+✅ Submits the containerLocation search as a plain HTTP form post
+✅ Keep-alive pooled session, concurrent lookups with a cap
+✅ Every request takes a token from the portal's rate governor and reports
+   its latency / status back, like a browser row
+✅ Every outcome goes to the portal's circuit breaker (connection errors and
+   5xx count as failures); no request is sent while the breaker is open
+✅ A lookup counts only when the result table has a row whose container cell
+   matches (the page echoes the searched number either way); "no record"
+   pages are misses
+✅ Renders the returned HTML to PDF in one reusable browser tab
+   (Page.setDocumentContent + Page.printToPDF)
+✅ Raises on anything unexpected so the caller can fall back to Selenium
+"""
+
+import os, re, time, base64, threading
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+from concurrent.futures import ThreadPoolExecutor
+
+from network_policy import THROTTLE_STATUSES
+
+HTTP_CONCURRENCY = int(os.environ.get("CTG_HTTP_CONCURRENCY", "6"))
+HTTP_TIMEOUT = int(os.environ.get("CTG_HTTP_TIMEOUT", "30"))
+USER_AGENT = ("Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+              "(KHTML, like Gecko) Chrome/120.0 Safari/537.36")
+
+PDF_OPTIONS = {
+    "format": "A4",
+    "printBackground": True,
+    "marginTop": 0.4,
+    "marginBottom": 0.4,
+    "marginLeft": 0.4,
+    "marginRight": 0.4
+}
+
+
+# Result page texts that mean the portal has nothing for the container
+NO_RECORD_MARKERS = ("no record", "no data found", "no result", "not found", "does not exist")
+CONTAINER_HEADER = re.compile(r"^container\s*(no\.?|number|#)?$", re.I)
+
+
+class HttpPathError(Exception):
+    """The HTTP fast path could not produce a usable result page"""
+
+
+def _normalize(text):
+    return re.sub(r"\s+", "", text or "").upper()
+
+
+# -----------------------------------------------------------------------------
+# SEARCH FORM DISCOVERY
+# -----------------------------------------------------------------------------
+class _SearchFormParser(HTMLParser):
+    """Finds the form that contains the containerLocation input"""
+
+    def __init__(self, field_id):
+        super().__init__()
+        self.field_id = field_id
+        self.forms = []
+        self._current = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "form":
+            self._current = {"action": attrs.get("action", ""), "method": (attrs.get("method") or "get").lower(),
+                             "fields": {}, "search_field": None}
+            self.forms.append(self._current)
+        elif tag == "input" and self._current is not None:
+            name = attrs.get("name")
+            input_type = (attrs.get("type") or "text").lower()
+            if attrs.get("id") == self.field_id:
+                self._current["search_field"] = name or self.field_id
+            elif name and input_type in ("hidden", "submit"):
+                self._current["fields"][name] = attrs.get("value", "")
+
+    def handle_endtag(self, tag):
+        if tag == "form":
+            self._current = None
+
+
+# -----------------------------------------------------------------------------
+# RESULT PAGE CHECK
+# -----------------------------------------------------------------------------
+class _ResultTableParser(HTMLParser):
+    """Table rows of the result page as lists of cell texts, plus its visible text"""
+
+    def __init__(self):
+        super().__init__()
+        self.rows = []
+        self.text = []
+        self._row = None
+        self._cell = None
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ("script", "style"):
+            self._skip += 1
+        elif tag == "tr":
+            self._row = []
+            self.rows.append(self._row)
+        elif tag in ("td", "th") and self._row is not None:
+            self._cell = []
+            self._row.append(self._cell)
+
+    def handle_endtag(self, tag):
+        if tag in ("script", "style"):
+            self._skip = max(0, self._skip - 1)
+        elif tag in ("td", "th"):
+            self._cell = None
+        elif tag == "tr":
+            self._row = self._cell = None
+
+    def handle_data(self, data):
+        if self._skip:
+            return
+        self.text.append(data)
+        if self._cell is not None:
+            self._cell.append(data)
+
+    def cells(self):
+        return [[" ".join("".join(cell).split()) for cell in row] for row in self.rows]
+
+
+def result_status(html, container_number):
+    """Returns "hit" if a result-table row's container cell holds container_number, "no_record" if
+    the page says the portal has nothing, else "miss". Without a container column header
+    any cell that is exactly the number counts — never the echoed search field or a
+    heading that merely mentions it"""
+    parser = _ResultTableParser()
+    parser.feed(html)
+    page_text = " ".join(" ".join(parser.text).split()).lower()
+    if any(marker in page_text for marker in NO_RECORD_MARKERS):
+        return "no_record"
+    wanted = _normalize(container_number)
+    rows = parser.cells()
+    column = None
+    for row in rows:
+        header = next((i for i, cell in enumerate(row) if CONTAINER_HEADER.match(cell)), None)
+        if header is not None:
+            column = header
+        elif column is not None and column < len(row) and _normalize(row[column]) == wanted:
+            return "hit"
+    if column is None and any(_normalize(cell) == wanted for row in rows for cell in row):
+        return "hit"
+    return "miss"
+
+
+class CtgHttpEngine:
+    def __init__(self, base_url, logger, max_concurrency=HTTP_CONCURRENCY, timeout=HTTP_TIMEOUT, governor=None,
+                 breaker=None):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.base_url = base_url
+        self.logger = logger
+        self.timeout = timeout
+        self.governor = governor
+        self.breaker = breaker
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = USER_AGENT
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="ctg-http")
+        self._form = None
+        self._form_lock = threading.Lock()
+        self._render_lock = threading.Lock()
+        self._render_handle = None
+
+    # -------------------------------------------------------------
+    def _request(self, method, url, **kwargs):
+        """One paced request: waits for a governor token, reports latency, throttling and
+        server errors (connection failures, 5xx) back to it and to the circuit breaker"""
+        import requests
+
+        if self.breaker and not self.breaker.allow():
+            raise HttpPathError("portal circuit open, request not sent")
+        if self.governor:
+            self.governor.acquire()
+        started = time.time()
+        try:
+            resp = self.session.request(method, url, timeout=self.timeout, **kwargs)
+        except requests.RequestException:
+            if self.governor:
+                self.governor.report(time.time() - started, server_error=True)
+            if self.breaker:
+                self.breaker.record(False)
+            raise
+        server_error = resp.status_code >= 500
+        if self.governor:
+            self.governor.report(time.time() - started, throttled=resp.status_code in THROTTLE_STATUSES,
+                                 server_error=server_error)
+        if self.breaker:
+            self.breaker.record(not server_error)
+        resp.raise_for_status()
+        return resp
+
+    def _load_form(self, refresh=False):
+        with self._form_lock:
+            if self._form is None or refresh:
+                resp = self._request("GET", self.base_url)
+                parser = _SearchFormParser("containerLocation")
+                parser.feed(resp.text)
+                forms = [f for f in parser.forms if f["search_field"]]
+                if not forms:
+                    raise HttpPathError("containerLocation form not found on portal page")
+                form = forms[0]
+                form["action"] = urljoin(resp.url, form["action"] or resp.url)
+                self._form = form
+            return self._form
+
+    def _submit(self, form, container_number):
+        data = dict(form["fields"])
+        data[form["search_field"]] = container_number
+        if form["method"] == "post":
+            return self._request("POST", form["action"], data=data, headers={"Referer": self.base_url})
+        return self._request("GET", form["action"], params=data, headers={"Referer": self.base_url})
+
+    def fetch(self, container_number):
+        """Return (html, final_url) of the result page for one container"""
+        form = self._load_form()
+        resp = self._submit(form, container_number)
+        status = result_status(resp.text, container_number)
+        if status == "miss":
+            # Stale hidden tokens are the usual cause; reload the form once
+            form = self._load_form(refresh=True)
+            resp = self._submit(form, container_number)
+            status = result_status(resp.text, container_number)
+        if status == "no_record":
+            raise HttpPathError(f"Portal has no record of {container_number}")
+        if status != "hit":
+            raise HttpPathError(f"No result row for {container_number}")
+        return resp.text, resp.url
+
+    def fetch_many(self, containers):
+        """Submit all lookups (bounded concurrency); returns futures in input order"""
+        return [self.executor.submit(self.fetch, c) for c in containers]
+
+    # -------------------------------------------------------------
+    # Rendering
+    # -------------------------------------------------------------
+    def render_pdf(self, driver, html, page_url, pdf_path):
+        """Render fetched HTML in a dedicated tab and print it to pdf_path"""
+        with self._render_lock:
+            original = driver.current_window_handle
+            if self._render_handle not in driver.window_handles:
+                driver.switch_to.new_window("tab")
+                self._render_handle = driver.current_window_handle
+            else:
+                driver.switch_to.window(self._render_handle)
+
+            try:
+                base_tag = f'<base href="{page_url}">'
+                if re.search(r"<head[^>]*>", html, re.I):
+                    html = re.sub(r"(<head[^>]*>)", r"\1" + base_tag, html, count=1, flags=re.I)
+                else:
+                    html = base_tag + html
+
+                frame_id = driver.execute_cdp_cmd("Page.getFrameTree", {})["frameTree"]["frame"]["id"]
+                driver.execute_cdp_cmd("Page.setDocumentContent", {"frameId": frame_id, "html": html})
+
+                deadline = time.time() + 5
+                while time.time() < deadline:
+                    if driver.execute_script(
+                            "return document.readyState === 'complete' && "
+                            "Array.from(document.images).every(i => i.complete)"):
+                        break
+                    time.sleep(0.1)
+
+                pdf_data = driver.execute_cdp_cmd("Page.printToPDF", PDF_OPTIONS)
+                with open(pdf_path, "wb") as f:
+                    f.write(base64.b64decode(pdf_data["data"]))
+            finally:
+                driver.switch_to.window(original)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
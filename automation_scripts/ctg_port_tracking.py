@@ -4,25 +4,44 @@
 CTG Port Authority Tracking Automation (Headless + Private + Auto Driver)
 Author: Izaz Ahamed
 -------------------------------------------------------------
-✅ Runs headless with undetected_chromedriver
+✅ Runs headless with pooled undetected_chromedriver instances
 ✅ Always starts in private (incognito) mode
-✅ Auto PDF export per container + combined report
+✅ Auto PDF export per container + combined report (built incrementally)
+✅ HTTP fast path (pooled, concurrent) with Selenium fallback
+✅ Persistent lookup cache — repeated containers skip the portal (--no-cache to bypass)
+✅ Row checkpoint journal — a restarted job resumes where it stopped
+✅ Soft reset on failed rows, browser recycled after N rows or high renderer memory
+✅ Trackers, chat widgets and web fonts blocked (per-portal policy), bytes counted per row
+✅ Portal circuit breaker: while cpatos.gov.bd is down, remaining containers fail
+   at once (PortalUnavailable) instead of each waiting out its timeouts
 ✅ Handles popups, alerts, and summary reports
 ✅ Works on Linux VPS (Ubuntu) with Chrome installed
 """
 
-import os, sys, time, logging, base64, tempfile, shutil, json
-import pandas as pd
+import os, sys, time, logging, base64, json
 from datetime import datetime
-from PyPDF2 import PdfMerger
-import undetected_chromedriver as uc
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoAlertPresentException
 
+from browser_pool import get_pool, DriverHealth
+from circuit_breaker import CircuitBreaker, EXIT_PORTAL_DOWN
+from input_reader import read_column
+from ctg_http_engine import CtgHttpEngine
+from job_journal import JobJournal, row_key
+from lookup_cache import LookupCache, normalize_key, CACHE_BYPASS
+from network_policy import NetworkMeter
+from progress import JobProgress
+from rate_governor import RateGovernor
+from report_writer import StreamingPdfReport
+from wait_engine import WaitEngine, WaitStats
+
+HTTP_FAST_PATH = os.environ.get("CTG_HTTP_FAST_PATH", "1") == "1"
+
 class CtgPortTrackingAutomation:
-    def __init__(self, headless=True, output_dir='results', job_id=None):
+    def __init__(self, headless=True, output_dir='results', job_id=None, http_fast_path=HTTP_FAST_PATH,
+                 no_cache=CACHE_BYPASS):
         self.headless = headless
         self.output_dir = output_dir
         self.job_id = job_id
@@ -31,8 +50,19 @@ class CtgPortTrackingAutomation:
         self.results = []
         self.result_files = []
         self.base_url = "https://cpatos.gov.bd/pcs/"
-        self.temp_profile = None
+        self.http_fast_path = http_fast_path
+        self.http_engine = None
+        self.report = None
+        self.waits = None
+        self.health = None
+        self.wait_stats = WaitStats()
         self.setup_logging(job_id)
+        self.cache = LookupCache(bypass=no_cache, log=self.logger)
+        self.network = NetworkMeter(self.logger)
+        self.governor = RateGovernor.for_url(self.base_url, log=self.logger)
+        self.breaker = CircuitBreaker.for_url(self.base_url, log=self.logger)
+        self.progress = None
+        self.journal = None
 
     # -------------------------------------------------------------
     def setup_logging(self, job_id=None):
@@ -45,45 +75,22 @@ class CtgPortTrackingAutomation:
         logging.basicConfig(
             level=logging.INFO,
             format="%(asctime)s - %(levelname)s - %(message)s",
-            handlers=[logging.FileHandler(log_path), logging.StreamHandler(sys.stdout)]
+            handlers=[logging.FileHandler(log_path), logging.StreamHandler(sys.stdout)],
+            force=True
         )
         self.logger = logging.getLogger(f"CtgPortTracking-{job_id}")
 
     # -------------------------------------------------------------
     def setup_driver(self):
-        self.logger.info("🔧 Launching headless Chrome (private mode)...")
-
-        self.temp_profile = tempfile.mkdtemp(prefix="ctg_profile_")
-        opts = uc.ChromeOptions()
-        if self.headless:
-            opts.add_argument("--headless=new")
-        opts.add_argument("--no-sandbox")
-        opts.add_argument("--disable-dev-shm-usage")
-        opts.add_argument("--disable-gpu")
-        opts.add_argument("--disable-blink-features=AutomationControlled")
-        opts.add_argument("--window-size=1360,768")
-        opts.add_argument("--incognito")
-        opts.add_argument("--disable-cache")
-        opts.add_argument("--disable-application-cache")
-        opts.add_argument("--disk-cache-size=0")
-        opts.add_argument("--disable-plugins-discovery")
-        opts.add_argument("--no-first-run")
-        opts.add_argument("--no-default-browser-check")
-        opts.add_argument("--mute-audio")
-        opts.add_argument("--disable-extensions")
-        opts.add_argument("--user-data-dir=" + self.temp_profile)
-
-        for path in ["/usr/bin/google-chrome", "/usr/bin/chromium", "/usr/bin/chromium-browser"]:
-            if os.path.exists(path):
-                opts.binary_location = path
-                break
-
+        self.logger.info("🔧 Leasing headless Chrome (private mode) from pool...")
         try:
-            self.driver = uc.Chrome(options=opts, use_subprocess=True)
+            self.driver = get_pool().lease("cpatos", headless=self.headless)
             self.wait = WebDriverWait(self.driver, 20)
+            self.waits = WaitEngine(self.driver, "cpatos", self.wait_stats)
+            self.health = DriverHealth(self.driver, on_new_session=self.restore_session, log=self.logger)
             os.makedirs(self.output_dir, exist_ok=True)
             os.makedirs(os.path.join(self.output_dir, "pdfs"), exist_ok=True)
-            self.logger.info("✅ Chrome started successfully (undetected, headless, incognito)")
+            self.logger.info("✅ Chrome ready (undetected, headless, incognito)")
             return True
         except Exception as e:
             self.logger.error(f"❌ Failed to launch Chrome: {e}")
@@ -99,8 +106,47 @@ class CtgPortTrackingAutomation:
             return True
         except Exception as e:
             self.logger.error(f"❌ Navigation failed: {e}")
+            self.breaker.record(False)
             return False
 
+    def restore_session(self, driver):
+        """Re-open the portal on a reset or relaunched browser"""
+        self.driver = driver
+        self.wait = WebDriverWait(driver, 20)
+        self.waits = WaitEngine(driver, "cpatos", self.wait_stats)
+        if not self.navigate_to_portal():
+            raise RuntimeError("CTG portal did not load")
+
+    def after_row(self, ok):
+        """Recover the browser after a failed row; recycle it after N rows or high memory"""
+        try:
+            if not ok:
+                self.health.recover()
+            self.health.row_done()
+        except Exception as e:
+            self.logger.error(f"❌ Browser recovery failed: {e}")
+
+    def measure_row(self, label, ok, started):
+        """Per-row traffic counters; latency, throttling and server errors pace the shared
+        portal rate (a row that only found nothing does not)"""
+        latency = time.time() - started
+        traffic = self.network.sample(self.driver, label) if self.driver else None
+        outage = self.breaker.record(ok)
+        self.governor.report(latency, throttled=bool(traffic and traffic["throttled"]),
+                             server_error=outage or bool(traffic and traffic["errors"]))
+
+    def skip_row(self, index, container_number):
+        """Fail a row without touching the portal (circuit open)"""
+        error = self.breaker.skip()
+        self.results.append({
+            "container_number": container_number,
+            "status": "error",
+            "error": str(error),
+            "timestamp": datetime.now().isoformat()
+        })
+        self.progress.row_error(index, error)
+        self.progress.row_finished(index, key=container_number)
+
     # -------------------------------------------------------------
     def handle_alert(self):
         try:
@@ -121,27 +167,33 @@ class CtgPortTrackingAutomation:
         try:
             self.logger.info(f"🔍 Processing container {index}: {container_number}")
             self.driver.get(self.base_url)
-            time.sleep(2)
 
-            input_field = self.wait.until(EC.presence_of_element_located((By.ID, "containerLocation")))
+            input_field = self.waits.until(EC.presence_of_element_located((By.ID, "containerLocation")),
+                                           "search form", replaces=2)
             input_field.clear()
             input_field.send_keys(container_number)
 
+            original_window = self.driver.current_window_handle
+            existing_windows = set(self.driver.window_handles)
+
             submit_btn = self.wait.until(EC.element_to_be_clickable(
                 (By.CSS_SELECTOR, "input[type='submit'][value='Search']#submit")))
             submit_btn.click()
-            time.sleep(2)
+            try:
+                # Search answers with an alert, a popup window or a navigation of this page
+                self.waits.until(
+                    lambda d: EC.alert_is_present()(d)
+                    or len(d.window_handles) > len(existing_windows)
+                    or EC.staleness_of(submit_btn)(d),
+                    "search submit", replaces=2, timeout=10)
+            except TimeoutException:
+                pass
             self.handle_alert()
 
-            all_windows = self.driver.window_handles
-            original_window = self.driver.current_window_handle
-
-            if len(all_windows) > 1:
-                for w in all_windows:
-                    if w != original_window:
-                        self.driver.switch_to.window(w)
-                        break
-            time.sleep(5)
+            new_windows = [w for w in self.driver.window_handles if w not in existing_windows]
+            if new_windows:
+                self.driver.switch_to.window(new_windows[0])
+            self.waits.settle("result page", replaces=5)
 
             self.wait.until(EC.presence_of_element_located((By.TAG_NAME, "body")))
 
@@ -160,8 +212,12 @@ class CtgPortTrackingAutomation:
                 f.write(base64.b64decode(pdf_data["data"]))
 
             self.logger.info(f"✅ PDF saved: {pdf_filename}")
+            if self.report:
+                self.report.append(pdf_path, index)
+            self.cache.store("ctg", normalize_key(container_number), pdf_path, {"job_id": self.job_id})
+            self.journal.record(row_key(index, container_number), [pdf_path])
 
-            if len(all_windows) > 1:
+            if new_windows:
                 self.driver.close()
                 self.driver.switch_to.window(original_window)
 
@@ -175,6 +231,7 @@ class CtgPortTrackingAutomation:
 
         except Exception as e:
             self.logger.error(f"❌ Error for {container_number}: {e}")
+            self.progress.row_error(index, e)
             self.results.append({
                 "container_number": container_number,
                 "status": "error",
@@ -186,92 +243,203 @@ class CtgPortTrackingAutomation:
     # -------------------------------------------------------------
     def read_container_file(self, file_path):
         try:
-            ext = os.path.splitext(file_path)[1].lower()
-            df = pd.read_csv(file_path) if ext == ".csv" else pd.read_excel(file_path)
-            col = df.columns[0]
-            containers = [str(x).strip() for x in df[col].dropna().tolist() if str(x).strip()]
-            return containers
+            return list(read_column(file_path))
         except Exception as e:
             self.logger.error(f"❌ Failed to read file: {e}")
             return []
 
     # -------------------------------------------------------------
-    def process_all(self, containers):
-        success, fail = [], []
+    def process_container_http(self, container_number, index, future):
+        """Render a prefetched HTTP result; returns None so the caller falls back"""
+        try:
+            html, page_url = future.result()
+            pdf_filename = f"{index:03d}_{container_number}_tracking.pdf"
+            pdf_path = os.path.join(self.output_dir, "pdfs", pdf_filename)
+            self.http_engine.render_pdf(self.driver, html, page_url, pdf_path)
+            self.logger.info(f"⚡ PDF saved via HTTP fast path: {pdf_filename}")
+            if self.report:
+                self.report.append(pdf_path, index)
+            self.cache.store("ctg", normalize_key(container_number), pdf_path, {"job_id": self.job_id})
+            self.journal.record(row_key(index, container_number), [pdf_path])
+            self.results.append({
+                "container_number": container_number,
+                "status": "success",
+                "pdf_file": pdf_filename,
+                "engine": "http",
+                "timestamp": datetime.now().isoformat()
+            })
+            return pdf_filename
+        except Exception as e:
+            self.logger.warning(f"⚠️ HTTP fast path failed for {container_number}, using browser: {e}")
+            return None
+
+    def serve_known_rows(self, containers):
+        """Skip rows done in an earlier run and serve cache hits;
+        returns (pdfs already available, [(index, container)] still to fetch)"""
+        os.makedirs(os.path.join(self.output_dir, "pdfs"), exist_ok=True)
+        known, pending = [], []
         for i, c in enumerate(containers, 1):
-            pdf = self.process_container(c, i)
-            (success if pdf else fail).append(c)
-            time.sleep(2)
-        return success, fail
+            pdf_filename = f"{i:03d}_{c}_tracking.pdf"
+            pdf_path = os.path.join(self.output_dir, "pdfs", pdf_filename)
+            if self.journal.done(row_key(i, c)):
+                engine = "journal"
+            elif self.cache.link("ctg", normalize_key(c), pdf_path):
+                engine = "cache"
+                self.journal.record(row_key(i, c), [pdf_path])
+            else:
+                pending.append((i, c))
+                continue
+            if self.report:
+                self.report.append(pdf_path, i)
+            self.progress.row_finished(i, pdf_path, source=engine, key=c)
+            self.results.append({
+                "container_number": c,
+                "status": "success",
+                "pdf_file": pdf_filename,
+                "engine": engine,
+                "timestamp": datetime.now().isoformat()
+            })
+            known.append(pdf_filename)
+        return known, pending
+
+    def process_all(self, items):
+        pdfs, fail = [], []
+        futures = [None] * len(items)
+        if self.http_fast_path and self.breaker.ready():
+            try:
+                self.http_engine = CtgHttpEngine(self.base_url, self.logger, governor=self.governor,
+                                                 breaker=self.breaker)
+                futures = self.http_engine.fetch_many([c for _, c in items])
+            except Exception as e:
+                self.logger.warning(f"⚠️ HTTP fast path unavailable: {e}")
+
+        for (i, c), future in zip(items, futures):
+            if not self.breaker.ready():
+                if future is not None:
+                    future.cancel()
+                self.skip_row(i, c)
+                fail.append(c)
+                continue
+            self.progress.row_started(i, c)
+            pdf = None
+            if future is not None:
+                pdf = self.process_container_http(c, i, future)
+            if not pdf:
+                # Browser fallback: paced per portal across all jobs
+                self.governor.acquire()
+                started = time.time()
+                pdf = self.process_container(c, i)
+                self.measure_row(c, pdf is not None, started)
+            self.progress.row_finished(i, os.path.join(self.output_dir, "pdfs", pdf) if pdf else None, key=c)
+            if pdf:
+                pdfs.append(pdf)
+            else:
+                fail.append(c)
+            self.after_row(pdf is not None)
+        return pdfs, fail
 
     # -------------------------------------------------------------
+    def start_report(self):
+        combined_name = f"ctg_port_tracking_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+        self.report = StreamingPdfReport(os.path.join(self.output_dir, combined_name))
+        return self.report
+
     def generate_combined_report(self, pdfs):
         if not pdfs:
+            if self.report:
+                self.report.abort()
             return None
-        combined_name = f"ctg_port_tracking_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-        combined_path = os.path.join(self.output_dir, combined_name)
-        merger = PdfMerger()
-        for pdf in pdfs:
-            path = os.path.join(self.output_dir, "pdfs", pdf)
-            if os.path.exists(path):
-                merger.append(path)
-        merger.write(combined_path)
-        merger.close()
+        if self.report is None:
+            self.start_report()
+            for i, pdf in enumerate(pdfs):
+                path = os.path.join(self.output_dir, "pdfs", pdf)
+                if os.path.exists(path):
+                    self.report.append(path, i)
+        combined_path = self.report.finalize()
+        if not combined_path:
+            return None
+        combined_name = os.path.basename(combined_path)
         self.logger.info(f"✅ Combined PDF saved: {combined_name}")
         return combined_name
 
     # -------------------------------------------------------------
     def cleanup(self):
+        if self.http_engine:
+            self.http_engine.close()
+            self.http_engine = None
+        if self.health:
+            self.health.log_summary()
+            self.health = None
         try:
             if self.driver:
-                self.driver.quit()
-                self.logger.info("🔒 Browser closed.")
+                get_pool().release(self.driver)
+                self.driver = None
+                self.logger.info("🔒 Browser returned to pool.")
         except Exception as e:
             self.logger.warning(f"Cleanup error: {e}")
-        if self.temp_profile and os.path.exists(self.temp_profile):
-            try:
-                shutil.rmtree(self.temp_profile)
-                self.logger.info(f"🗑️ Cleaned profile: {self.temp_profile}")
-            except Exception as e:
-                self.logger.warning(f"Temp cleanup error: {e}")
 
     # -------------------------------------------------------------
     def run(self, file_path):
         try:
-            if not self.setup_driver():
-                return False
-            if not self.navigate_to_portal():
-                return False
-
             containers = self.read_container_file(file_path)
+            self.progress = JobProgress(self.output_dir, total=len(containers), job_id=self.job_id)
             if not containers:
                 self.logger.error("No container numbers found.")
                 return False
 
-            success, fail = self.process_all(containers)
-            combined = self.generate_combined_report(
-                [f"{i+1:03d}_{c}_tracking.pdf" for i, c in enumerate(success)]
-            )
-            self.logger.info(f"🎉 Done. Success={len(success)} Fail={len(fail)}")
+            self.start_report()
+            self.journal = JobJournal(self.output_dir, self.job_id, log=self.logger)
+            known, items = self.serve_known_rows(containers)
+            pdfs, fail = [], []
+            if items and not self.breaker.ready():
+                for i, c in items:
+                    self.skip_row(i, c)
+                fail = [c for _, c in items]
+            elif items:
+                if not self.setup_driver():
+                    return False
+                if not self.navigate_to_portal():
+                    return False
+                pdfs, fail = self.process_all(items)
+            pdfs = sorted(known + pdfs, key=lambda name: int(name.split("_", 1)[0]))   # row index, not text
+            combined = self.generate_combined_report(pdfs)
+            if combined:
+                self.progress.artifact(os.path.join(self.output_dir, combined))
+            self.progress.finish(**self.breaker.summary())
+            self.wait_stats.log_summary(self.logger)
+            self.network.log_summary(self.logger)
+            self.governor.log_summary(self.logger)
+            self.breaker.log_summary(self.logger)
+            self.cache.log_summary(self.logger)
+            self.logger.info(f"🎉 Done. Success={len(pdfs)} Fail={len(fail)}")
             return True
         finally:
             self.cleanup()
+            self.cache.close()
+            if self.journal:
+                self.journal.close()
+            if self.report:
+                self.report.abort()
 
 
-def main():
-    if len(sys.argv) < 4:
-        print("Usage: python ctg_port_tracking.py <input_file> <output_dir> <job_id>")
-        sys.exit(1)
+def main(argv=None):
+    argv = sys.argv if argv is None else argv
+    if len(argv) < 4:
+        print("Usage: python ctg_port_tracking.py <input_file> <output_dir> <job_id> [--no-cache]")
+        return 1
 
-    file_path, output_dir, job_id = sys.argv[1], sys.argv[2], sys.argv[3]
+    file_path, output_dir, job_id = argv[1], argv[2], argv[3]
     if not os.path.exists(file_path):
         print(f"❌ File not found: {file_path}")
-        sys.exit(1)
+        return 1
 
-    app = CtgPortTrackingAutomation(headless=True, output_dir=output_dir, job_id=job_id)
+    app = CtgPortTrackingAutomation(headless=True, output_dir=output_dir, job_id=job_id,
+                                    no_cache=CACHE_BYPASS or "--no-cache" in argv)
     ok = app.run(file_path)
-    sys.exit(0 if ok else 1)
+    if app.breaker.skipped and not (app.progress and app.progress.ok):
+        return EXIT_PORTAL_DOWN
+    return 0 if ok else 1
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
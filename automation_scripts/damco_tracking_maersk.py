@@ -5,34 +5,97 @@ Damco (APM) Tracking for Incentive - Maersk Portal Automation (Headless + Privat
 Author: Izaz Ahamed
 ------------------------------------------------------------
 ✅ Headless & private Chrome (no cache, no cookies)
-✅ Automatic driver management via undetected_chromedriver
-✅ PDF export per FCR + combined report
+✅ Warm undetected_chromedriver instances from the shared browser pool
+✅ PDF export per FCR + combined report (built incrementally as rows finish)
+✅ Optional parallel mode: FCRs sharded across K browsers with work stealing
+✅ Persistent lookup cache — repeated FCRs skip the browser (--no-cache to bypass)
+✅ Row checkpoint journal — a restarted job resumes where it stopped
+✅ Soft reset on failed rows, browser recycled after N rows or high renderer memory
+✅ Trackers, chat widgets and web fonts blocked (per-portal policy), bytes counted per row
+✅ Pre-warmed profile template: consent already given, banner checks are quick
+✅ Portal circuit breaker: while maersk.com is down, remaining FCRs fail at once
+   (PortalUnavailable) instead of each waiting out its timeouts
 ✅ Compatible with Smart Process Flow architecture
 """
 
-import os, sys, time, logging, base64, tempfile, shutil, json
-import pandas as pd
+import os, sys, time, logging, base64, json, threading
+from collections import deque
 from datetime import datetime
-from PyPDF2 import PdfMerger
 
-# Selenium/UC imports
-import undetected_chromedriver as uc
+# Selenium imports
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException
 
+from browser_pool import get_pool, DriverHealth
+from circuit_breaker import CircuitBreaker, EXIT_PORTAL_DOWN
+from input_reader import read_column
+from job_journal import JobJournal, row_key
+from lookup_cache import LookupCache, normalize_key, CACHE_BYPASS
+from network_policy import NetworkMeter
+from progress import JobProgress
+from rate_governor import RateGovernor
+from report_writer import StreamingPdfReport
+from wait_engine import WaitEngine, WaitStats
+
+MAERSK_TRACK_URL = "https://www.maersk.com/mymaersk-scm-track/"
+PARALLEL_WORKERS = int(os.environ.get("DAMCO_PARALLEL_WORKERS", "1"))
+POPUP_TIMEOUT = 20
+SEEDED_POPUP_TIMEOUT = 3     # template profiles carry the consent state, banners rarely show
+
 class DamcoTrackingAutomation:
-    def __init__(self, headless=True, output_dir='results', job_id=None):
+    def __init__(self, headless=True, output_dir='results', job_id=None, workers=PARALLEL_WORKERS,
+                 no_cache=CACHE_BYPASS):
         self.headless = headless
         self.output_dir = output_dir
         self.job_id = job_id
-        self.driver = None
-        self.wait = None
+        self.workers = max(1, workers)
+        # driver/wait are per thread so each shard worker drives its own browser
+        self._local = threading.local()
         self.results = []
         self.result_files = []
-        self.temp_profile = None
+        self.report = None
+        self.wait_stats = WaitStats()
         self.setup_logging(job_id)
+        self.cache = LookupCache(bypass=no_cache, log=self.logger)
+        self.network = NetworkMeter(self.logger)
+        self.governor = RateGovernor.for_url(MAERSK_TRACK_URL, log=self.logger)
+        self.breaker = CircuitBreaker.for_url(MAERSK_TRACK_URL, log=self.logger)
+        self.progress = None
+        self.journal = None
+
+    @property
+    def driver(self):
+        return getattr(self._local, "driver", None)
+
+    @driver.setter
+    def driver(self, value):
+        self._local.driver = value
+
+    @property
+    def wait(self):
+        return getattr(self._local, "wait", None)
+
+    @wait.setter
+    def wait(self, value):
+        self._local.wait = value
+
+    @property
+    def waits(self):
+        return getattr(self._local, "waits", None)
+
+    @waits.setter
+    def waits(self, value):
+        self._local.waits = value
+
+    @property
+    def health(self):
+        return getattr(self._local, "health", None)
+
+    @health.setter
+    def health(self, value):
+        self._local.health = value
 
     # -------------------------------------------------------------
     # Logging setup
@@ -50,7 +113,8 @@ class DamcoTrackingAutomation:
             handlers=[
                 logging.FileHandler(log_path),
                 logging.StreamHandler(sys.stdout)
-            ]
+            ],
+            force=True
         )
         self.logger = logging.getLogger(f"DamcoTracking-{job_id}")
 
@@ -58,38 +122,13 @@ class DamcoTrackingAutomation:
     # Driver setup (UC)
     # -------------------------------------------------------------
     def setup_driver(self):
-        self.logger.info("🔧 Launching headless Chrome (private mode)...")
-
-        self.temp_profile = tempfile.mkdtemp(prefix="damco_profile_")
-        options = uc.ChromeOptions()
-        if self.headless:
-            options.add_argument("--headless=new")
-        options.add_argument("--no-sandbox")
-        options.add_argument("--disable-dev-shm-usage")
-        options.add_argument("--disable-gpu")
-        options.add_argument("--disable-blink-features=AutomationControlled")
-        options.add_argument("--window-size=1360,768")
-        options.add_argument("--incognito")
-        options.add_argument("--disable-cache")
-        options.add_argument("--disable-application-cache")
-        options.add_argument("--disk-cache-size=0")
-        options.add_argument("--disable-plugins-discovery")
-        options.add_argument("--no-first-run")
-        options.add_argument("--no-default-browser-check")
-        options.add_argument("--disable-extensions")
-        options.add_argument("--mute-audio")
-        options.add_argument("--start-maximized")
-        options.add_argument("--user-data-dir=" + self.temp_profile)
-
-        for path in ["/usr/bin/google-chrome", "/usr/bin/chromium", "/usr/bin/chromium-browser"]:
-            if os.path.exists(path):
-                options.binary_location = path
-                break
-
+        self.logger.info("🔧 Leasing headless Chrome (private mode) from pool...")
         try:
-            self.driver = uc.Chrome(options=options, use_subprocess=True)
+            self.driver = get_pool().lease("maersk", headless=self.headless)
             self.wait = WebDriverWait(self.driver, 20)
-            self.logger.info("✅ Chrome launched successfully (undetected + headless)")
+            self.waits = WaitEngine(self.driver, "maersk", self.wait_stats)
+            self.health = DriverHealth(self.driver, on_new_session=self.restore_session, log=self.logger)
+            self.logger.info("✅ Chrome ready (undetected + headless)")
             os.makedirs(self.output_dir, exist_ok=True)
             os.makedirs(os.path.join(self.output_dir, "pdfs"), exist_ok=True)
             return True
@@ -103,23 +142,29 @@ class DamcoTrackingAutomation:
     def navigate_to_maersk(self):
         try:
             self.logger.info("🌐 Opening Maersk tracking portal...")
-            self.driver.get("https://www.maersk.com/mymaersk-scm-track/")
+            self.driver.get(MAERSK_TRACK_URL)
             self.wait.until(EC.presence_of_element_located((By.TAG_NAME, "body")))
             self.logger.info("📍 Page loaded successfully.")
             return True
         except Exception as e:
             self.logger.error(f"❌ Navigation failed: {e}")
+            self.breaker.record(False)
             return False
 
+    def popup_wait(self):
+        seeded = get_pool().is_seeded(self.driver)
+        return WebDriverWait(self.driver, SEEDED_POPUP_TIMEOUT if seeded else POPUP_TIMEOUT)
+
     def accept_cookies(self):
         try:
             self.logger.info("🍪 Checking cookie popup...")
-            allow_btn = self.wait.until(
+            allow_btn = self.popup_wait().until(
                 EC.element_to_be_clickable((By.CSS_SELECTOR, "button[data-test='coi-allow-all-button']"))
             )
             allow_btn.click()
             self.logger.info("✅ Cookies accepted.")
-            time.sleep(2)
+            self.waits.until(EC.invisibility_of_element_located(
+                (By.CSS_SELECTOR, "button[data-test='coi-allow-all-button']")), "cookie banner", replaces=2)
         except TimeoutException:
             self.logger.info("⚠️ No cookie banner found.")
         except Exception as e:
@@ -127,12 +172,13 @@ class DamcoTrackingAutomation:
 
     def close_coach_popup(self):
         try:
-            got_it_btn = self.wait.until(
+            got_it_btn = self.popup_wait().until(
                 EC.element_to_be_clickable((By.CSS_SELECTOR, "button[data-test='finishButton']"))
             )
             got_it_btn.click()
             self.logger.info("✅ Closed coach popup.")
-            time.sleep(2)
+            self.waits.until(EC.invisibility_of_element_located(
+                (By.CSS_SELECTOR, "button[data-test='finishButton']")), "coach popup", replaces=2)
         except TimeoutException:
             self.logger.info("⚠️ No coach popup found.")
         except Exception as e:
@@ -156,7 +202,7 @@ class DamcoTrackingAutomation:
                 EC.element_to_be_clickable((By.XPATH, f"//div[@id='fcr_by_fcr_number']//a[contains(text(), '{booking_number}')]"))
             )
             fcr_link.click()
-            time.sleep(5)
+            self.waits.settle("fcr details", replaces=5)
 
             pdf_filename = f"{index:03d}_{booking_number}_tracking.pdf"
             pdf_path = os.path.join(self.output_dir, "pdfs", pdf_filename)
@@ -168,64 +214,226 @@ class DamcoTrackingAutomation:
             with open(pdf_path, "wb") as f:
                 f.write(base64.b64decode(pdf_data["data"]))
             self.logger.info(f"✅ PDF saved: {pdf_filename}")
+            if self.report:
+                self.report.append(pdf_path, index)
+            self.cache.store("damco", normalize_key(booking_number), pdf_path, {"job_id": self.job_id})
+            self.journal.record(row_key(index, booking_number), [pdf_path])
 
-            self.results.append({"fcr_number": booking_number, "status": "success", "pdf_file": pdf_filename})
+            self.results.append({"index": index, "fcr_number": booking_number, "status": "success", "pdf_file": pdf_filename})
             return pdf_filename
         except Exception as e:
             self.logger.error(f"❌ Error processing {booking_number}: {e}")
-            self.results.append({"fcr_number": booking_number, "status": "error", "error": str(e)})
+            self.progress.row_error(index, e)
+            self.results.append({"index": index, "fcr_number": booking_number, "status": "error", "error": str(e)})
             return None
         finally:
-            self.driver.switch_to.default_content()
+            try:
+                self.driver.switch_to.default_content()
+            except Exception:
+                pass
 
     # -------------------------------------------------------------
     # File Reading
     # -------------------------------------------------------------
     def read_booking_numbers_from_file(self, file_path):
         try:
-            ext = os.path.splitext(file_path)[1].lower()
-            if ext == ".csv":
-                df = pd.read_csv(file_path)
-            elif ext in [".xls", ".xlsx"]:
-                df = pd.read_excel(file_path, engine="openpyxl")
-            else:
-                raise ValueError("Unsupported file type")
-            col = df.columns[0]
-            bookings = [str(x).strip() for x in df[col].dropna().tolist() if str(x).strip()]
-            return bookings
+            return list(read_column(file_path))
         except Exception as e:
             self.logger.error(f"❌ Failed to read {file_path}: {e}")
             return []
 
+    # -------------------------------------------------------------
+    # Journal (resume) + lookup cache
+    # -------------------------------------------------------------
+    def serve_known_rows(self, bookings):
+        """Skip rows done in an earlier run and serve cache hits;
+        returns (pdfs already available, [(index, booking)] still to fetch)"""
+        known, pending = [], []
+        for i, b in enumerate(bookings, 1):
+            pdf_filename = f"{i:03d}_{b}_tracking.pdf"
+            pdf_path = os.path.join(self.output_dir, "pdfs", pdf_filename)
+            if self.journal.done(row_key(i, b)):
+                source = "resumed"
+            elif self.cache.link("damco", normalize_key(b), pdf_path):
+                source = "cached"
+                self.journal.record(row_key(i, b), [pdf_path])
+            else:
+                pending.append((i, b))
+                continue
+            if self.report:
+                self.report.append(pdf_path, i)
+            self.progress.row_finished(i, pdf_path, source=source, key=b)
+            self.results.append({"index": i, "fcr_number": b, "status": "success",
+                                 "pdf_file": pdf_filename, source: True})
+            known.append(pdf_filename)
+        return known, pending
+
     # -------------------------------------------------------------
     # Process All Bookings
     # -------------------------------------------------------------
-    def process_all_bookings(self, bookings):
+    def process_all_bookings(self, items):
+        if self.workers > 1 and len(items) > 1:
+            return self.process_bookings_parallel(items)
+
         pdfs, fails = [], []
-        for i, b in enumerate(bookings, 1):
+        for i, b in items:
+            if not self.breaker.ready():
+                self.skip_row(i, b)
+                fails.append(b)
+                continue
+            self.governor.acquire()
+            self.progress.row_started(i, b)
+            started = time.time()
             pdf = self.process_booking(b, i)
+            self.finish_row(i, b, pdf)
             if pdf:
                 pdfs.append(pdf)
             else:
                 fails.append(b)
-            time.sleep(2)
+            self.measure_row(b, pdf is not None, started)
+            self.after_row(pdf is not None)
+        return pdfs, fails
+
+    # -------------------------------------------------------------
+    # Parallel mode (K browsers, work stealing)
+    # -------------------------------------------------------------
+    def open_session(self):
+        if not self.setup_driver():
+            return False
+        if not self.navigate_to_maersk():
+            return False
+        self.accept_cookies()
+        self.close_coach_popup()
+        return True
+
+    def restore_session(self, driver):
+        """Re-open the portal on a reset or relaunched browser"""
+        self.driver = driver
+        self.wait = WebDriverWait(driver, 20)
+        self.waits = WaitEngine(driver, "maersk", self.wait_stats)
+        if not self.navigate_to_maersk():
+            raise RuntimeError("Maersk portal did not load")
+        self.accept_cookies()
+        self.close_coach_popup()
+
+    def after_row(self, ok):
+        """Recover the browser after a failed row; recycle it after N rows or high memory"""
+        try:
+            if not ok:
+                self.health.recover()
+            self.health.row_done()
+        except Exception as e:
+            self.logger.error(f"❌ Browser recovery failed: {e}")
+
+    def skip_row(self, index, booking):
+        """Fail a row without touching the portal (circuit open)"""
+        error = self.breaker.skip()
+        self.results.append({"index": index, "fcr_number": booking, "status": "error", "error": str(error)})
+        self.progress.row_error(index, error)
+        self.progress.row_finished(index, key=booking)
+
+    def finish_row(self, index, booking, pdf):
+        artifact = os.path.join(self.output_dir, "pdfs", pdf) if pdf else None
+        self.progress.row_finished(index, artifact, key=booking)
+
+    def measure_row(self, label, ok, started):
+        """Per-row traffic counters; latency, throttling and server errors pace the shared
+        portal rate (a row that only found nothing does not)"""
+        latency = time.time() - started
+        traffic = self.network.sample(self.driver, label) if self.driver else None
+        outage = self.breaker.record(ok)
+        self.governor.report(latency, throttled=bool(traffic and traffic["throttled"]),
+                             server_error=outage or bool(traffic and traffic["errors"]))
+
+    def _next_booking(self, worker_id, queues, lock):
+        """Pop from own shard; when empty, steal from the tail of the longest shard"""
+        with lock:
+            if queues[worker_id]:
+                return queues[worker_id].popleft()
+            victim = max(range(len(queues)), key=lambda q: len(queues[q]))
+            if queues[victim]:
+                return queues[victim].pop()
+        return None
+
+    def _shard_worker(self, worker_id, queues, lock, done):
+        try:
+            if not self.open_session():
+                self.logger.error(f"❌ Worker {worker_id}: browser session failed, leaving rows to other workers")
+                return
+            while True:
+                item = self._next_booking(worker_id, queues, lock)
+                if item is None:
+                    break
+                index, booking = item
+                if not self.breaker.ready():
+                    self.skip_row(index, booking)
+                    done[index] = None
+                    continue
+                self.governor.acquire()
+                self.progress.row_started(index, booking)
+                started = time.time()
+                done[index] = self.process_booking(booking, index)
+                self.finish_row(index, booking, done[index])
+                self.measure_row(booking, done[index] is not None, started)
+                self.after_row(done[index] is not None)
+        finally:
+            self.cleanup()
+
+    def process_bookings_parallel(self, items):
+        workers = min(self.workers, len(items))
+        self.logger.info(f"⚡ Parallel mode: {len(items)} FCRs across {workers} browsers")
+        get_pool().grow(workers)
+
+        shard_size = -(-len(items) // workers)
+        queues = [deque(items[w * shard_size:(w + 1) * shard_size]) for w in range(workers)]
+        lock = threading.Lock()
+        done = {}
+
+        threads = [
+            threading.Thread(target=self._shard_worker, args=(w, queues, lock, done), name=f"damco-worker-{w}")
+            for w in range(workers)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        pdfs, fails = [], []
+        for index, booking in items:
+            pdf = done.get(index)
+            if pdf:
+                pdfs.append(pdf)
+            else:
+                fails.append(booking)
+                if index not in done:
+                    self.results.append({"index": index, "fcr_number": booking, "status": "error", "error": "Not processed"})
+                    self.progress.row_error(index, RuntimeError("Not processed"))
+                    self.progress.row_finished(index, key=booking)
         return pdfs, fails
 
     # -------------------------------------------------------------
     # PDF Report
     # -------------------------------------------------------------
+    def start_report(self):
+        combined_filename = f"damco_tracking_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+        self.report = StreamingPdfReport(os.path.join(self.output_dir, combined_filename))
+        return self.report
+
     def generate_combined_report(self, pdfs):
         if not pdfs:
+            if self.report:
+                self.report.abort()
             return None
-        combined_filename = f"damco_tracking_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-        combined_path = os.path.join(self.output_dir, combined_filename)
-        merger = PdfMerger()
-        for pdf in pdfs:
-            path = os.path.join(self.output_dir, "pdfs", pdf)
-            if os.path.exists(path):
-                merger.append(path)
-        merger.write(combined_path)
-        merger.close()
+        if self.report is None:
+            self.start_report()
+            for i, pdf in enumerate(pdfs):
+                path = os.path.join(self.output_dir, "pdfs", pdf)
+                if os.path.exists(path):
+                    self.report.append(path, i)
+        combined_path = self.report.finalize()
+        if not combined_path:
+            return None
+        combined_filename = os.path.basename(combined_path)
         self.logger.info(f"✅ Combined PDF: {combined_filename}")
         return combined_filename
 
@@ -233,63 +441,88 @@ class DamcoTrackingAutomation:
     # Cleanup
     # -------------------------------------------------------------
     def cleanup(self):
+        if self.health:
+            self.health.log_summary()
+            self.health = None
         try:
             if self.driver:
-                self.driver.quit()
-                self.logger.info("🔒 Browser closed.")
+                get_pool().release(self.driver)
+                self.driver = None
+                self.logger.info("🔒 Browser returned to pool.")
         except Exception as e:
-            self.logger.warning(f"Error closing browser: {e}")
-        if self.temp_profile and os.path.exists(self.temp_profile):
-            try:
-                shutil.rmtree(self.temp_profile)
-                self.logger.info(f"🗑️ Temp profile cleaned: {self.temp_profile}")
-            except Exception as e:
-                self.logger.warning(f"Temp cleanup error: {e}")
+            self.logger.warning(f"Error releasing browser: {e}")
 
     # -------------------------------------------------------------
     # Main runner
     # -------------------------------------------------------------
     def run_automation(self, file_path):
         try:
-            if not self.setup_driver():
-                return False
-            if not self.navigate_to_maersk():
-                return False
-            self.accept_cookies()
-            self.close_coach_popup()
-
             bookings = self.read_booking_numbers_from_file(file_path)
-            pdfs, fails = self.process_all_bookings(bookings)
+            self.progress = JobProgress(self.output_dir, total=len(bookings), job_id=self.job_id)
+            os.makedirs(os.path.join(self.output_dir, "pdfs"), exist_ok=True)
+            self.start_report()
+            self.journal = JobJournal(self.output_dir, self.job_id, log=self.logger)
+            known, items = self.serve_known_rows(bookings)
+
+            pdfs, fails = [], []
+            if items:
+                parallel = self.workers > 1 and len(items) > 1
+                if not self.breaker.ready():
+                    for i, b in items:
+                        self.skip_row(i, b)
+                    fails = [b for _, b in items]
+                else:
+                    if not parallel and not self.open_session():
+                        return False
+                    pdfs, fails = self.process_all_bookings(items)
+            pdfs = sorted(known + pdfs, key=lambda name: int(name.split("_", 1)[0]))   # row index, not text
+            self.results.sort(key=lambda r: r["index"])
             combined_report = self.generate_combined_report(pdfs)
 
             result_files = []
             if combined_report:
                 result_files.append(combined_report)
+                self.progress.artifact(os.path.join(self.output_dir, combined_report))
             self.result_files = result_files
+            self.progress.finish(**self.breaker.summary())
 
+            self.wait_stats.log_summary(self.logger)
+            self.network.log_summary(self.logger)
+            self.governor.log_summary(self.logger)
+            self.breaker.log_summary(self.logger)
+            self.cache.log_summary(self.logger)
             self.logger.info(f"🎉 Done. Success={len(pdfs)}, Fail={len(fails)}")
             return True
         finally:
             self.cleanup()
+            self.cache.close()
+            if self.journal:
+                self.journal.close()
+            if self.report:
+                self.report.abort()
 
 
 # -------------------------------------------------------------
 # Entry Point
 # -------------------------------------------------------------
-def main():
-    if len(sys.argv) < 4:
-        print("Usage: python damco_tracking_maersk.py <input_file> <output_dir> <job_id>")
-        sys.exit(1)
+def main(argv=None):
+    argv = sys.argv if argv is None else argv
+    if len(argv) < 4:
+        print("Usage: python damco_tracking_maersk.py <input_file> <output_dir> <job_id> [--no-cache]")
+        return 1
 
-    file_path, output_dir, job_id = sys.argv[1], sys.argv[2], sys.argv[3]
+    file_path, output_dir, job_id = argv[1], argv[2], argv[3]
     if not os.path.exists(file_path):
         print(f"❌ File not found: {file_path}")
-        sys.exit(1)
+        return 1
 
-    automation = DamcoTrackingAutomation(headless=True, output_dir=output_dir, job_id=job_id)
+    automation = DamcoTrackingAutomation(headless=True, output_dir=output_dir, job_id=job_id,
+                                         no_cache=CACHE_BYPASS or "--no-cache" in argv)
     ok = automation.run_automation(file_path)
-    sys.exit(0 if ok else 1)
+    if automation.breaker.skipped and not (automation.progress and automation.progress.ok):
+        return EXIT_PORTAL_DOWN
+    return 0 if ok else 1
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Patched Chromedriver Cache (used by browser_pool for undetected_chromedriver)
+Author: Izaz Ahamed
+------------------------------------------------------------
+✅ One patched chromedriver per installed Chrome version, shared by every job
+✅ Populated once (offline: `python3 driver_cache.py`), reused by every launch
+✅ File lock around download + patch — no races between concurrent workers
+✅ Chrome upgrade detected automatically (new version → new cache entry)
+✅ Old versions pruned, only the newest few kept
+
+Usage:
+    python3 driver_cache.py            # populate for the installed Chrome
+    python3 driver_cache.py --refresh  # re-download and re-patch
+"""
+
+import os, re, sys, json, time, fcntl, shutil, logging, threading, subprocess
+
+logger = logging.getLogger("DriverCache")
+
+# -----------------------------------------------------------------------------
+# CONFIGURATION
+# -----------------------------------------------------------------------------
+DRIVER_CACHE_DIR = os.environ.get(
+    "SPF_DRIVER_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "chromedriver")
+)
+KEEP_VERSIONS = 2
+DRIVER_NAME = "chromedriver.exe" if sys.platform.startswith("win") else "chromedriver"
+CHROME_BINARIES = ["/usr/bin/google-chrome", "/usr/bin/chromium", "/usr/bin/chromium-browser"]
+
+VERSION_MISMATCH = "only supports Chrome version"
+
+
+class DriverCacheError(Exception):
+    pass
+
+
+# -----------------------------------------------------------------------------
+# CHROME VERSION
+# -----------------------------------------------------------------------------
+_version_memo = {}
+_memo_lock = threading.Lock()
+
+
+def find_chrome(binary=None):
+    if binary and os.path.exists(binary):
+        return binary
+    for path in CHROME_BINARIES:
+        if os.path.exists(path):
+            return path
+    found = shutil.which("google-chrome") or shutil.which("chromium")
+    if not found:
+        raise DriverCacheError("Chrome binary not found")
+    return found
+
+
+def chrome_version(binary=None):
+    """Full version of the installed Chrome, e.g. "141.0.7390.65" (memoised per binary mtime)"""
+    binary = find_chrome(binary)
+    memo_key = (binary, os.path.getmtime(binary))
+    with _memo_lock:
+        if memo_key in _version_memo:
+            return _version_memo[memo_key]
+    out = subprocess.run([binary, "--version"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                         timeout=15).stdout.decode(errors="ignore")
+    match = re.search(r"(\d+)\.(\d+)\.(\d+)\.(\d+)", out)
+    if not match:
+        raise DriverCacheError(f"Could not read Chrome version from {binary}: {out.strip()!r}")
+    with _memo_lock:
+        _version_memo[memo_key] = match.group(0)
+    return match.group(0)
+
+
+# -----------------------------------------------------------------------------
+# CACHE
+# -----------------------------------------------------------------------------
+class _FileLock:
+    """Exclusive flock on <root>/.lock (process-wide and thread-safe: one fd per holder)"""
+
+    def __init__(self, root):
+        self.path = os.path.join(root, ".lock")
+        self._fh = None
+
+    def __enter__(self):
+        self._fh = open(self.path, "a")
+        fcntl.flock(self._fh, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self._fh, fcntl.LOCK_UN)
+        self._fh.close()
+        self._fh = None
+
+
+def _entry_dir(version, root=DRIVER_CACHE_DIR):
+    return os.path.join(root, version)
+
+
+def cached_driver(version, root=DRIVER_CACHE_DIR):
+    """Path of the ready patched driver for version, or None"""
+    entry = _entry_dir(version, root)
+    path = os.path.join(entry, DRIVER_NAME)
+    if os.path.exists(os.path.join(entry, "ready.json")) and os.access(path, os.X_OK):
+        return path
+    return None
+
+
+def _patch_into(version, entry):
+    """Download + patch a chromedriver for the Chrome major version, copied into entry"""
+    from undetected_chromedriver.patcher import Patcher
+
+    major = int(version.split(".")[0])
+    patcher = Patcher(version_main=major)
+    patcher.auto()
+    os.makedirs(entry, exist_ok=True)
+    tmp = os.path.join(entry, DRIVER_NAME + ".part")
+    shutil.copyfile(patcher.executable_path, tmp)
+    os.chmod(tmp, 0o755)
+    if not patcher.is_binary_patched(tmp):
+        os.remove(tmp)
+        raise DriverCacheError(f"chromedriver for Chrome {major} did not come out patched")
+    os.replace(tmp, os.path.join(entry, DRIVER_NAME))
+
+
+def _prune(root, keep_version):
+    versions = []
+    for name in os.listdir(root):
+        if re.fullmatch(r"\d+(\.\d+){3}", name):
+            versions.append(name)
+    versions.sort(key=lambda v: tuple(int(p) for p in v.split(".")), reverse=True)
+    for old in versions[KEEP_VERSIONS:]:
+        if old != keep_version:
+            shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+            logger.info("🧹 Pruned chromedriver cache for Chrome %s", old)
+
+
+def ensure_driver(binary=None, root=DRIVER_CACHE_DIR, refresh=False):
+    """Return (patched driver path, Chrome major version) for the installed Chrome,
+    downloading and patching it once if the cache has no entry yet"""
+    version = chrome_version(binary)
+    major = int(version.split(".")[0])
+    path = None if refresh else cached_driver(version, root)
+    if path:
+        return path, major
+
+    os.makedirs(root, exist_ok=True)
+    with _FileLock(root):
+        # Another worker may have populated it while we waited for the lock
+        path = None if refresh else cached_driver(version, root)
+        if path:
+            return path, major
+        started = time.time()
+        entry = _entry_dir(version, root)
+        marker = os.path.join(entry, "ready.json")
+        if os.path.exists(marker):
+            os.remove(marker)
+        _patch_into(version, entry)
+        with open(marker, "w", encoding="utf-8") as f:
+            json.dump({"chrome_version": version, "patched_at": time.time()}, f)
+        logger.info("📦 Cached patched chromedriver for Chrome %s in %.1fs", version, time.time() - started)
+        _prune(root, version)
+        return os.path.join(entry, DRIVER_NAME), major
+
+
+def invalidate(binary=None, root=DRIVER_CACHE_DIR):
+    """Drop the entry for the installed Chrome (e.g. after a version-mismatch launch error)"""
+    version = chrome_version(binary)
+    os.makedirs(root, exist_ok=True)
+    with _FileLock(root):
+        shutil.rmtree(_entry_dir(version, root), ignore_errors=True)
+    logger.warning("🗑️ Invalidated chromedriver cache for Chrome %s", version)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    try:
+        path, major = ensure_driver(refresh="--refresh" in sys.argv)
+    except Exception as e:
+        logger.error("❌ %s", e)
+        sys.exit(1)
+    print(path)
@@ -6,33 +6,36 @@ Author : Izaz Ahamed
 -----------------------------------------------------------------------
 ✅ Headless Chrome (Linux VPS)
 ✅ Private (Incognito) mode — no history, no cache, no cookies
-✅ Retry + requeue failed rows (never skip)
+✅ Retry scheduler: backoff + jitter, global retry budget, incremental dead-letter CSV
+✅ Soft reset instead of relaunch on failures, browser recycled after N rows / high memory
 ✅ Screenshot + HTML debug on failure
-✅ Audio reCAPTCHA solving supported
-✅ 1360×768 consistent screenshot → PDF
+✅ Audio reCAPTCHA solved in memory on a worker pool (pluggable recognizers)
+✅ Result panel captured in memory → compact Flate/JPEG PDF (or Page.printToPDF)
 ✅ Exports failed_rows.csv for Smart Process Flow requeue
+✅ Persistent lookup cache — repeated bills skip the portal (--no-cache to bypass)
+✅ Row checkpoint journal — a restarted job resumes where it stopped
+✅ Input streamed row by row (no pandas), imaging libraries loaded on first capture
+✅ Portal circuit breaker: while customs.gov.bd is down, remaining bills go straight
+   to the dead-letter CSV (PortalUnavailable) instead of retrying into timeouts
 """
 
-import os, sys, time, random, tempfile, logging, urllib.request, shutil, pandas as pd
-from fpdf import FPDF
-from PIL import Image
-from PyPDF2 import PdfMerger
-import pydub
+import os, io, sys, csv, time, base64, random, logging, threading, shutil
 
-# -----------------------------------------------------------------------------
-# OPTIONAL: SpeechRecognition (for audio challenge)
-# -----------------------------------------------------------------------------
-try:
-    import speech_recognition as sr
-    SR_AVAILABLE = True
-except ImportError:
-    SR_AVAILABLE = False
-    print("⚠️ SpeechRecognition not installed — audio challenge skipped.")
-
-import undetected_chromedriver as uc
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait, Select
 from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException
+
+from browser_pool import get_pool, DriverHealth
+from input_reader import read_rows
+from captcha_audio import AudioCaptchaPipeline, CaptchaStats
+from circuit_breaker import CircuitBreaker, EXIT_PORTAL_DOWN
+from job_journal import JobJournal, row_key
+from lookup_cache import LookupCache, normalize_key, CACHE_BYPASS
+from progress import JobProgress
+from report_writer import StreamingPdfReport
+from retry_scheduler import RetryScheduler
+from wait_engine import WaitEngine, WaitStats
 
 # -----------------------------------------------------------------------------
 # CONFIGURATION
@@ -41,39 +44,68 @@ URL = "https://customs.gov.bd/portal/services/billTracking/billTracking.jsf"
 WAIT_TIMEOUT = 25
 MAX_ATTEMPTS = 3
 MAX_ROW_RETRIES = 3
-
-if len(sys.argv) < 3:
-    print("❌ Usage: python3 egm_download.py <input_file> <output_dir> [job_id]")
-    sys.exit(1)
-
-INPUT_FILE = sys.argv[1]
-OUTPUT_DIR = sys.argv[2]
-JOB_ID = sys.argv[3] if len(sys.argv) > 3 else "unknown"
-PDFS_DIR = os.path.join(OUTPUT_DIR, "pdfs")
-SCREENSHOT_DIR = os.path.join(OUTPUT_DIR, "screenshots")
-FAILED_CSV = os.path.join(OUTPUT_DIR, f"failed_rows_{JOB_ID}.csv")
-
-# -----------------------------------------------------------------------------
-# LOGGING
-# -----------------------------------------------------------------------------
-logger = logging.getLogger("EgmDownload-" + JOB_ID)
-handler = logging.StreamHandler(sys.stdout)
-handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
-logger.addHandler(handler)
-logger.setLevel(logging.INFO)
-
-logger.info("📁 Input: %s", INPUT_FILE)
-logger.info("📂 Output: %s", OUTPUT_DIR)
-logger.info("🆔 Job ID: %s", JOB_ID)
+RESET_AFTER_FAILURES = 2        # soft-reset Chrome after consecutive failures (or at once if it died)
+INPUT_FIELDS = {
+    "office": "customOfficeCode",
+    "serial": "billEntrySerial",
+    "number": "billEntryNumber",
+    "year": "billEntryYear",
+}
+DEAD_LETTER_COLUMNS = ["customOfficeCode", "billEntrySerial", "billEntryNumber", "billEntryYear", "attempts", "error"]
+
+# Bill status capture: element (result panel screenshot) | print (Page.printToPDF) | window
+CAPTURE_MODE = os.environ.get("EGM_CAPTURE_MODE", "element")
+CAPTURE_ENCODING = os.environ.get("EGM_CAPTURE_ENCODING", "flate")    # flate | jpeg
+JPEG_QUALITY = int(os.environ.get("EGM_JPEG_QUALITY", "70"))
+FLATE_COLORS = int(os.environ.get("EGM_FLATE_COLORS", "64"))
+CAPTURE_DPI = 100
+RESULT_PANEL_SELECTORS = [s for s in os.environ.get(
+    "EGM_RESULT_SELECTOR", "[id*='billStatus'],[id*='BillStatus'],.ui-datatable,#formAct").split(",") if s]
+BASELINE_SAMPLES = 3
+
+USAGE = "❌ Usage: python3 egm_download.py <input_file> <output_dir> [job_id] [--no-cache]"
+
+INPUT_FILE = OUTPUT_DIR = PDFS_DIR = SCREENSHOT_DIR = FAILED_CSV = None
+JOB_ID = "unknown"
+NO_CACHE = CACHE_BYPASS
+logger = logging.getLogger("EgmDownload")
+WAIT_STATS = WaitStats()
+CAPTCHA_STATS = CaptchaStats()
+CAPTURE_STATS = None
 
 # -----------------------------------------------------------------------------
-# ENVIRONMENT CHECK
+# JOB CONFIGURATION + LOGGING
 # -----------------------------------------------------------------------------
-FFMPEG_PATH = shutil.which("ffmpeg")
-if FFMPEG_PATH:
-    logger.info("🎧 FFmpeg found at: %s", FFMPEG_PATH)
-else:
-    logger.warning("⚠️ FFmpeg not found — audio challenge may fail.")
+def configure(input_file, output_dir, job_id="unknown", no_cache=CACHE_BYPASS):
+    """Bind job arguments and attach a per-job logger"""
+    global INPUT_FILE, OUTPUT_DIR, JOB_ID, NO_CACHE, PDFS_DIR, SCREENSHOT_DIR, FAILED_CSV, WAIT_STATS, CAPTCHA_STATS
+    global CAPTURE_STATS, logger
+    INPUT_FILE, OUTPUT_DIR, JOB_ID, NO_CACHE = input_file, output_dir, job_id, no_cache
+    PDFS_DIR = os.path.join(OUTPUT_DIR, "pdfs")
+    SCREENSHOT_DIR = os.path.join(OUTPUT_DIR, "screenshots")
+    FAILED_CSV = os.path.join(OUTPUT_DIR, f"failed_rows_{JOB_ID}.csv")
+    WAIT_STATS = WaitStats()
+    CAPTCHA_STATS = CaptchaStats()
+    CAPTURE_STATS = CaptureStats()
+
+    logger = logging.getLogger("EgmDownload-" + JOB_ID)
+    logger.handlers.clear()
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+    logger.info("📁 Input: %s", INPUT_FILE)
+    logger.info("📂 Output: %s", OUTPUT_DIR)
+    logger.info("🆔 Job ID: %s", JOB_ID)
+
+    # Environment check
+    ffmpeg_path = shutil.which("ffmpeg")
+    if ffmpeg_path:
+        logger.info("🎧 FFmpeg found at: %s", ffmpeg_path)
+    else:
+        logger.warning("⚠️ FFmpeg not found — audio challenge may fail.")
 
 # -----------------------------------------------------------------------------
 # DEBUG SAVE HELPERS
@@ -99,31 +131,9 @@ def save_debug(driver, name):
 # DRIVER SETUP
 # -----------------------------------------------------------------------------
 def setup_driver():
-    """Launch undetected Chrome (headless, private mode)"""
-    opts = uc.ChromeOptions()
-    opts.add_argument("--headless=new")
-    opts.add_argument("--no-sandbox")
-    opts.add_argument("--disable-dev-shm-usage")
-    opts.add_argument("--disable-blink-features=AutomationControlled")
-    opts.add_argument("--disable-gpu")
-    opts.add_argument("--window-size=1360,768")
-
-    # ✅ Private mode
-    opts.add_argument("--incognito")
-    opts.add_argument("--disable-application-cache")
-    opts.add_argument("--disk-cache-size=0")
-    opts.add_argument("--disable-cache")
-    opts.add_argument("--disable-plugins-discovery")
-    opts.add_argument("--no-first-run")
-    opts.add_argument("--no-default-browser-check")
-
-    for path in ["/usr/bin/google-chrome", "/usr/bin/chromium", "/usr/bin/chromium-browser"]:
-        if os.path.exists(path):
-            opts.binary_location = path
-            break
-
-    driver = uc.Chrome(options=opts, use_subprocess=True)
-    logger.info("🧩 Chrome launched in PRIVATE mode (no cache/history)")
+    """Lease undetected Chrome (headless, private mode) from the shared pool"""
+    driver = get_pool().lease("customs")
+    logger.info("🧩 Chrome ready in PRIVATE mode (no cache/history)")
     return driver
 
 # -----------------------------------------------------------------------------
@@ -132,6 +142,8 @@ def setup_driver():
 class RecaptchaSolver:
     def __init__(self, driver):
         self.driver = driver
+        self.waits = WaitEngine(driver, "customs", WAIT_STATS)
+        self.pipeline = AudioCaptchaPipeline(stats=CAPTCHA_STATS, log=logger)
 
     def is_solved(self):
         try:
@@ -147,34 +159,36 @@ class RecaptchaSolver:
             self.driver.switch_to.default_content()
             return False
 
+    def _challenge_open(self):
+        frames = self.driver.find_elements(By.CSS_SELECTOR, "iframe[title*='recaptcha challenge']")
+        return any(f.is_displayed() for f in frames)
+
     def _solve_audio_challenge(self, wait):
-        """Handle audio challenge via SpeechRecognition"""
+        """Handle audio challenge via the in-memory recognition pipeline"""
         attempt = 0
         while True:
             attempt += 1
             try:
                 audio_src = wait.until(EC.presence_of_element_located((By.ID, "audio-source"))).get_attribute("src")
                 logger.info("🎵 Audio challenge %d: %s", attempt, audio_src)
-                mp3 = os.path.join(tempfile.gettempdir(), f"captcha_{attempt}.mp3")
-                wav = os.path.join(tempfile.gettempdir(), f"captcha_{attempt}.wav")
-                urllib.request.urlretrieve(audio_src, mp3)
-                pydub.AudioSegment.from_mp3(mp3).export(wav, format="wav")
-
-                if not SR_AVAILABLE:
-                    raise RuntimeError("SpeechRecognition not available")
-
-                recog = sr.Recognizer()
-                with sr.AudioFile(wav) as s:
-                    audio = recog.record(s)
-                text = recog.recognize_google(audio)
+                # Fetch/decode/recognise run on the worker pool while we locate the input
+                transcript = self.pipeline.submit(audio_src)
+                input_box = wait.until(EC.presence_of_element_located((By.ID, "audio-response")))
+                text = transcript.result(timeout=WAIT_TIMEOUT * 2)
                 logger.info("🗣️ Recognized text: %s", text)
 
-                input_box = wait.until(EC.presence_of_element_located((By.ID, "audio-response")))
                 input_box.clear()
                 input_box.send_keys(text.lower())
                 verify = wait.until(EC.element_to_be_clickable((By.ID, "recaptcha-verify-button")))
                 self.driver.execute_script("arguments[0].click();", verify)
-                time.sleep(3)
+                try:
+                    # Verified: an error message or a fresh challenge appears, or the checkbox ticks
+                    self.waits.until(
+                        lambda d: any(e.text.strip() for e in d.find_elements(By.CSS_SELECTOR, ".rc-audiochallenge-error-message"))
+                        or any(a.get_attribute("src") != audio_src for a in d.find_elements(By.ID, "audio-source")),
+                        "captcha verify", replaces=3, timeout=3)
+                except TimeoutException:
+                    pass
 
                 error_msgs = self.driver.find_elements(By.CSS_SELECTOR, ".rc-audiochallenge-error-message")
                 if any("Multiple correct solutions required" in e.text for e in error_msgs):
@@ -201,8 +215,12 @@ class RecaptchaSolver:
             self.driver.switch_to.frame(iframe)
             box = self.driver.find_element(By.CLASS_NAME, "recaptcha-checkbox-border")
             box.click()
-            time.sleep(2)
             self.driver.switch_to.default_content()
+            try:
+                self.waits.until(lambda d: self.is_solved() or self._challenge_open(),
+                                 "captcha checkbox", replaces=2, timeout=5)
+            except TimeoutException:
+                pass
             if self.is_solved():
                 logger.info("✅ reCAPTCHA checkbox solved.")
                 return
@@ -218,15 +236,134 @@ class RecaptchaSolver:
             self.driver.switch_to.frame(challenge_iframe)
             audio_btn = wait.until(EC.element_to_be_clickable((By.ID, "recaptcha-audio-button")))
             self.driver.execute_script("arguments[0].click();", audio_btn)
-            time.sleep(2)
             self._solve_audio_challenge(wait)
         except Exception as e:
             logger.error("❌ Could not launch audio challenge: %s", e)
             save_debug(self.driver, "audio_init_fail")
 
+# -----------------------------------------------------------------------------
+# BILL STATUS CAPTURE
+# -----------------------------------------------------------------------------
+class CaptureStats:
+    """PDF bytes and encode time per job; bytes saved are estimated against the
+    old full-window RGB PDF, measured on the first BASELINE_SAMPLES rows"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.rows = self.bytes = 0
+        self.seconds = 0.0
+        self.samples = []         # (baseline bytes, actual bytes)
+        self.report_seconds = 0.0
+
+    def wants_baseline(self):
+        with self._lock:
+            return len(self.samples) < BASELINE_SAMPLES
+
+    def record(self, size, seconds, baseline=None):
+        with self._lock:
+            self.rows += 1
+            self.bytes += size
+            self.seconds += seconds
+            if baseline:
+                self.samples.append((baseline, size))
+
+    def add_report_time(self, seconds):
+        with self._lock:
+            self.report_seconds += seconds
+
+    def log_summary(self, log):
+        with self._lock:
+            if not self.rows:
+                return
+            msg = (f"🗜️ Capture ({CAPTURE_MODE}/{CAPTURE_ENCODING}): {self.rows} PDFs, "
+                   f"{self.bytes / 1024:.0f} KB, {self.seconds:.1f}s encoding, "
+                   f"{self.report_seconds:.1f}s writing combined report")
+            if self.samples:
+                ratio = sum(b for b, _ in self.samples) / max(1, sum(a for _, a in self.samples))
+                saved = self.bytes * ratio - self.bytes
+                msg += f"; ~{saved / 1024:.0f} KB saved vs full-window PDFs ({ratio:.1f}× smaller)"
+        log.info(msg)
+
+
+def find_result_panel(driver):
+    for selector in RESULT_PANEL_SELECTORS:
+        for el in driver.find_elements(By.CSS_SELECTOR, selector):
+            try:
+                if el.is_displayed() and el.size["width"] > 50 and el.size["height"] > 50:
+                    return el
+            except Exception:
+                continue
+    return None
+
+
+def image_to_pdf(png_bytes):
+    """PNG bytes → single-page PDF bytes (palette PNG → Flate, or JPEG → DCT)"""
+    from fpdf import FPDF
+    from PIL import Image
+    img = Image.open(io.BytesIO(png_bytes)).convert("RGB")
+    buf = io.BytesIO()
+    if CAPTURE_ENCODING == "jpeg":
+        img.save(buf, "JPEG", quality=JPEG_QUALITY, optimize=True)
+    else:
+        # Status pages are flat text/tables: a small palette deflates extremely well
+        img.quantize(colors=FLATE_COLORS).save(buf, "PNG", optimize=True)
+    buf.seek(0)
+
+    w, h = img.size[0] * 72 / CAPTURE_DPI, img.size[1] * 72 / CAPTURE_DPI
+    pdf = FPDF(unit="pt", format=(w, h))
+    pdf.set_auto_page_break(False)
+    pdf.set_margin(0)
+    pdf.add_page()
+    pdf.image(buf, x=0, y=0, w=w, h=h)
+    return bytes(pdf.output())
+
+
+def legacy_pdf_size(driver):
+    """Size the old full-window screenshot PDF would have had (in memory only)"""
+    from PIL import Image
+    buf = io.BytesIO()
+    Image.open(io.BytesIO(driver.get_screenshot_as_png())).convert("RGB").save(buf, "PDF", resolution=100.0)
+    return buf.tell()
+
+
+def capture_bill_pdf(driver, pdf_path):
+    """Write the bill status page to pdf_path without temp files"""
+    started = time.time()
+    data = None
+    if CAPTURE_MODE == "print":
+        try:
+            data = base64.b64decode(driver.execute_cdp_cmd("Page.printToPDF", {
+                "printBackground": True, "preferCSSPageSize": True
+            })["data"])
+        except Exception as e:
+            logger.warning("⚠️ printToPDF unavailable, using element capture: %s", e)
+
+    if data is None:
+        panel = find_result_panel(driver) if CAPTURE_MODE != "window" else None
+        png = panel.screenshot_as_png if panel is not None else driver.get_screenshot_as_png()
+        data = image_to_pdf(png)
+
+    part = pdf_path + ".part"
+    with open(part, "wb") as f:
+        f.write(data)
+    os.replace(part, pdf_path)
+    elapsed = time.time() - started
+
+    baseline = None
+    if CAPTURE_STATS.wants_baseline():
+        try:
+            baseline = legacy_pdf_size(driver)
+        except Exception:
+            pass
+    CAPTURE_STATS.record(len(data), elapsed, baseline)
+    return len(data)
+
 # -----------------------------------------------------------------------------
 # BILL FETCH
 # -----------------------------------------------------------------------------
+def bill_pdf_path(office, serial, number, year):
+    return os.path.join(PDFS_DIR, f"{office}_{serial}_{number}_{year}.pdf")
+
 def fetch_bill_status(driver, solver, office, serial, number, year):
     wait = WebDriverWait(driver, WAIT_TIMEOUT)
     driver.get(URL)
@@ -249,97 +386,194 @@ def fetch_bill_status(driver, solver, office, serial, number, year):
     btn = wait.until(EC.element_to_be_clickable((By.XPATH, "//span[text()='Retrieve B/E Status']")))
     driver.execute_script("arguments[0].click();", btn)
     logger.info("🖱️ Clicked 'Retrieve B/E Status'")
-    time.sleep(3)
+    solver.waits.settle("bill status", replaces=3)
 
     os.makedirs(PDFS_DIR, exist_ok=True)
-    pdf_path = os.path.join(PDFS_DIR, f"{office}_{serial}_{number}_{year}.pdf")
-    tmp_png = os.path.join(tempfile.gettempdir(), f"{office}_{serial}_{number}_{year}.png")
-
-    driver.save_screenshot(tmp_png)
-    Image.open(tmp_png).convert("RGB").save(pdf_path, "PDF", resolution=100.0)
-    logger.info("📄 PDF saved: %s", pdf_path)
+    pdf_path = bill_pdf_path(office, serial, number, year)
+    size = capture_bill_pdf(driver, pdf_path)
+    logger.info("📄 PDF saved: %s (%.0f KB)", pdf_path, size / 1024)
 
     try:
         back_btn = wait.until(EC.element_to_be_clickable((By.XPATH, "//span[text()='BACK TO MAIN PAGE']")))
         driver.execute_script("arguments[0].click();", back_btn)
-        time.sleep(2)
     except Exception:
         pass
 
     return pdf_path
 
+# -----------------------------------------------------------------------------
+# DEAD LETTERS
+# -----------------------------------------------------------------------------
+def write_dead_letter(item, reason):
+    """Append one permanently failed row to failed_rows_<job>.csv right away"""
+    _, (office, serial, number, year) = item.payload
+    new_file = not os.path.exists(FAILED_CSV)
+    with open(FAILED_CSV, "a", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        if new_file:
+            writer.writerow(DEAD_LETTER_COLUMNS)
+        writer.writerow([office, serial, number, year, item.attempt, item.last_error or reason])
+    logger.warning("☠️ Dead-lettered %s-%s-%s after %d attempt(s): %s", serial, number, year, item.attempt, reason)
+
 # -----------------------------------------------------------------------------
 # MAIN
 # -----------------------------------------------------------------------------
-def main():
+def run():
+    """Process the configured job, returns the process exit code"""
     if not os.path.exists(INPUT_FILE):
         logger.error("❌ Missing input file: %s", INPUT_FILE)
         return 1
 
-    df = pd.read_csv(INPUT_FILE)
     generated, failed = [], []
+    try:
+        # (1-based input row, bill): duplicate bills stay separate rows
+        jobs = [(index, tuple(row)) for index, row in enumerate(read_rows(INPUT_FILE, INPUT_FIELDS), 1)]
+    except ValueError as e:
+        logger.error("❌ %s", e)
+        return 1
 
-    jobs = [
-        (row["customOfficeCode"], row["billEntrySerial"], row["billEntryNumber"], row["billEntryYear"])
-        for _, row in df.iterrows()
-    ]
+    progress = JobProgress(OUTPUT_DIR, total=len(jobs), job_id=JOB_ID)
+    combined = os.path.join(OUTPUT_DIR, f"egm_bill_tracking_report_{JOB_ID}.pdf")
+    report = StreamingPdfReport(combined)
+    cache = LookupCache(bypass=NO_CACHE, log=logger)
+    journal = JobJournal(OUTPUT_DIR, JOB_ID, log=logger)
+
+    # Rows done in an earlier run and cache hits never touch the portal (or the captcha)
+    pending = []
+    for index, job in jobs:
+        pdf = bill_pdf_path(*job)
+        key = row_key(index, *job)
+        if journal.done(key):
+            logger.info("⏭️ Already done in earlier run: %s-%s-%s", *job[1:])
+            source = "resumed"
+        elif cache.link("egm", normalize_key(*job), pdf):
+            journal.record(key, [pdf])
+            source = "cached"
+        else:
+            pending.append((index, job))
+            continue
+        progress.row_finished(index, pdf, source=source, key="-".join(map(str, job)))
+        generated.append(pdf)
+        report.append(pdf, index)
+    jobs = pending
 
     logger.info("🚀 Starting automation for %d entries…", len(jobs))
-    driver = setup_driver()
-    solver = RecaptchaSolver(driver)
-
-    while jobs:
-        office, serial, number, year = jobs.pop(0)
-        attempt = 1
-        while attempt <= MAX_ROW_RETRIES:
-            logger.info("\n%s\nProcessing %s-%s-%s (Attempt %d)\n%s", "="*50, serial, number, year, attempt, "="*50)
-            try:
-                pdf = fetch_bill_status(driver, solver, office, serial, number, year)
-                if pdf:
-                    generated.append(pdf)
-                    break
-            except Exception as e:
-                logger.error("❌ Error: %s", e)
-                save_debug(driver, f"fail_{serial}_{number}_{year}_try{attempt}")
-                if attempt == MAX_ROW_RETRIES:
-                    failed.append((office, serial, number, year))
-                else:
-                    logger.info("🔁 Retrying row (%d/%d)...", attempt, MAX_ROW_RETRIES)
-                    try: driver.quit()
-                    except: pass
-                    driver = setup_driver()
+    breaker = CircuitBreaker.for_url(URL, log=logger)
+    portal_up = bool(jobs) and breaker.ready()
+    driver = setup_driver() if portal_up else None
+    solver = RecaptchaSolver(driver) if driver else None
+    health = DriverHealth(driver, log=logger) if driver else None
+
+    if os.path.exists(FAILED_CSV):
+        os.remove(FAILED_CSV)    # dead letters of an earlier run are retried now
+    scheduler = RetryScheduler(jobs, max_attempts=MAX_ROW_RETRIES, on_dead_letter=write_dead_letter, log=logger)
+    consecutive_failures = 0
+
+    while True:
+        if scheduler.remaining() and not (portal_up and breaker.ready()):
+            # Portal down: every row left fails now instead of retrying into timeouts
+            for item in scheduler.abandon("portal unreachable", breaker.last_error):
+                index, job = item.payload
+                failed.append(job)
+                progress.row_error(index, breaker.skip())
+                progress.row_finished(index, key="-".join(map(str, job)))
+            break
+        item = scheduler.next()
+        if item is None:
+            break
+        index, job = item.payload
+        office, serial, number, year = job
+        key = row_key(index, *job)
+        logger.info("\n%s\nProcessing %s-%s-%s (Attempt %d)\n%s", "="*50, serial, number, year, item.attempt, "="*50)
+        progress.row_started(index, "-".join(map(str, job)))
+        try:
+            pdf = fetch_bill_status(driver, solver, office, serial, number, year)
+            generated.append(pdf)
+            t = time.time()
+            report.append(pdf, index)
+            CAPTURE_STATS.add_report_time(time.time() - t)
+            cache.store("egm", normalize_key(*job), pdf, {"job_id": JOB_ID})
+            journal.record(key, [pdf])
+            progress.row_finished(index, pdf, key="-".join(map(str, job)))
+            breaker.record(True)
+            consecutive_failures = 0
+        except Exception as e:
+            logger.error("❌ Error: %s", e)
+            save_debug(driver, f"fail_{serial}_{number}_{year}_try{item.attempt}")
+            breaker.record(False)
+            consecutive_failures += 1
+            delay = scheduler.fail(item, e)
+            if delay is None:
+                failed.append(job)
+                journal.record(key, status="failed", error=str(e))
+                progress.row_error(index, e)
+                progress.row_finished(index, key="-".join(map(str, job)))
+            else:
+                logger.info("🔁 Row rescheduled in %.0fs (next attempt %d/%d), %d row(s) left",
+                            delay, item.attempt, MAX_ROW_RETRIES, scheduler.remaining())
+            if not health.probe() or consecutive_failures >= RESET_AFTER_FAILURES:
+                try:
+                    driver = health.recover(f"{consecutive_failures} consecutive failure(s)")
                     solver = RecaptchaSolver(driver)
-            attempt += 1
+                    consecutive_failures = 0
+                except Exception as err:
+                    logger.error("❌ Browser recovery failed: %s", err)
 
-        if attempt > MAX_ROW_RETRIES and (office, serial, number, year) in failed:
-            jobs.append((office, serial, number, year))
-            logger.info("⏳ Row requeued: %s-%s-%s", serial, number, year)
-
-    driver.quit()
+        # Recycle after N rows / high renderer memory; every row starts with driver.get(URL)
+        try:
+            health.row_done()
+        except Exception as e:
+            logger.error("❌ Browser recycle failed: %s", e)
+        if health.driver is not driver:
+            driver = health.driver
+            solver = RecaptchaSolver(driver)
+
+    if driver:
+        get_pool().release(driver)
+        health.log_summary()
+        WAIT_STATS.log_summary(logger)
+        CAPTCHA_STATS.log_summary(logger)
+    breaker.log_summary(logger)
+    cache.log_summary(logger)
+    cache.close()
+    journal.close()
 
     # Combine all PDFs
-    if generated:
-        merger = PdfMerger()
-        for pdf in generated:
-            if pdf and os.path.exists(pdf):
-                merger.append(pdf)
-        combined = os.path.join(OUTPUT_DIR, f"egm_bill_tracking_report_{JOB_ID}.pdf")
-        merger.write(combined)
-        merger.close()
+    t = time.time()
+    finalized = bool(generated) and report.finalize()
+    CAPTURE_STATS.add_report_time(time.time() - t)
+    CAPTURE_STATS.log_summary(logger)
+    if finalized:
         logger.info("✅ Combined PDF saved: %s", combined)
+        progress.artifact(combined)
     else:
+        report.abort()
         logger.warning("⚠️ No PDFs generated.")
 
-    # Save failed rows CSV
+    # Failed rows were written to the dead-letter CSV as they happened
     if failed:
-        pd.DataFrame(failed, columns=["customOfficeCode", "billEntrySerial", "billEntryNumber", "billEntryYear"]).to_csv(
-            FAILED_CSV, index=False
-        )
-        logger.warning("⚠️ %d rows failed after retries. Saved to %s", len(failed), FAILED_CSV)
+        s = scheduler.summary()
+        logger.warning("⚠️ %d rows failed after retries (%d/%d retries used). Saved to %s",
+                       len(failed), s["retries"], s["budget"], FAILED_CSV)
+        progress.artifact(FAILED_CSV, kind="failed_rows")
+    progress.finish(retries=scheduler.summary()["retries"], **breaker.summary())
+    if breaker.skipped and not progress.ok:
+        return EXIT_PORTAL_DOWN
 
     logger.info("🎉 Completed successfully!")
     return 0
 
 
+def main(argv=None):
+    argv = sys.argv if argv is None else argv
+    args = [a for a in argv[1:] if not a.startswith("--")]
+    if len(args) < 2:
+        print(USAGE)
+        return 1
+    configure(args[0], args[1], args[2] if len(args) > 2 else "unknown",
+              no_cache=CACHE_BYPASS or "--no-cache" in argv)
+    return run()
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
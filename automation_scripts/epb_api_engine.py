@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+EPB Export Tracker Direct API Engine (optional fast path for rex_submission)
+Author: Izaz Ahamed
+-------------------------------------------------------------
+✅ Browser only for login: the SPA's bearer token (web storage or captured
+   Authorization header) and session cookies are copied into a pooled HTTP session
+✅ Each SOO is created, filled and saved through the JSON endpoints the Angular
+   app calls — no list → add → confirm → tabs → save → back click-through
+✅ Commercial Invoice and Bill of Lading uploaded as concurrent multipart posts
+✅ Expired token (401) re-captured from the browser once, then retried
+✅ Raises EpbApiError on anything unexpected. Only errors before a SOO exists
+   (eligibility, a create the portal answered with an error) are safe to retry in
+   the browser; after create the same SOO is read back — saved counts as done,
+   anything else is reported with its id and never submitted a second time
+
+Endpoints are relative to EPB_API_BASE (defaults to the portal's /api); point it
+at a local stand-in server (epb_api_standin.py) to exercise the engine without
+the live portal.
+"""
+
+import os, json, time, logging, threading
+from urllib.parse import urljoin
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger("EpbApiEngine")
+
+EPB_API_BASE = os.environ.get("EPB_API_BASE", "https://epb-exporttracker.gov.bd/api/")
+EPB_API_TIMEOUT = int(os.environ.get("EPB_API_TIMEOUT", "60"))
+EPB_UPLOAD_CONCURRENCY = int(os.environ.get("EPB_UPLOAD_CONCURRENCY", "4"))
+
+# XHR endpoints of the SOO screens (ng-click handlers in brackets)
+ENDPOINTS = {
+    "eligibility": ("GET", "soo/checkSooFormEligibility"),     # checkSooFormEligibility()
+    "create": ("POST", "soo"),                                  # close('yes') on the confirm popup
+    "details": ("PUT", "soo/{id}"),                             # SoO Form Details tab
+    "hs_code": ("POST", "soo/{id}/hsCodes"),                    # addHsCodeInfo()
+    "upload": ("POST", "soo/{id}/documents/{doc_type}"),        # Commercial Invoice / Bill of Lading tabs
+    "save": ("POST", "soo/{id}/save"),                          # save()
+    "get": ("GET", "soo/{id}"),
+}
+DOCUMENT_TYPES = {"invoice": "COMMERCIAL_INVOICE", "bol": "BILL_OF_LADING"}
+SAVED_STATUSES = ("SAVED", "SUBMITTED", "COMPLETED")
+
+# Finds the SPA's auth token in web storage (plain string, or a JSON object holding it)
+TOKEN_PROBE_JS = """
+var names = ['access_token', 'accessToken', 'token', 'authToken', 'id_token', 'jwt'];
+var pick = function (raw) {
+  if (!raw) return null;
+  try {
+    var v = JSON.parse(raw);
+    if (typeof v === 'string') return v;
+    for (var i = 0; i < names.length; i++) { if (v && typeof v[names[i]] === 'string') return v[names[i]]; }
+    return null;
+  } catch (e) { return raw.split('.').length === 3 || raw.length >= 32 ? raw : null; }
+};
+var stores = [window.localStorage, window.sessionStorage];
+for (var s = 0; s < stores.length; s++) {
+  var st = stores[s];
+  if (!st) continue;
+  for (var j = 0; j < st.length; j++) {
+    var key = st.key(j);
+    if (/token|auth|jwt|currentuser/i.test(key)) { var t = pick(st.getItem(key)); if (t) return t; }
+  }
+}
+return null;
+"""
+
+
+class EpbApiError(Exception):
+    """The API path could not submit the record.
+    soo_id: the SOO created before the failure (None if none was);
+    ambiguous: the create call got no answer, a draft may exist without an id"""
+
+    def __init__(self, message, soo_id=None, ambiguous=False, status=None):
+        super().__init__(message)
+        self.soo_id = soo_id
+        self.ambiguous = ambiguous
+        self.status = status
+
+    @property
+    def fallback_safe(self):
+        """True when nothing was created, so the browser may add the SOO instead"""
+        return self.soo_id is None and not self.ambiguous
+
+
+def capture_token(driver):
+    """Bearer token of the logged-in SPA: web storage first, then the Authorization
+    header of a captured XHR (performance log); None if neither has one"""
+    try:
+        token = driver.execute_script(TOKEN_PROBE_JS)
+    except Exception:
+        token = None
+    if token:
+        return token.replace("Bearer ", "", 1)
+    try:
+        entries = driver.get_log("performance")
+    except Exception:
+        return None
+    for entry in reversed(entries):
+        try:
+            message = json.loads(entry["message"])["message"]
+        except (KeyError, ValueError):
+            continue
+        if message.get("method") != "Network.requestWillBeSent":
+            continue
+        headers = message["params"].get("request", {}).get("headers", {})
+        auth = headers.get("Authorization") or headers.get("authorization")
+        if auth and auth.lower().startswith("bearer "):
+            return auth[7:]
+    return None
+
+
+class EpbApiEngine:
+    def __init__(self, driver, log=None, base_url=EPB_API_BASE, timeout=EPB_API_TIMEOUT,
+                 max_uploads=EPB_UPLOAD_CONCURRENCY):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.log = log or logger
+        self.base_url = base_url if base_url.endswith("/") else base_url + "/"
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_uploads + 1)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "User-Agent": driver.execute_script("return navigator.userAgent"),
+            "Accept": "application/json, text/plain, */*",
+            "X-Requested-With": "XMLHttpRequest",
+        })
+        self.executor = ThreadPoolExecutor(max_workers=max_uploads, thread_name_prefix="epb-upload")
+        self.submitted = self.fallbacks = self.unfinished = 0
+        self._auth_lock = threading.Lock()
+        self.sync_auth(driver)
+
+    # -------------------------------------------------------------
+    # Auth
+    # -------------------------------------------------------------
+    def sync_auth(self, driver):
+        """Copy cookies + bearer token from the logged-in browser"""
+        with self._auth_lock:
+            cookies = driver.get_cookies()
+            for c in cookies:
+                self.session.cookies.set(c["name"], c["value"], domain=c.get("domain", ""), path=c.get("path", "/"))
+            xsrf = next((c["value"] for c in cookies if c["name"] == "XSRF-TOKEN"), None)
+            if xsrf:
+                self.session.headers["X-XSRF-TOKEN"] = xsrf
+            token = capture_token(driver)
+            if token:
+                self.session.headers["Authorization"] = f"Bearer {token}"
+            elif not cookies:
+                raise EpbApiError("no token or session cookie after login")
+            self.log.info(f"🔑 EPB API session ready ({'bearer token' if token else 'cookies only'})")
+
+    # -------------------------------------------------------------
+    # HTTP helpers
+    # -------------------------------------------------------------
+    def _url(self, name, **params):
+        method, path = ENDPOINTS[name]
+        return method, urljoin(self.base_url, path.format(**params))
+
+    def _call(self, name, driver=None, json_body=None, files=None, **params):
+        """One endpoint call; every failure, connection errors and timeouts included, is an
+        EpbApiError (status None when the portal never answered)"""
+        import requests
+
+        method, url = self._url(name, **params)
+        for attempt in (1, 2):
+            for _, handle, _ in (files or {}).values():
+                handle.seek(0)
+            try:
+                resp = self.session.request(method, url, json=json_body, files=files, timeout=self.timeout)
+            except requests.RequestException as e:
+                raise EpbApiError(f"{name}: no answer ({type(e).__name__}: {str(e)[:200]})")
+            if resp.status_code == 401 and attempt == 1 and driver is not None:
+                self.log.info("🔑 EPB API token expired, re-reading it from the browser")
+                self.sync_auth(driver)
+                continue
+            break
+        if resp.status_code >= 400:
+            raise EpbApiError(f"{name}: HTTP {resp.status_code} {resp.text[:200]}", status=resp.status_code)
+        if not resp.content:
+            return {}
+        try:
+            return resp.json()
+        except ValueError:
+            raise EpbApiError(f"{name}: non-JSON response (session expired?)")
+
+    def _upload(self, soo_id, doc_type, path, driver):
+        with open(path, "rb") as f:
+            files = {"file": (os.path.basename(path), f, "application/pdf")}
+            return self._call("upload", driver, files=files, id=soo_id, doc_type=DOCUMENT_TYPES[doc_type])
+
+    # -------------------------------------------------------------
+    # Public API
+    # -------------------------------------------------------------
+    def submit(self, payload, hs_code, attachments, driver=None):
+        """Create, fill, attach and save one SOO; returns its id.
+        payload: form details; hs_code: HS-code line; attachments: {"invoice": path, "bol": path}"""
+        started = time.time()
+        eligibility = self._call("eligibility", driver)
+        if eligibility.get("eligible") is False:
+            raise EpbApiError(f"not eligible to add SOO: {eligibility.get('message', 'no reason given')}")
+
+        try:
+            created = self._call("create", driver)
+        except EpbApiError as e:
+            # A 4xx is a clean refusal; no answer or a 5xx (gateway timeout, crash) may have
+            # created the draft: never retry it through the browser
+            e.ambiguous = e.status is None or e.status >= 500
+            raise
+        soo_id = created.get("id") or created.get("sooId")
+        if not soo_id:
+            raise EpbApiError(f"create: no SOO id in response {str(created)[:200]}", ambiguous=True)
+
+        try:
+            self._complete(soo_id, payload, hs_code, attachments, driver)
+        except Exception as e:
+            if not self.reconcile(soo_id, driver):
+                self.unfinished += 1
+                raise EpbApiError(f"SOO {soo_id} not finished: {e}", soo_id=soo_id)
+            self.log.info(f"🔁 SOO {soo_id}: {e}, but the portal shows it saved")
+        self.submitted += 1
+        self.log.info(f"⚡ SOO {soo_id} submitted via API in {time.time() - started:.1f}s")
+        return soo_id
+
+    def _complete(self, soo_id, payload, hs_code, attachments, driver):
+        """Everything after create: details, HS code, attachments, save"""
+        self._call("details", driver, json_body=payload, id=soo_id)
+        self._call("hs_code", driver, json_body=hs_code, id=soo_id)
+
+        uploads = {doc_type: self.executor.submit(self._upload, soo_id, doc_type, path, driver)
+                   for doc_type, path in attachments.items()}
+        for doc_type, future in uploads.items():
+            try:
+                future.result()
+            except EpbApiError:
+                raise
+            except Exception as e:
+                raise EpbApiError(f"{doc_type} upload failed: {e}")
+
+        saved = self._call("save", driver, id=soo_id)
+        if saved.get("success") is False:
+            raise EpbApiError(f"save rejected: {saved.get('message', 'no reason given')}", soo_id=soo_id)
+
+    def reconcile(self, soo_id, driver):
+        """After a failure past create (in this run or an earlier one): True if the portal
+        shows this SOO saved anyway (e.g. the save went through but its answer was lost)"""
+        try:
+            record = self._call("get", driver, id=soo_id)
+        except Exception as e:
+            self.log.warning(f"⚠️ SOO {soo_id}: could not read it back ({e})")
+            return False
+        return str(record.get("status", "")).upper() in SAVED_STATUSES
+
+    def verify(self, submitted, driver=None):
+        """Read every API-submitted SOO back; returns the invoice numbers that did not match"""
+        mismatched = []
+        for soo_id, invoice_no in submitted:
+            try:
+                record = self._call("get", driver, id=soo_id)
+            except EpbApiError as e:
+                self.log.warning(f"⚠️ Verify SOO {soo_id}: {e}")
+                mismatched.append(invoice_no)
+                continue
+            if str(record.get("invoiceNo", "")).strip() != str(invoice_no).strip():
+                mismatched.append(invoice_no)
+        return mismatched
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
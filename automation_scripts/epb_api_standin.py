@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Local Stand-in for the EPB Export Tracker SOO API (for epb_api_engine)
+Author: Izaz Ahamed
+------------------------------------------------------------
+✅ Serves the ENDPOINTS table of epb_api_engine from memory: eligibility,
+   create, details, HS code, document uploads, save, read back
+✅ Bearer token checked like the portal (401 on a wrong or missing token)
+✅ Fault injection per endpoint (faults = {"save": 502}): the call is carried
+   out, then answered with that status — the "request reached the server but
+   the answer was lost" case
+✅ Stdlib only; `python epb_api_standin.py [port]` serves until Ctrl+C, then run
+   rex_submission with EPB_API_MODE=1 EPB_API_BASE=<printed url>
+
+Endpoint paths mirror the engine's table; they are the engine's contract, not
+a capture of the live portal.
+"""
+
+import re, sys, json, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STANDIN_TOKEN = "standin-token"
+REQUIRED_DOCUMENTS = ("COMMERCIAL_INVOICE", "BILL_OF_LADING")
+
+# (method, path regex under /api/) -> endpoint name, as in epb_api_engine.ENDPOINTS
+ROUTES = [
+    ("GET", r"soo/checkSooFormEligibility", "eligibility"),
+    ("POST", r"soo", "create"),
+    ("PUT", r"soo/(?P<id>\d+)", "details"),
+    ("POST", r"soo/(?P<id>\d+)/hsCodes", "hs_code"),
+    ("POST", r"soo/(?P<id>\d+)/documents/(?P<doc_type>[A-Z_]+)", "upload"),
+    ("POST", r"soo/(?P<id>\d+)/save", "save"),
+    ("GET", r"soo/(?P<id>\d+)", "get"),
+]
+
+
+class EpbStandIn:
+    def __init__(self, port=0, token=STANDIN_TOKEN):
+        self.token = token
+        self.records = {}       # id -> {"id", "status", "details", "hsCodes", "documents"}
+        self.faults = {}        # endpoint name -> HTTP status to answer with after doing the work
+        self.calls = []         # endpoint names in arrival order
+        self._next_id = 1000
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}/api/"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="epb-standin", daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    # -------------------------------------------------------------
+    # Endpoint handlers: (status, body)
+    # -------------------------------------------------------------
+    def handle(self, name, params, body, content_type):
+        with self._lock:
+            self.calls.append(name)
+            if name == "eligibility":
+                return 200, {"eligible": True}
+            if name == "create":
+                self._next_id += 1
+                soo_id = self._next_id
+                self.records[soo_id] = {"id": soo_id, "status": "DRAFT", "details": {}, "hsCodes": [],
+                                        "documents": []}
+                return 200, {"id": soo_id}
+
+            record = self.records.get(int(params["id"]))
+            if record is None:
+                return 404, {"message": "no such SOO"}
+            if name == "get":
+                return 200, {**record, "invoiceNo": record["details"].get("invoiceNo")}
+            if record["status"] != "DRAFT":
+                return 409, {"success": False, "message": f"SOO is {record['status']}"}
+            if name == "details":
+                record["details"].update(json.loads(body or b"{}"))
+            elif name == "hs_code":
+                record["hsCodes"].append(json.loads(body or b"{}"))
+            elif name == "upload":
+                if not content_type.startswith("multipart/form-data") or b"%PDF" not in body:
+                    return 400, {"success": False, "message": "expected a PDF upload"}
+                record["documents"].append(params["doc_type"])
+            elif name == "save":
+                missing = [d for d in REQUIRED_DOCUMENTS if d not in record["documents"]]
+                if missing or not record["details"].get("invoiceNo") or not record["hsCodes"]:
+                    return 200, {"success": False, "message": f"incomplete (missing {missing or 'details'})"}
+                record["status"] = "SAVED"
+            return 200, {"success": True}
+
+    def _handler(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _dispatch(self):
+                path = self.path.split("?", 1)[0]
+                if not path.startswith("/api/"):
+                    return self._reply(404, {"message": "not found"})
+                if self.headers.get("Authorization") != f"Bearer {standin.token}":
+                    return self._reply(401, {"message": "token expired"})
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                for method, pattern, name in ROUTES:
+                    match = re.fullmatch(pattern, path[len("/api/"):])
+                    if method == self.command and match:
+                        status, payload = standin.handle(name, match.groupdict(), body,
+                                                         self.headers.get("Content-Type", ""))
+                        fault = standin.faults.get(name)
+                        return self._reply(fault or status, {"message": "injected fault"} if fault else payload)
+                return self._reply(404, {"message": "not found"})
+
+            def _reply(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = do_PUT = _dispatch
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+if __name__ == "__main__":
+    standin = EpbStandIn(port=int(sys.argv[1]) if len(sys.argv) > 1 else 8765)
+    print(f"🧪 EPB API stand-in on {standin.base_url} (token {standin.token})")
+    try:
+        standin._server.serve_forever()
+    except KeyboardInterrupt:
+        standin.stop()
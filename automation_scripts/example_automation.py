@@ -8,7 +8,6 @@ import os
 import sys
 import time
 import logging
-import pandas as pd
 import tempfile
 from datetime import datetime
 from selenium import webdriver
@@ -20,6 +19,8 @@ from selenium.webdriver.chrome.options import Options
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
 import json
 
+from input_reader import read_column
+
 class ExampleAutomation:
     def __init__(self, headless=True):
         self.setup_logging()
@@ -107,18 +108,8 @@ class ExampleAutomation:
         try:
             self.logger.info(f"📋 Reading input data from file...")
             
-            # Auto-detect file type
-            ext = os.path.splitext(file_path)[1].lower()
-            
-            if ext == ".csv":
-                df = pd.read_csv(file_path)
-            elif ext in [".xls", ".xlsx"]:
-                df = pd.read_excel(file_path)
-            else:
-                raise ValueError(f"Unsupported file type: {ext}")
-            
-            # Extract data (adjust column names as needed)
-            data_list = df.iloc[:, 0].dropna().astype(str).tolist()  # First column
+            # Streams CSV/XLSX by extension; first column (use read_rows for named columns)
+            data_list = list(read_column(file_path))
             self.logger.info(f"📊 Found {len(data_list)} items to process")
             
             return data_list
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Batched Form Fill Engine (used by rex_submission and bb_exp_search)
+Author: Izaz Ahamed
+------------------------------------------------------------
+✅ A whole field map (id → value, kind) is set in ONE injected script instead of
+   a find_element + send_keys/Select round trip per field
+✅ Dispatches the events the portals listen for: input/change/blur for
+   AngularJS ng-model, apex.item().setValue() for Oracle APEX items
+✅ Every value is read back in the same call; only fields that did not stick
+   fall back to native typing / Select
+✅ Counters: fields batched, fallbacks, driver time per batch
+"""
+
+import time, logging, threading
+
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import Select
+
+logger = logging.getLogger("FormFill")
+
+TEXT = "text"
+SELECT_VALUE = "select_value"     # Select.select_by_value
+SELECT_TEXT = "select_text"       # Select.select_by_visible_text
+
+# arguments[0]: [{id, value, kind}] → [{id, ok, reason}]
+FORM_FILL_JS = """
+var fields = arguments[0], results = [];
+var norm = function (s) { return String(s == null ? '' : s).replace(/\\s+/g, ' ').trim(); };
+var fire = function (el, type) { el.dispatchEvent(new Event(type, { bubbles: true })); };
+var nativeSetter = function (el) {
+  var proto = el.tagName === 'TEXTAREA' ? HTMLTextAreaElement.prototype : HTMLInputElement.prototype;
+  var d = Object.getOwnPropertyDescriptor(proto, 'value');
+  return d && d.set;
+};
+fields.forEach(function (f) {
+  var el = document.getElementById(f.id);
+  if (!el) { results.push({ id: f.id, ok: false, reason: 'missing' }); return; }
+  try {
+    if (f.kind === 'text') {
+      var apexItem = window.apex && apex.item ? apex.item(f.id) : null;
+      if (apexItem && apexItem.node && apexItem.setValue) {
+        apexItem.setValue(f.value);
+      } else {
+        el.focus();
+        var setter = nativeSetter(el);
+        if (setter) setter.call(el, f.value); else el.value = f.value;
+        fire(el, 'input'); fire(el, 'change'); fire(el, 'blur');
+      }
+      results.push({ id: f.id, ok: el.value === f.value, reason: el.value === f.value ? null : 'value did not stick' });
+      return;
+    }
+    var wanted = norm(f.value), match = -1;
+    for (var i = 0; i < el.options.length; i++) {
+      var opt = el.options[i];
+      if (f.kind === 'select_value'
+          ? (opt.value === f.value || opt.value === 'string:' + f.value || opt.value === 'number:' + f.value)
+          : norm(opt.text) === wanted) { match = i; break; }
+    }
+    if (match < 0) { results.push({ id: f.id, ok: false, reason: 'no such option' }); return; }
+    el.selectedIndex = match;
+    fire(el, 'input'); fire(el, 'change');
+    results.push({ id: f.id, ok: el.selectedIndex === match, reason: null });
+  } catch (e) {
+    results.push({ id: f.id, ok: false, reason: String(e) });
+  }
+});
+return results;
+"""
+
+
+class FormFillStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.fields = 0
+        self.fallbacks = 0
+        self.seconds = 0.0
+
+    def record(self, fields, fallbacks, seconds):
+        with self._lock:
+            self.batches += 1
+            self.fields += fields
+            self.fallbacks += fallbacks
+            self.seconds += seconds
+
+    def log_summary(self, log=None):
+        with self._lock:
+            batches, fields, fallbacks, seconds = self.batches, self.fields, self.fallbacks, self.seconds
+        if not batches:
+            return
+        (log or logger).info(f"📝 Form fill: {fields} field(s) in {batches} batch(es), {fallbacks} native "
+                             f"fallback(s), avg {seconds / batches * 1000:.0f}ms per batch")
+
+
+class FormFiller:
+    def __init__(self, driver, stats=None, log=None):
+        self.driver = driver
+        self.stats = stats or FormFillStats()
+        self.log = log or logger
+
+    @staticmethod
+    def _normalize(fields):
+        """{id: value | (value, kind)} → [{id, value, kind}] in map order"""
+        batch = []
+        for field_id, spec in fields.items():
+            value, kind = spec if isinstance(spec, tuple) else (spec, TEXT)
+            batch.append({"id": field_id, "value": "" if value is None else str(value), "kind": kind})
+        return batch
+
+    def _native(self, field):
+        """Per-field fallback: the WebDriver way (raises like the old per-field code)"""
+        el = self.driver.find_element(By.ID, field["id"])
+        if field["kind"] == TEXT:
+            el.clear()
+            el.send_keys(field["value"])
+        elif field["kind"] == SELECT_VALUE:
+            Select(el).select_by_value(field["value"])
+        else:
+            Select(el).select_by_visible_text(field["value"])
+
+    def fill(self, fields):
+        """Set every field of the map in one round trip; returns the ids that needed the native fallback"""
+        started = time.time()
+        batch = self._normalize(fields)
+        try:
+            results = self.driver.execute_script(FORM_FILL_JS, batch) or []
+        except Exception as e:
+            self.log.warning(f"⚠️ Batched form fill failed ({e}), typing every field")
+            results = []
+        stuck = {r["id"] for r in results if r.get("ok")}
+        fallback = []
+        for field in batch:
+            if field["id"] in stuck:
+                continue
+            reason = next((r.get("reason") for r in results if r["id"] == field["id"]), "not attempted")
+            self.log.debug(f"⌨️ {field['id']}: {reason}, typing natively")
+            self._native(field)
+            fallback.append(field["id"])
+        self.stats.record(len(batch), len(fallback), time.time() - started)
+        return fallback
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Streaming Input Reader (shared by all automation scripts)
+Author: Izaz Ahamed
+------------------------------------------------------------
+✅ CSV streamed with the stdlib reader, XLSX with read-only openpyxl
+✅ One row in memory at a time — no DataFrame, flat memory for any upload size
+✅ Header mapping: case/space-insensitive names plus per-field aliases
+✅ Typed row tuples (namedtuple per call), blank rows skipped
+✅ Heavy modules imported lazily: openpyxl only for .xlsx, pandas only for legacy .xls
+"""
+
+import os, re, csv, logging
+from collections import namedtuple
+
+logger = logging.getLogger("InputReader")
+
+CSV_EXTENSIONS = (".csv", ".txt")
+XLSX_EXTENSIONS = (".xlsx", ".xlsm")
+LEGACY_EXTENSIONS = (".xls",)
+
+
+# -----------------------------------------------------------------------------
+# CELL CONVERTERS
+# -----------------------------------------------------------------------------
+def as_text(value):
+    """Cell → stripped string; 2025.0 → "2025", empty → None"""
+    if value is None:
+        return None
+    if isinstance(value, float):
+        if value != value:          # NaN from the legacy .xls path
+            return None
+        if value.is_integer():
+            value = int(value)
+    text = str(value).strip()
+    return text or None
+
+
+def as_int(value):
+    text = as_text(value)
+    return int(float(text)) if text is not None else None
+
+
+# -----------------------------------------------------------------------------
+# RAW ROW SOURCES
+# -----------------------------------------------------------------------------
+def _iter_csv(path):
+    with open(path, newline="", encoding="utf-8-sig", errors="replace") as f:
+        for row in csv.reader(f):
+            yield row
+
+
+def _iter_xlsx(path):
+    from openpyxl import load_workbook
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for row in wb.worksheets[0].iter_rows(values_only=True):
+            yield list(row)
+    finally:
+        wb.close()
+
+
+def _iter_legacy_xls(path):
+    # Old binary workbooks have no streaming reader; pandas (xlrd) is only loaded here
+    import pandas as pd
+    df = pd.read_excel(path, header=None, dtype=object)
+    for row in df.itertuples(index=False):
+        yield list(row)
+
+
+def iter_raw_rows(path):
+    """Yield every row (header included) as a list of cell values"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in CSV_EXTENSIONS:
+        return _iter_csv(path)
+    if ext in XLSX_EXTENSIONS:
+        return _iter_xlsx(path)
+    if ext in LEGACY_EXTENSIONS:
+        return _iter_legacy_xls(path)
+    raise ValueError(f"Unsupported file type: {ext}")
+
+
+def _blank(row):
+    return all(as_text(v) is None for v in row)
+
+
+# -----------------------------------------------------------------------------
+# PUBLIC API
+# -----------------------------------------------------------------------------
+def normalize_header(name):
+    return re.sub(r"[\s_\-]+", "", str(name or "")).lower()
+
+
+def read_rows(path, fields, types=None):
+    """Yield typed namedtuples for the columns named in fields.
+
+    fields: {field: header or (header, alias, ...)} — matched case/space-insensitively
+    types:  {field: converter}; as_text by default
+    Raises ValueError if a required header is missing."""
+    types = types or {}
+    rows = iter_raw_rows(path)
+    header = None
+    for row in rows:
+        if not _blank(row):
+            header = [normalize_header(h) for h in row]
+            break
+    if header is None:
+        return
+
+    positions = {}
+    for field, aliases in fields.items():
+        aliases = (aliases,) if isinstance(aliases, str) else aliases
+        for alias in aliases:
+            if normalize_header(alias) in header:
+                positions[field] = header.index(normalize_header(alias))
+                break
+        else:
+            raise ValueError(f"Missing column '{aliases[0]}' in {os.path.basename(path)}")
+
+    Row = namedtuple("Row", list(fields))
+    converters = [(positions[f], types.get(f, as_text)) for f in fields]
+    for row in rows:
+        if _blank(row):
+            continue
+        yield Row(*(conv(row[pos]) if pos < len(row) else None for pos, conv in converters))
+
+
+def read_column(path, index=0, header=True):
+    """Yield the non-empty values of one column as strings (first column by default)"""
+    rows = iter_raw_rows(path)
+    for row in rows:
+        if header:
+            if not _blank(row):
+                header = False
+            continue
+        value = as_text(row[index]) if index < len(row) else None
+        if value is not None:
+            yield value
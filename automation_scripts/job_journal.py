@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Row Checkpoint Journal (crash-safe job resume)
+Author: Izaz Ahamed
+------------------------------------------------------------
+✅ Append-only JSON-lines journal per job: one line per finished row
+✅ fsync after every row — survives Chrome crashes and VPS restarts
+✅ On restart, rows already done (and whose artifacts still exist) are skipped
+✅ A torn last line from a crash is ignored, never fatal
+"""
+
+import os, json, time, logging, threading
+
+from lookup_cache import normalize_key
+
+logger = logging.getLogger("JobJournal")
+
+
+def row_key(index, *parts):
+    """Stable key for one input row: position + normalized identifier"""
+    return f"{index}:{normalize_key(*parts)}"
+
+
+class JobJournal:
+    def __init__(self, output_dir, job_id, log=None):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, f".journal_{job_id}.jsonl")
+        self.log = log or logger
+        self.entries = {}
+        self._lock = threading.Lock()
+        os.makedirs(output_dir, exist_ok=True)
+        self._load()
+        self._fh = open(self.path, "a", encoding="utf-8")
+
+    # -------------------------------------------------------------
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            data = f.read()
+        for line in data.splitlines():
+            try:
+                entry = json.loads(line)
+                self.entries[entry["key"]] = entry
+            except (ValueError, KeyError):
+                continue
+        if data and not data.endswith(b"\n"):
+            # Crash mid-write: start the next record on a fresh line
+            with open(self.path, "ab") as f:
+                f.write(b"\n")
+        done = sum(1 for e in self.entries.values() if e.get("status") == "done")
+        if done:
+            self.log.info(f"📒 Resuming job: {done} row(s) already done in {os.path.basename(self.path)}")
+
+    def _abs(self, artifact):
+        return os.path.join(self.output_dir, artifact)
+
+    # -------------------------------------------------------------
+    # Public API
+    # -------------------------------------------------------------
+    def done(self, key):
+        """Return the journal entry if the row finished and its artifacts still exist"""
+        with self._lock:
+            entry = self.entries.get(key)
+        if not entry or entry.get("status") != "done":
+            return None
+        if not all(os.path.exists(self._abs(a)) for a in entry.get("artifacts", [])):
+            return None
+        return entry
+
+    def entry(self, key):
+        """Latest journal entry of a row, whatever its status (None if never recorded)"""
+        with self._lock:
+            return self.entries.get(key)
+
+    def artifacts(self, entry):
+        """Paths of an entry's artifacts, resolved against the output directory"""
+        return [self._abs(a) for a in entry.get("artifacts", [])]
+
+    def record(self, key, artifacts=(), status="done", **extra):
+        """Append one row outcome and fsync it before returning"""
+        entry = {
+            "key": key,
+            "status": status,
+            "artifacts": [os.path.relpath(os.path.abspath(a), os.path.abspath(self.output_dir)) for a in artifacts],
+            "ts": time.time(),
+            **extra,
+        }
+        with self._lock:
+            if self._fh is None:
+                return entry
+            self._fh.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+            self.entries[key] = entry
+        return entry
+
+    def close(self):
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
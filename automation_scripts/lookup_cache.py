@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Persistent Lookup Result Cache (shared by all automation scripts)
+Author: Izaz Ahamed
+------------------------------------------------------------
+✅ SQLite index keyed by (service, normalized identifier)
+✅ Content-addressed PDF blobs (sha256) — identical results stored once
+✅ Per-service TTLs, LRU eviction above a size cap
+✅ Cache hits are hard-linked straight into the job's pdfs/ folder
+✅ Bypass flag (--no-cache / SPF_CACHE_BYPASS=1) forces a fresh lookup
+✅ Safe across threads and across concurrent worker processes (WAL)
+✅ Results fetched with a customer's own portal login (bb_exp) are keyed per
+   login (owner_key) and never served to anyone else
+"""
+
+import os, re, time, json, shutil, sqlite3, hashlib, logging, tempfile, threading
+
+logger = logging.getLogger("LookupCache")
+
+# -----------------------------------------------------------------------------
+# CONFIGURATION
+# -----------------------------------------------------------------------------
+CACHE_DIR = os.environ.get(
+    "SPF_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "lookups")
+)
+CACHE_MAX_MB = int(os.environ.get("SPF_CACHE_MAX_MB", "2048"))
+CACHE_BYPASS = os.environ.get("SPF_CACHE_BYPASS", "0") == "1"
+
+# Seconds a result stays valid; override with SPF_CACHE_TTL_<SERVICE>
+SERVICE_TTLS = {
+    "damco": 6 * 3600,          # FCR tracking moves while cargo is in transit
+    "ctg": 1 * 3600,            # container location changes several times a day
+    "bb_exp": 30 * 24 * 3600,   # issued EXP forms do not change
+    "egm": 12 * 3600,           # bill of entry status
+}
+DEFAULT_TTL = 6 * 3600
+
+# Services whose results come from the customer's own portal login: idents must
+# carry the owner (owner_key), unscoped entries are refused and purged
+AUTHENTICATED_SERVICES = ("bb_exp",)
+OWNER_PREFIX = "@"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    service     TEXT NOT NULL,
+    ident       TEXT NOT NULL,
+    sha256      TEXT NOT NULL,
+    size        INTEGER NOT NULL,
+    created_at  REAL NOT NULL,
+    last_access REAL NOT NULL,
+    meta        TEXT,
+    PRIMARY KEY (service, ident)
+);
+CREATE INDEX IF NOT EXISTS idx_entries_access ON entries (last_access);
+CREATE INDEX IF NOT EXISTS idx_entries_sha ON entries (sha256);
+"""
+
+
+def normalize_key(*parts):
+    """Identifier parts → canonical key (case/whitespace-insensitive, 2025.0 == 2025)"""
+    out = []
+    for p in parts:
+        if isinstance(p, float) and p.is_integer():
+            p = int(p)
+        out.append(re.sub(r"\s+", "", str(p)).upper())
+    return "|".join(out)
+
+
+def owner_key(owner, *parts):
+    """normalize_key scoped to one portal login (stored as a hash, never in clear)"""
+    digest = hashlib.sha256(f"spf-cache-owner|{owner}".encode()).hexdigest()[:24]
+    return OWNER_PREFIX + digest + "|" + normalize_key(*parts)
+
+
+def ttl_for(service):
+    env = os.environ.get(f"SPF_CACHE_TTL_{service.upper()}")
+    if env:
+        return int(env)
+    return SERVICE_TTLS.get(service, DEFAULT_TTL)
+
+
+class LookupCache:
+    def __init__(self, root=CACHE_DIR, max_bytes=CACHE_MAX_MB * 1024 * 1024, bypass=CACHE_BYPASS, log=None):
+        self.root = root
+        self.blob_dir = os.path.join(root, "blobs")
+        self.max_bytes = max_bytes
+        self.bypass = bypass
+        self.log = log or logger
+        self.hits = self.misses = self.stored = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        os.makedirs(self.blob_dir, exist_ok=True)
+        with self._db() as db:
+            db.executescript(SCHEMA)
+            self._purge_unscoped(db)
+
+    # -------------------------------------------------------------
+    # Storage helpers
+    # -------------------------------------------------------------
+    def _db(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(os.path.join(self.root, "index.sqlite3"), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _blob_path(self, sha):
+        return os.path.join(self.blob_dir, sha[:2], sha + ".pdf")
+
+    def _purge_unscoped(self, db):
+        """Drop entries of authenticated services written without an owner (older caches)"""
+        marks = ",".join("?" * len(AUTHENTICATED_SERVICES))
+        rows = db.execute(f"SELECT service, ident, sha256 FROM entries WHERE service IN ({marks}) "
+                          f"AND substr(ident, 1, 1) != ?", (*AUTHENTICATED_SERVICES, OWNER_PREFIX)).fetchall()
+        for service, ident, sha in rows:
+            self._drop(db, service, ident, sha)
+        if rows:
+            self.log.info(f"🧹 Dropped {len(rows)} cache entr(ies) not scoped to a portal login")
+
+    def _scoped(self, service, ident):
+        """False (and a warning) for an authenticated-service ident without an owner"""
+        if service not in AUTHENTICATED_SERVICES or str(ident).startswith(OWNER_PREFIX):
+            return True
+        self.log.warning(f"⚠️ {service} results need an owner-scoped key (owner_key), cache skipped")
+        return False
+
+    @staticmethod
+    def _hash_file(path):
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    # -------------------------------------------------------------
+    # Public API
+    # -------------------------------------------------------------
+    def lookup(self, service, ident):
+        """Return the blob path of a fresh entry, or None"""
+        if self.bypass or not self._scoped(service, ident):
+            return None
+        now = time.time()
+        db = self._db()
+        row = db.execute("SELECT sha256, created_at FROM entries WHERE service=? AND ident=?",
+                         (service, ident)).fetchone()
+        if row is None:
+            return None
+        sha, created_at = row
+        blob = self._blob_path(sha)
+        if now - created_at > ttl_for(service) or not os.path.exists(blob):
+            with db:
+                self._drop(db, service, ident, sha)
+            return None
+        with db:
+            db.execute("UPDATE entries SET last_access=? WHERE service=? AND ident=?", (now, service, ident))
+        return blob
+
+    def link(self, service, ident, dest):
+        """On a hit, place the cached PDF at dest (hard link, copy across devices)"""
+        blob = self.lookup(service, ident)
+        if blob is None:
+            with self._lock:
+                self.misses += 1
+            return False
+        os.makedirs(os.path.dirname(os.path.abspath(dest)), exist_ok=True)
+        if os.path.lexists(dest):
+            os.remove(dest)
+        try:
+            os.link(blob, dest)
+        except OSError:
+            shutil.copyfile(blob, dest)
+        with self._lock:
+            self.hits += 1
+        self.log.info(f"💾 Cache hit for {service} {ident} → {os.path.basename(dest)}")
+        return True
+
+    def store(self, service, ident, pdf_path, meta=None):
+        """Add or refresh the entry for (service, ident) from a finished PDF"""
+        if not self._scoped(service, ident):
+            return False
+        try:
+            sha = self._hash_file(pdf_path)
+            blob = self._blob_path(sha)
+            if not os.path.exists(blob):
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                fd, tmp = tempfile.mkstemp(dir=os.path.dirname(blob), suffix=".part")
+                os.close(fd)
+                shutil.copyfile(pdf_path, tmp)
+                os.chmod(tmp, 0o444)
+                os.replace(tmp, blob)
+            now = time.time()
+            db = self._db()
+            with db:
+                old = db.execute("SELECT sha256 FROM entries WHERE service=? AND ident=?",
+                                 (service, ident)).fetchone()
+                if old and old[0] != sha:
+                    self._drop(db, service, ident, old[0])
+                db.execute(
+                    "INSERT OR REPLACE INTO entries (service, ident, sha256, size, created_at, last_access, meta) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (service, ident, sha, os.path.getsize(blob), now, now, json.dumps(meta or {}))
+                )
+            with self._lock:
+                self.stored += 1
+            self.evict()
+            return True
+        except Exception as e:
+            self.log.warning(f"⚠️ Could not cache {service} {ident}: {e}")
+            return False
+
+    def evict(self):
+        """Drop least-recently-used entries until the referenced blobs fit in max_bytes"""
+        db = self._db()
+        with db:
+            total = db.execute("SELECT COALESCE(SUM(size), 0) FROM "
+                               "(SELECT sha256, MAX(size) AS size FROM entries GROUP BY sha256)").fetchone()[0]
+            if total > self.max_bytes:
+                for service, ident, sha, size in db.execute(
+                        "SELECT service, ident, sha256, size FROM entries ORDER BY last_access").fetchall():
+                    if self._drop(db, service, ident, sha):
+                        total -= size
+                    if total <= self.max_bytes:
+                        break
+
+    def _drop(self, db, service, ident, sha):
+        """Delete one entry; removes its blob once nothing references it. True if the blob went"""
+        db.execute("DELETE FROM entries WHERE service=? AND ident=?", (service, ident))
+        if db.execute("SELECT 1 FROM entries WHERE sha256=? LIMIT 1", (sha,)).fetchone():
+            return False
+        try:
+            os.remove(self._blob_path(sha))
+        except FileNotFoundError:
+            pass
+        return True
+
+    def summary(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "stored": self.stored, "bypass": self.bypass}
+
+    def log_summary(self, log=None):
+        s = self.summary()
+        (log or self.log).info(f"💾 Cache: {s['hits']} hit(s), {s['misses']} miss(es), {s['stored']} stored"
+                               + (" (bypass)" if s["bypass"] else ""))
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
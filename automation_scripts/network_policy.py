@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Per-Portal Network Resource Policy (used by browser_pool)
+Author: Izaz Ahamed
+------------------------------------------------------------
+✅ Declarative block lists per portal: analytics, ads, chat widgets, web fonts, media
+✅ Applied with CDP Network.setBlockedURLs — no per-request interception round trips
+✅ Allow list wins: block patterns aimed at an allowed host are dropped, so the
+   portal's own content (what the PDFs need) is never cut. setBlockedURLs has no
+   exceptions, so host-less file patterns (*.woff2, *.mp4) are pinned to known
+   third-party asset hosts instead of blocking the allowed hosts' files too
+✅ Per-row counters: requests, bytes transferred, requests blocked, throttling
+   responses (429/503) and server errors (5xx or failed loads of the page and
+   its XHRs), both fed to the rate governor
+✅ SPF_NETWORK_POLICY=0 turns every policy off
+"""
+
+import os, json, fnmatch, logging, threading
+
+logger = logging.getLogger("NetworkPolicy")
+
+POLICY_ENABLED = os.environ.get("SPF_NETWORK_POLICY", "1") != "0"
+THROTTLE_STATUSES = (429, 503)
+# Resource types whose failure means the portal did not serve the row (images, fonts etc. do not count)
+PORTAL_RESOURCE_TYPES = ("Document", "XHR", "Fetch")
+
+TRACKERS = [
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*", "*googlesyndication.com*",
+    "*googleadservices.com*", "*facebook.net*", "*facebook.com/tr*", "*connect.facebook.*",
+    "*hotjar.com*", "*clarity.ms*", "*bat.bing.com*", "*snap.licdn.com*", "*px.ads.linkedin.com*",
+    "*adobedtm.com*", "*demdex.net*", "*omtrdc.net*", "*nr-data.net*", "*js-agent.newrelic.com*",
+    "*quantserve.com*", "*scorecardresearch.com*",
+]
+CHAT_WIDGETS = ["*tawk.to*", "*intercom.io*", "*intercomcdn.com*", "*zopim.com*", "*zdassets.com*",
+                "*salesforceliveagent.com*", "*qualtrics.com*", "*livechatinc.com*"]
+WEB_FONTS = ["*fonts.googleapis.com*", "*fonts.gstatic.com*", "*.woff2", "*.woff2?*", "*.woff", "*.woff?*",
+             "*.ttf", "*.otf"]
+MEDIA = ["*.mp4", "*.webm", "*.mp3", "*youtube.com/embed*", "*vimeo.com*"]
+# Third-party hosts that host-less file patterns are pinned to when a policy has an allow list
+ASSET_HOSTS = ["fonts.gstatic.com", "fonts.googleapis.com", "use.typekit.net", "p.typekit.net",
+               "use.fontawesome.com", "kit.fontawesome.com", "fast.fonts.net", "cdn.jsdelivr.net",
+               "cdnjs.cloudflare.com", "unpkg.com"]
+
+# block: URL patterns (setBlockedURLs wildcards); allow: patterns that must never be blocked
+NETWORK_POLICIES = {
+    "maersk": {
+        "block": TRACKERS + CHAT_WIDGETS + WEB_FONTS + MEDIA,
+        # Consent banner and the tracking app's own API/assets
+        "allow": ["*cookieinformation.com*", "*api.maersk.com*", "*assets.maerskline.com*"],
+    },
+    "cpatos": {
+        "block": TRACKERS + CHAT_WIDGETS + WEB_FONTS + MEDIA,
+        "allow": ["*cpatos.gov.bd*"],
+    },
+}
+
+
+def _host_less(pattern):
+    """True for file patterns that name no host ("*.woff2", "*.mp4?*")"""
+    return pattern.lstrip("*").startswith(".")
+
+
+def blocked_patterns(portal):
+    """Effective block list for a portal, or []: host patterns the allow list does not
+    override, and host-less file patterns pinned to the non-allowed ASSET_HOSTS"""
+    policy = NETWORK_POLICIES.get(portal)
+    if not POLICY_ENABLED or not policy:
+        return []
+    allow = policy.get("allow", [])
+
+    def allowed(host):
+        return any(fnmatch.fnmatch(host, a) for a in allow)
+
+    patterns = []
+    for p in policy["block"]:
+        if not _host_less(p):
+            if not allowed(p.strip("*")):
+                patterns.append(p)
+        elif not allow:
+            patterns.append(p)
+        else:
+            patterns.extend(f"*//{host}/{p}" for host in ASSET_HOSTS if not allowed(host))
+    return list(dict.fromkeys(patterns))
+
+
+def enable_metering(opts):
+    """Chrome option: network events in the performance log (drained per row by NetworkMeter)"""
+    opts.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    opts.add_experimental_option("perfLoggingPrefs", {"enableNetwork": True, "enablePage": False})
+
+
+def apply(driver, portal):
+    """Install the portal's block list on the current target; returns the number of patterns"""
+    patterns = blocked_patterns(portal)
+    if not patterns:
+        return 0
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+    return len(patterns)
+
+
+class NetworkMeter:
+    """Requests / bytes / blocked counters per row, totals per job"""
+
+    def __init__(self, log=None):
+        self.log = log or logger
+        self._lock = threading.Lock()
+        self.rows = 0
+        self.totals = {"requests": 0, "bytes": 0, "blocked": 0, "throttled": 0, "errors": 0}
+
+    def sample(self, driver, label=""):
+        """Drain the driver's performance log and count what the last row loaded; None if unavailable"""
+        try:
+            entries = driver.get_log("performance")
+        except Exception:
+            return None
+        row = {"requests": 0, "bytes": 0, "blocked": 0, "throttled": 0, "errors": 0}
+        for entry in entries:
+            try:
+                message = json.loads(entry["message"])["message"]
+            except (KeyError, ValueError):
+                continue
+            method = message.get("method")
+            if method == "Network.requestWillBeSent":
+                row["requests"] += 1
+            elif method == "Network.responseReceived":
+                status = message["params"].get("response", {}).get("status") or 0
+                if status in THROTTLE_STATUSES:
+                    row["throttled"] += 1
+                elif status >= 500 and message["params"].get("type") in PORTAL_RESOURCE_TYPES:
+                    row["errors"] += 1
+            elif method == "Network.loadingFinished":
+                row["bytes"] += int(message["params"].get("encodedDataLength", 0))
+            elif method == "Network.loadingFailed":
+                params = message["params"]
+                if params.get("blockedReason"):
+                    row["blocked"] += 1
+                elif not params.get("canceled") and params.get("type") in PORTAL_RESOURCE_TYPES:
+                    row["errors"] += 1
+        with self._lock:
+            self.rows += 1
+            for k, v in row.items():
+                self.totals[k] += v
+        self.log.info(f"🌐 {label}: {row['requests']} request(s), {row['bytes'] / 1024:.0f} KB, "
+                      f"{row['blocked']} blocked" + (f", {row['throttled']} throttled" if row["throttled"] else "")
+                      + (f", {row['errors']} server error(s)" if row["errors"] else ""))
+        return row
+
+    def log_summary(self, log=None):
+        with self._lock:
+            rows, t = self.rows, dict(self.totals)
+        if not rows:
+            return
+        (log or self.log).info(f"🌐 Network: {t['requests']} request(s), {t['bytes'] / 1048576:.1f} MB, "
+                               f"{t['blocked']} blocked over {rows} row(s) "
+                               f"(avg {t['bytes'] / rows / 1024:.0f} KB/row)")
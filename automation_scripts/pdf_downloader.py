@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Authenticated Concurrent PDF Downloader
+Author: Izaz Ahamed
+------------------------------------------------------------
+✅ Reuses the logged-in Selenium cookies in a pooled HTTP session
+✅ Downloads in the background while the browser keeps searching
+✅ Bounded concurrency, retries with integrity checks (size, %PDF, sha256)
+✅ Atomic writes (.part → final name) and a live progress counter
+"""
+
+import os, time, hashlib, logging, threading
+from concurrent.futures import ThreadPoolExecutor
+
+DOWNLOAD_CONCURRENCY = int(os.environ.get("SPF_DOWNLOAD_CONCURRENCY", "4"))
+DOWNLOAD_RETRIES = 3
+DOWNLOAD_TIMEOUT = 60
+
+
+class DownloadError(Exception):
+    pass
+
+
+class SessionDownloader:
+    def __init__(self, driver, logger=None, max_concurrency=DOWNLOAD_CONCURRENCY,
+                 retries=DOWNLOAD_RETRIES, timeout=DOWNLOAD_TIMEOUT):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.logger = logger or logging.getLogger("PdfDownloader")
+        self.retries = retries
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers["User-Agent"] = driver.execute_script("return navigator.userAgent")
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="pdf-dl")
+        self.futures = []
+        self.results = {}
+        self.total = self.completed = self.failed = 0
+        self._lock = threading.Lock()
+        self.sync_cookies(driver)
+
+    def sync_cookies(self, driver):
+        """Copy the browser's current session cookies into the HTTP client"""
+        for c in driver.get_cookies():
+            self.session.cookies.set(c["name"], c["value"], domain=c.get("domain"), path=c.get("path", "/"))
+
+    # -------------------------------------------------------------
+    def _fetch(self, url, dest):
+        last_error = None
+        for attempt in range(1, self.retries + 1):
+            part = dest + ".part"
+            try:
+                resp = self.session.get(url, timeout=self.timeout, stream=True)
+                resp.raise_for_status()
+                digest = hashlib.sha256()
+                size = 0
+                with open(part, "wb") as f:
+                    for chunk in resp.iter_content(chunk_size=64 * 1024):
+                        f.write(chunk)
+                        digest.update(chunk)
+                        size += len(chunk)
+
+                expected = resp.headers.get("Content-Length")
+                if expected and int(expected) != size and not resp.headers.get("Content-Encoding"):
+                    raise DownloadError(f"size mismatch ({size} of {expected} bytes)")
+                with open(part, "rb") as f:
+                    if f.read(5) != b"%PDF-":
+                        raise DownloadError("response is not a PDF (session expired?)")
+
+                os.replace(part, dest)
+                return {"path": dest, "bytes": size, "sha256": digest.hexdigest(), "attempts": attempt}
+            except Exception as e:
+                last_error = e
+                if os.path.exists(part):
+                    os.remove(part)
+                self.logger.warning(f"⚠️ Download attempt {attempt}/{self.retries} failed for {os.path.basename(dest)}: {e}")
+                time.sleep(attempt)
+        raise DownloadError(f"{os.path.basename(dest)}: {last_error}")
+
+    def _run(self, url, dest):
+        try:
+            info = self._fetch(url, dest)
+            with self._lock:
+                self.completed += 1
+                self.results[dest] = info
+                done, total = self.completed + self.failed, self.total
+            self.logger.info(f"📥 Downloaded {os.path.basename(dest)} ({info['bytes']} bytes) [{done}/{total}]")
+            return info
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+                self.results[dest] = {"path": dest, "error": str(e)}
+            self.logger.error(f"❌ Download failed: {e}")
+            raise
+
+    def submit(self, url, dest, driver=None):
+        """Queue a download; refreshes cookies first when a driver is given"""
+        if driver is not None:
+            self.sync_cookies(driver)
+        with self._lock:
+            self.total += 1
+        future = self.executor.submit(self._run, url, dest)
+        self.futures.append(future)
+        return future
+
+    def progress(self):
+        with self._lock:
+            return {"total": self.total, "completed": self.completed, "failed": self.failed}
+
+    def wait_all(self):
+        """Block until every queued download finished; returns progress counters"""
+        for future in self.futures:
+            try:
+                future.result()
+            except Exception:
+                pass
+        return self.progress()
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.session.close()
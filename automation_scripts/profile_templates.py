@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pre-Warmed Chrome Profile Templates (used by browser_pool)
+Author: Izaz Ahamed
+------------------------------------------------------------
+✅ One initialised user-data-dir per portal: first-run done, prefs written
+✅ Portal consent state (cookie banner, coach popup) recorded once as a seed
+   of cookies + localStorage and replayed into every new session
+✅ Every launch gets a clone on tmpfs (/dev/shm) — reflink/copy, no disk I/O
+✅ Falls back to an empty temp profile when no template has been built
+
+Usage:
+    python3 profile_templates.py              # build templates for every recipe
+    python3 profile_templates.py maersk       # build one portal
+"""
+
+import os, sys, json, time, shutil, logging, tempfile, threading, subprocess
+
+logger = logging.getLogger("ProfileTemplates")
+
+# -----------------------------------------------------------------------------
+# CONFIGURATION
+# -----------------------------------------------------------------------------
+TEMPLATE_ROOT = os.environ.get(
+    "SPF_PROFILE_TEMPLATES",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "profile_templates")
+)
+PROFILE_TMP_ROOT = os.environ.get("SPF_PROFILE_TMP", "/dev/shm" if os.access("/dev/shm", os.W_OK) else None)
+CLICK_TIMEOUT = 15
+
+# Pages visited while building, and the buttons clicked there (only our own consent/dismiss choices)
+TEMPLATE_RECIPES = {
+    "maersk": {
+        "url": "https://www.maersk.com/mymaersk-scm-track/",
+        "clicks": ["button[data-test='coi-allow-all-button']", "button[data-test='finishButton']"],
+    },
+    "cpatos": {
+        "url": "https://cpatos.gov.bd/pcs/",
+        "clicks": [],
+    },
+}
+
+# Written into Default/Preferences so Chrome skips its first-run work
+FIRST_RUN_PREFS = {
+    "browser": {"has_seen_welcome_page": True, "check_default_browser": False},
+    "credentials_enable_service": False,
+    "profile": {"password_manager_enabled": False, "exit_type": "Normal", "exited_cleanly": True},
+    "translate": {"enabled": False},
+}
+
+# Never copied into a template: locks, crash state and caches
+VOLATILE_ENTRIES = ["SingletonLock", "SingletonSocket", "SingletonCookie", "Crashpad", "ShaderCache",
+                    "GrShaderCache", os.path.join("Default", "Cache"), os.path.join("Default", "Code Cache"),
+                    os.path.join("Default", "GPUCache"), os.path.join("Default", "Service Worker", "CacheStorage")]
+
+# Sets the recorded localStorage keys on the seeded origin, only where they are missing
+SEED_STORAGE_JS = """
+(function (origin, items) {
+  if (location.origin !== origin) return;
+  try {
+    for (var k in items) { if (localStorage.getItem(k) === null) localStorage.setItem(k, items[k]); }
+  } catch (e) {}
+})(%s, %s);
+"""
+
+
+def template_dir(portal):
+    return os.path.join(TEMPLATE_ROOT, portal)
+
+
+# -----------------------------------------------------------------------------
+# CLONING
+# -----------------------------------------------------------------------------
+def clone_profile(portal):
+    """New user-data-dir for one launch: a tmpfs clone of the portal template (or empty)"""
+    dest = tempfile.mkdtemp(prefix=f"{portal}_profile_", dir=PROFILE_TMP_ROOT)
+    source = os.path.join(template_dir(portal), "profile")
+    if not os.path.isdir(source):
+        return dest
+    started = time.time()
+    try:
+        subprocess.run(["cp", "-a", "--reflink=auto", source + "/.", dest], check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=60)
+    except (OSError, subprocess.SubprocessError):
+        shutil.rmtree(dest, ignore_errors=True)
+        shutil.copytree(source, dest, symlinks=True)
+    logger.debug("📂 Cloned %s profile template in %.0fms", portal, (time.time() - started) * 1000)
+    return dest
+
+
+_seed_memo = {}
+_seed_lock = threading.Lock()
+
+
+def load_seed(portal):
+    """Recorded cookies + localStorage of the portal template, or None"""
+    path = os.path.join(template_dir(portal), "seed.json")
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    with _seed_lock:
+        cached = _seed_memo.get(portal)
+        if cached and cached[0] == mtime:
+            return cached[1]
+    try:
+        with open(path, encoding="utf-8") as f:
+            seed = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning("⚠️ Unreadable seed for %s: %s", portal, e)
+        return None
+    with _seed_lock:
+        _seed_memo[portal] = (mtime, seed)
+    return seed
+
+
+def apply_seed(driver, seed, previous_script_id=None):
+    """Replay the seed into the current target; returns the new init-script id (or None)"""
+    if previous_script_id:
+        try:
+            driver.execute_cdp_cmd("Page.removeScriptToEvaluateOnNewDocument", {"identifier": previous_script_id})
+        except Exception:
+            pass
+    if seed.get("cookies"):
+        driver.execute_cdp_cmd("Network.setCookies", {"cookies": seed["cookies"]})
+    if seed.get("local_storage") and seed.get("origin"):
+        source = SEED_STORAGE_JS % (json.dumps(seed["origin"]), json.dumps(seed["local_storage"]))
+        return driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": source}).get("identifier")
+    return None
+
+
+# -----------------------------------------------------------------------------
+# BUILDING
+# -----------------------------------------------------------------------------
+def _cookie_params(cookie):
+    """Network.getAllCookies entry → Network.setCookies parameter"""
+    keys = ("name", "value", "domain", "path", "secure", "httpOnly", "sameSite", "expires")
+    params = {k: cookie[k] for k in keys if k in cookie}
+    if cookie.get("session"):
+        params.pop("expires", None)
+    return params
+
+
+def capture_seed(driver):
+    """First-party cookies + localStorage of the page the driver is on, in seed format"""
+    from urllib.parse import urlparse
+
+    origin = "{0.scheme}://{0.netloc}".format(urlparse(driver.current_url))
+    host = urlparse(origin).hostname or ""
+    # First-party cookies only: the portal host and its parent domains
+    cookies = [_cookie_params(c) for c in driver.execute_cdp_cmd("Network.getAllCookies", {})["cookies"]
+               if host == c.get("domain", "").lstrip(".") or host.endswith("." + c.get("domain", "").lstrip("."))]
+    local_storage = driver.execute_script(
+        "var o = {}; for (var i = 0; i < localStorage.length; i++) {"
+        " var k = localStorage.key(i); o[k] = localStorage.getItem(k); } return o;") or {}
+    return {"origin": origin, "cookies": cookies, "local_storage": local_storage}
+
+
+def _strip_volatile(profile_dir):
+    for entry in VOLATILE_ENTRIES:
+        path = os.path.join(profile_dir, entry)
+        if os.path.islink(path) or os.path.isfile(path):
+            os.remove(path)
+        elif os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def _write_first_run_prefs(profile_dir):
+    prefs_path = os.path.join(profile_dir, "Default", "Preferences")
+    prefs = {}
+    if os.path.exists(prefs_path):
+        try:
+            with open(prefs_path, encoding="utf-8") as f:
+                prefs = json.load(f)
+        except ValueError:
+            prefs = {}
+    for key, value in FIRST_RUN_PREFS.items():
+        if isinstance(value, dict):
+            prefs.setdefault(key, {}).update(value)
+        else:
+            prefs[key] = value
+    os.makedirs(os.path.dirname(prefs_path), exist_ok=True)
+    with open(prefs_path, "w", encoding="utf-8") as f:
+        json.dump(prefs, f)
+    open(os.path.join(profile_dir, "First Run"), "a").close()
+
+
+def build_template(portal, headless=True):
+    """Launch once on a fresh profile, visit the portal, dismiss its banners and
+    store the initialised profile + consent seed as the portal template"""
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.common.exceptions import TimeoutException
+    from browser_pool import BrowserPool
+
+    recipe = TEMPLATE_RECIPES[portal]
+    os.makedirs(TEMPLATE_ROOT, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=f".{portal}_building_", dir=TEMPLATE_ROOT)
+    profile_dir = os.path.join(staging, "profile")
+    os.makedirs(profile_dir)
+    started = time.time()
+    driver = None
+    try:
+        driver, _ = BrowserPool(size=1).launch_driver(portal, headless, profile_dir)
+        driver.get(recipe["url"])
+        for selector in recipe["clicks"]:
+            try:
+                WebDriverWait(driver, CLICK_TIMEOUT).until(
+                    EC.element_to_be_clickable((By.CSS_SELECTOR, selector))).click()
+                WebDriverWait(driver, CLICK_TIMEOUT).until(
+                    EC.invisibility_of_element_located((By.CSS_SELECTOR, selector)))
+            except TimeoutException:
+                logger.info("⚠️ %s: %s not shown, skipped", portal, selector)
+
+        seed = capture_seed(driver)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    finally:
+        if driver is not None:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+
+    try:
+        _strip_volatile(profile_dir)
+        _write_first_run_prefs(profile_dir)
+        with open(os.path.join(staging, "seed.json"), "w", encoding="utf-8") as f:
+            json.dump({"portal": portal, **seed, "built_at": time.time()}, f, ensure_ascii=False)
+        final = template_dir(portal)
+        retired = None
+        if os.path.exists(final):
+            retired = final + f".old-{os.getpid()}"
+            os.rename(final, retired)
+        os.rename(staging, final)
+        if retired:
+            shutil.rmtree(retired, ignore_errors=True)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    logger.info("🧰 Built %s profile template in %.1fs (%d cookie(s), %d storage key(s))",
+                portal, time.time() - started, len(seed["cookies"]), len(seed["local_storage"]))
+    return final
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    portals = sys.argv[1:] or list(TEMPLATE_RECIPES)
+    failed = 0
+    for name in portals:
+        try:
+            build_template(name)
+        except Exception as e:
+            failed += 1
+            logger.error("❌ Template for %s failed: %s", name, e)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Job Progress Events (JSON-lines protocol consumed by server/services/jobQueue.cjs)
+Author: Izaz Ahamed
+------------------------------------------------------------
+✅ One compact event per step: job_started, row_started, row_finished,
+   artifact, job_summary
+✅ row_finished carries the row timing, artifact path (relative to the output
+   dir) and error class, so the server never scans the output directory
+✅ Channel: the pipe on fd SPF_PROGRESS_FD (one-shot spawn) or the worker's
+   event stream (script_wrapper --worker); silently off when run by hand
+✅ manifest.json in the output dir: every artifact with size, sha256 and page
+   count plus the row → artifact mapping, written atomically (tmp + rename)
+"""
+
+import os, json, time, hashlib, logging, threading
+
+logger = logging.getLogger("JobProgress")
+
+PROTOCOL_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+HASH_CHUNK = 1 << 20
+
+_sink = None
+_fd_stream = None
+_sink_lock = threading.Lock()
+
+
+def set_sink(func):
+    """Route events to func(event, **fields) (worker mode); None restores the default channel"""
+    global _sink
+    with _sink_lock:
+        _sink = func
+
+
+def _fd_writer():
+    global _fd_stream
+    if _fd_stream is None:
+        fd = os.environ.get("SPF_PROGRESS_FD")
+        if not fd:
+            return None
+        try:
+            _fd_stream = os.fdopen(int(fd), "w", buffering=1, encoding="utf-8")
+        except (OSError, ValueError):
+            os.environ.pop("SPF_PROGRESS_FD", None)
+            return None
+    return _fd_stream
+
+
+def emit(event, **fields):
+    with _sink_lock:
+        if _sink is not None:
+            _sink(event, **fields)
+            return
+        stream = _fd_writer()
+        if stream is None:
+            return
+        try:
+            stream.write(json.dumps({"event": event, **fields}, default=str, separators=(",", ":")) + "\n")
+        except OSError:
+            pass
+
+
+# -----------------------------------------------------------------------------
+# MANIFEST
+# -----------------------------------------------------------------------------
+def pdf_page_count(path):
+    """Page count of a PDF, or None if it cannot be parsed"""
+    try:
+        from PyPDF2 import PdfReader
+        return len(PdfReader(path, strict=False).pages)
+    except Exception:
+        return None
+
+
+def describe_file(path):
+    """size / sha256 / pages of one result file (pages only for PDFs)"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    info = {"size": os.path.getsize(path), "sha256": digest.hexdigest()}
+    if path.lower().endswith(".pdf"):
+        info["pages"] = pdf_page_count(path)
+    return info
+
+
+def write_json_atomic(path, data):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, default=str, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def read_manifest(output_dir):
+    """The manifest of a finished job, or None"""
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+# -----------------------------------------------------------------------------
+# JOB PROGRESS
+# -----------------------------------------------------------------------------
+class JobProgress:
+    """Per-job row accounting; thread-safe (parallel shard workers share one instance)"""
+
+    def __init__(self, output_dir, total=0, job_id=None):
+        self.output_dir = os.path.abspath(output_dir)
+        self.job_id = job_id
+        self.total = total
+        self.started = time.time()
+        self.ok = self.failed = 0
+        self._row_started = {}
+        self._errors = {}
+        self._keys = {}
+        self._rows = {}           # index -> row entry of the manifest
+        self._artifacts = {}      # relative path -> artifact entry of the manifest
+        self._lock = threading.Lock()
+        emit("job_started", v=PROTOCOL_VERSION, total=total)
+
+    def _rel(self, path):
+        return os.path.relpath(os.path.abspath(path), self.output_dir).replace(os.sep, "/")
+
+    def _record_artifact(self, path, kind, row=None):
+        """Describe a result file for the manifest (hashed once, on the calling worker thread)"""
+        rel = self._rel(path)
+        try:
+            info = describe_file(path)
+        except OSError as e:
+            logger.warning("⚠️ Manifest: cannot read %s: %s", rel, e)
+            return rel
+        entry = {"path": rel, "kind": kind, **info}
+        if row is not None:
+            entry["row"] = row
+        with self._lock:
+            self._artifacts[rel] = entry
+        return rel
+
+    def set_total(self, total):
+        self.total = total
+        emit("job_total", total=total)
+
+    def row_started(self, index, key=None):
+        with self._lock:
+            self._row_started[index] = time.time()
+            if key is not None:
+                self._keys[index] = key
+        emit("row_started", index=index, key=None if key is None else str(key))
+
+    def row_error(self, index, error):
+        """Remember why a row failed; reported with its row_finished event"""
+        with self._lock:
+            self._errors[index] = (type(error).__name__, str(error)[:300])
+
+    def row_finished(self, index, artifact=None, ok=None, source=None, key=None):
+        ok = artifact is not None if ok is None else ok
+        with self._lock:
+            started = self._row_started.pop(index, None)
+            error_class, error = self._errors.pop(index, (None, None))
+            key = self._keys.pop(index, None) if key is None else key
+            if ok:
+                self.ok += 1
+            else:
+                self.failed += 1
+            done = self.ok + self.failed
+        fields = {"index": index, "status": "ok" if ok else "failed", "done": done, "total": self.total,
+                  "ms": round((time.time() - started) * 1000) if started else 0}
+        if key is not None:
+            fields["key"] = str(key)
+        if source:
+            fields["source"] = source
+        if artifact:
+            fields["artifact"] = self._record_artifact(artifact, "row", row=index)
+        if not ok:
+            fields["error_class"] = error_class or "RowFailed"
+            if error:
+                fields["error"] = error
+        row = {k: fields[k] for k in ("index", "key", "status", "ms", "source", "artifact", "error_class", "error")
+               if k in fields}
+        with self._lock:
+            self._rows[index] = row
+        emit("row_finished", **fields)
+
+    def artifact(self, path, kind="report"):
+        """A job-level result file (combined report, CSV, JSON)"""
+        emit("artifact", path=self._record_artifact(path, kind), kind=kind)
+
+    def write_manifest(self, **summary):
+        """Write <output_dir>/manifest.json atomically; returns its path"""
+        with self._lock:
+            rows = [self._rows[i] for i in sorted(self._rows)]
+            artifacts = sorted(self._artifacts.values(),
+                               key=lambda a: (a["kind"] == "row", a.get("row") or 0, a["path"]))
+        manifest = {
+            "v": MANIFEST_VERSION,
+            "job_id": self.job_id,
+            "created_at": time.time(),
+            "summary": summary,
+            "artifacts": artifacts,
+            "rows": rows,
+        }
+        path = os.path.join(self.output_dir, MANIFEST_NAME)
+        os.makedirs(self.output_dir, exist_ok=True)
+        write_json_atomic(path, manifest)
+        return path
+
+    def finish(self, **extra):
+        duration = time.time() - self.started
+        with self._lock:
+            ok, failed = self.ok, self.failed
+        summary = {"total": self.total, "ok": ok, "failed": failed, "duration": round(duration, 2),
+                   "rows_per_min": round((ok + failed) / duration * 60, 2) if duration > 0 else 0, **extra}
+        try:
+            manifest = self._rel(self.write_manifest(**summary))
+        except OSError as e:
+            logger.warning("⚠️ Could not write %s: %s", MANIFEST_NAME, e)
+            manifest = None
+        emit("job_summary", manifest=manifest, **summary)
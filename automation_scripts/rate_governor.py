@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cross-Job Portal Rate Governor (shared by all automation scripts)
+Author: Izaz Ahamed
+------------------------------------------------------------
+✅ One token bucket per portal host, shared by every job and worker process
+   (SQLite in WAL mode, BEGIN IMMEDIATE around each take/refill)
+✅ Replaces the fixed time.sleep(2) between rows: a row starts as soon as the
+   host has a token, however many jobs are hitting it
+✅ AIMD pacing: each row the portal answered in time adds a little rate; a
+   transport error / 5xx, a throttled (429/503) or a slow row halves it — at most
+   once per cooldown window. Business failures (not found, validation) leave the
+   rate alone: the portal answered them fine
+✅ SPF_RATE_GOVERNOR=0 restores the old fixed inter-row sleep
+"""
+
+import os, time, sqlite3, logging, threading
+from urllib.parse import urlparse
+
+logger = logging.getLogger("RateGovernor")
+
+# -----------------------------------------------------------------------------
+# CONFIGURATION
+# -----------------------------------------------------------------------------
+GOVERNOR_ENABLED = os.environ.get("SPF_RATE_GOVERNOR", "1") != "0"
+GOVERNOR_DB = os.environ.get(
+    "SPF_RATE_DB",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "rate_governor.sqlite3")
+)
+FIXED_INTERVAL = 2.0        # seconds between rows when the governor is off or unusable
+ADDITIVE_STEP = 0.02        # rows/s added per clean row
+DECREASE_FACTOR = 0.5       # rate multiplier on congestion
+DECREASE_COOLDOWN = 10.0    # seconds; congestion seen by several jobs at once counts once
+MAX_SLEEP_SLICE = 5.0       # re-read the bucket at least this often while waiting
+
+# rate/min_rate/max_rate in rows per second across all jobs; burst in rows;
+# target_latency in seconds — a slower row counts as congestion
+RATE_POLICIES = {
+    "www.maersk.com": {"rate": 0.5, "min_rate": 0.05, "max_rate": 2.0, "burst": 3, "target_latency": 45},
+    "cpatos.gov.bd": {"rate": 0.5, "min_rate": 0.05, "max_rate": 2.0, "burst": 3, "target_latency": 30},
+    "exp.bb.org.bd": {"rate": 0.5, "min_rate": 0.05, "max_rate": 1.5, "burst": 2, "target_latency": 30},
+    "epb-exporttracker.gov.bd": {"rate": 0.3, "min_rate": 0.03, "max_rate": 1.0, "burst": 1, "target_latency": 60},
+}
+DEFAULT_POLICY = {"rate": 0.5, "min_rate": 0.05, "max_rate": 2.0, "burst": 2, "target_latency": 45}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    host         TEXT PRIMARY KEY,
+    rate         REAL NOT NULL,
+    tokens       REAL NOT NULL,
+    updated      REAL NOT NULL,
+    latency      REAL,
+    decreased_at REAL NOT NULL DEFAULT 0
+);
+"""
+
+
+class RateGovernor:
+    """Token bucket for one portal host; thread-safe, one SQLite connection per thread"""
+
+    def __init__(self, host, db_path=GOVERNOR_DB, enabled=GOVERNOR_ENABLED, log=None):
+        self.host = host
+        self.policy = RATE_POLICIES.get(host, DEFAULT_POLICY)
+        self.db_path = db_path
+        self.enabled = enabled
+        self.log = log or logger
+        self.acquired = 0
+        self.waited = 0.0
+        self.decreases = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        if self.enabled:
+            try:
+                os.makedirs(os.path.dirname(db_path), exist_ok=True)
+                self._db().executescript(SCHEMA)
+            except sqlite3.Error as e:
+                self.log.warning(f"⚠️ Rate governor unavailable ({e}), using fixed {FIXED_INTERVAL:.0f}s pacing")
+                self.enabled = False
+
+    @classmethod
+    def for_url(cls, url, **kwargs):
+        return cls(urlparse(url).hostname or url, **kwargs)
+
+    # -------------------------------------------------------------
+    # Storage helpers
+    # -------------------------------------------------------------
+    def _db(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _load(self, db, now):
+        """Current bucket row, refilled up to now (caller holds the write transaction)"""
+        row = db.execute("SELECT rate, tokens, updated, latency, decreased_at FROM buckets WHERE host=?",
+                         (self.host,)).fetchone()
+        if row is None:
+            rate, tokens, latency, decreased_at = self.policy["rate"], float(self.policy["burst"]), None, 0.0
+            db.execute("INSERT INTO buckets (host, rate, tokens, updated, latency, decreased_at) "
+                       "VALUES (?, ?, ?, ?, ?, ?)", (self.host, rate, tokens, now, latency, decreased_at))
+            return rate, tokens, latency, decreased_at
+        rate, tokens, updated, latency, decreased_at = row
+        tokens = min(float(self.policy["burst"]), tokens + max(0.0, now - updated) * rate)
+        return rate, tokens, latency, decreased_at
+
+    def _transaction(self, fn):
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(db, time.time())
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+        return result
+
+    # -------------------------------------------------------------
+    # Public API
+    # -------------------------------------------------------------
+    def acquire(self):
+        """Block until the host has a token for one more row; returns the seconds waited"""
+        started = time.time()
+        if not self.enabled:
+            # Old behaviour: fixed gap between rows, none before the first one
+            with self._lock:
+                first = self.acquired == 0
+                self.acquired += 1
+            if not first:
+                time.sleep(FIXED_INTERVAL)
+            return 0.0 if first else FIXED_INTERVAL
+
+        def take(db, now):
+            rate, tokens, _, _ = self._load(db, now)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / rate
+            db.execute("UPDATE buckets SET tokens=?, updated=? WHERE host=?", (tokens, now, self.host))
+            return wait
+
+        while True:
+            try:
+                wait = self._transaction(take)
+            except sqlite3.Error as e:
+                self.log.warning(f"⚠️ Rate governor error ({e}), using fixed {FIXED_INTERVAL:.0f}s pacing")
+                self.enabled = False
+                return self.acquire()
+            if wait <= 0:
+                break
+            time.sleep(min(wait, MAX_SLEEP_SLICE))
+
+        waited = time.time() - started
+        with self._lock:
+            self.acquired += 1
+            self.waited += waited
+        if waited >= 1:
+            self.log.debug(f"🚦 {self.host}: waited {waited:.1f}s for a row slot")
+        return waited
+
+    def report(self, latency=None, throttled=False, server_error=False):
+        """Feed one row's outcome back: multiplicative decrease on throttling responses,
+        server_error (no answer, connection error or 5xx) or latency above the host target,
+        additive increase otherwise — whether or not the row found what it looked for"""
+        if not self.enabled:
+            return
+        slow = latency is not None and latency > self.policy["target_latency"]
+        congested = throttled or slow or server_error
+
+        def update(db, now):
+            rate, tokens, ewma, decreased_at = self._load(db, now)
+            if latency is not None:
+                ewma = latency if ewma is None else 0.7 * ewma + 0.3 * latency
+            decreased = False
+            if congested:
+                if now - decreased_at >= DECREASE_COOLDOWN:
+                    rate = max(self.policy["min_rate"], rate * DECREASE_FACTOR)
+                    decreased_at = now
+                    decreased = True
+                if throttled:
+                    tokens = min(tokens, 0.0)
+            else:
+                rate = min(self.policy["max_rate"], rate + ADDITIVE_STEP)
+            db.execute("UPDATE buckets SET rate=?, tokens=?, updated=?, latency=?, decreased_at=? WHERE host=?",
+                       (rate, tokens, now, ewma, decreased_at, self.host))
+            return rate, decreased
+
+        try:
+            rate, decreased = self._transaction(update)
+        except sqlite3.Error as e:
+            self.log.warning(f"⚠️ Rate governor error ({e})")
+            return
+        if decreased:
+            with self._lock:
+                self.decreases += 1
+            reason = "throttled" if throttled else "server error" if server_error else "slow row"
+            self.log.info(f"🚦 {self.host}: {reason}, pacing down to {rate * 60:.1f} rows/min")
+
+    def current_rate(self):
+        if not self.enabled:
+            return 1 / FIXED_INTERVAL
+        row = self._db().execute("SELECT rate FROM buckets WHERE host=?", (self.host,)).fetchone()
+        return row[0] if row else self.policy["rate"]
+
+    def log_summary(self, log=None):
+        with self._lock:
+            acquired, waited, decreases = self.acquired, self.waited, self.decreases
+        if not acquired:
+            return
+        try:
+            rate = f"{self.current_rate() * 60:.1f} rows/min"
+        except sqlite3.Error:
+            rate = "unknown"
+        (log or self.log).info(f"🚦 Pacing {self.host}: {acquired} row(s), waited {waited:.0f}s in total, "
+                               f"{decreases} slow-down(s), rate now {rate}")
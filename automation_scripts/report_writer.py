@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Streaming Combined-PDF Report Writer (shared by all automation scripts)
+Author: Izaz Ahamed
+------------------------------------------------------------
+✅ Appends each per-row PDF to the combined report as soon as the row finishes
+✅ Objects are copied straight to disk — memory stays flat for any job size
+✅ Rows may finish out of order; pages are ordered by row index on finalize
+✅ finalize() only writes the page tree + xref, so it completes instantly
+"""
+
+import os, logging, threading
+
+from PyPDF2 import PdfReader
+from PyPDF2.generic import (
+    ArrayObject, DictionaryObject, IndirectObject, NameObject, NumberObject, StreamObject
+)
+
+logger = logging.getLogger("ReportWriter")
+
+INHERITABLE_PAGE_KEYS = ("/Resources", "/MediaBox", "/CropBox", "/Rotate")
+PAGES_ID, CATALOG_ID = 1, 2
+
+
+class StreamingPdfReport:
+    def __init__(self, path):
+        self.path = path
+        self.part_path = path + ".part"
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._out = open(self.part_path, "wb")
+        self._out.write(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+        self._offsets = {}
+        self._next_id = CATALOG_ID + 1
+        self._pages = []          # (order_key, seq, page_id)
+        self._seq = 0
+        self._lock = threading.Lock()
+        self.documents = 0
+        self.skipped = 0
+
+    # -------------------------------------------------------------
+    # Low-level object writing
+    # -------------------------------------------------------------
+    def _alloc(self):
+        obj_id = self._next_id
+        self._next_id += 1
+        return obj_id
+
+    def _write_object(self, obj_id, obj):
+        self._offsets[obj_id] = self._out.tell()
+        self._out.write(f"{obj_id} 0 obj\n".encode())
+        obj.write_to_stream(self._out, None)
+        self._out.write(b"\nendobj\n")
+
+    def _copy(self, obj, mapping, queue):
+        """Copy a PyPDF2 object, renumbering indirect references into this file"""
+        if isinstance(obj, IndirectObject):
+            key = (obj.idnum, obj.generation)
+            if key not in mapping:
+                mapping[key] = self._alloc()
+                queue.append(obj)
+            return IndirectObject(mapping[key], 0, None)
+        if isinstance(obj, StreamObject):
+            new = obj.__class__()
+            new._data = obj._data
+            for k, v in obj.items():
+                new[NameObject(k)] = self._copy(v, mapping, queue)
+            return new
+        if isinstance(obj, DictionaryObject):
+            new = DictionaryObject()
+            for k, v in obj.items():
+                new[NameObject(k)] = self._copy(v, mapping, queue)
+            return new
+        if isinstance(obj, ArrayObject):
+            return ArrayObject(self._copy(v, mapping, queue) for v in obj)
+        return obj
+
+    def _walk_pages(self, node_ref, inherited, pages_nodes):
+        node = node_ref.get_object()
+        attrs = dict(inherited)
+        for k in INHERITABLE_PAGE_KEYS:
+            if k in node:
+                attrs[k] = node[k]
+        if node.get("/Type") == "/Pages" or "/Kids" in node:
+            if isinstance(node_ref, IndirectObject):
+                pages_nodes.append(node_ref)
+            for kid in node["/Kids"]:
+                yield from self._walk_pages(kid, attrs, pages_nodes)
+        else:
+            yield node_ref, node, attrs
+
+    # -------------------------------------------------------------
+    # Public API
+    # -------------------------------------------------------------
+    def append(self, pdf_path, order_key=None):
+        """Copy every page of pdf_path into the report (thread-safe)"""
+        with self._lock:
+            if self._out is None:
+                raise RuntimeError("Report already finalized")
+            key = self._seq if order_key is None else order_key
+            start = self._out.tell()
+            next_id, offsets = self._next_id, dict(self._offsets)
+            try:
+                with open(pdf_path, "rb") as f:
+                    reader = PdfReader(f)
+                    root_pages = reader.trailer["/Root"].get_object()["/Pages"]
+                    mapping, queue, pages_nodes, new_pages = {}, [], [], []
+
+                    pages = list(self._walk_pages(root_pages, {}, pages_nodes))
+                    for ref in pages_nodes:
+                        mapping[(ref.idnum, ref.generation)] = PAGES_ID
+                    for ref, _, _ in pages:
+                        if isinstance(ref, IndirectObject):
+                            mapping[(ref.idnum, ref.generation)] = self._alloc()
+                    page_ids = set(mapping.values())
+
+                    for ref, node, attrs in pages:
+                        page_id = mapping[(ref.idnum, ref.generation)] if isinstance(ref, IndirectObject) else self._alloc()
+                        page = DictionaryObject()
+                        for k, v in node.items():
+                            if k != "/Parent":
+                                page[NameObject(k)] = self._copy(v, mapping, queue)
+                        for k, v in attrs.items():
+                            if k not in node:
+                                page[NameObject(k)] = self._copy(v, mapping, queue)
+                        page[NameObject("/Parent")] = IndirectObject(PAGES_ID, 0, None)
+                        self._write_object(page_id, page)
+                        new_pages.append(page_id)
+
+                    while queue:
+                        ref = queue.pop()
+                        obj_id = mapping[(ref.idnum, ref.generation)]
+                        if obj_id in page_ids or obj_id in self._offsets:
+                            continue
+                        self._write_object(obj_id, self._copy(ref.get_object(), mapping, queue))
+            except Exception as e:
+                # Roll back partial output so one bad file never corrupts the report
+                self._out.seek(start)
+                self._out.truncate()
+                self._next_id, self._offsets = next_id, offsets
+                self.skipped += 1
+                logger.warning(f"⚠️ Skipped {os.path.basename(pdf_path)} in combined report: {e}")
+                return False
+
+            for page_id in new_pages:
+                self._pages.append((key, self._seq, page_id))
+                self._seq += 1
+            self.documents += 1
+            self._out.flush()
+            return True
+
+    def finalize(self):
+        """Write page tree, catalog and xref; returns the report path or None if empty"""
+        with self._lock:
+            if self._out is None:
+                return self.path if os.path.exists(self.path) else None
+            if not self._pages:
+                self._out.close()
+                self._out = None
+                os.remove(self.part_path)
+                return None
+
+            kids = ArrayObject(IndirectObject(pid, 0, None) for _, _, pid in sorted(self._pages))
+            pages = DictionaryObject({
+                NameObject("/Type"): NameObject("/Pages"),
+                NameObject("/Kids"): kids,
+                NameObject("/Count"): NumberObject(len(kids)),
+            })
+            catalog = DictionaryObject({
+                NameObject("/Type"): NameObject("/Catalog"),
+                NameObject("/Pages"): IndirectObject(PAGES_ID, 0, None),
+            })
+            self._write_object(PAGES_ID, pages)
+            self._write_object(CATALOG_ID, catalog)
+
+            xref_offset = self._out.tell()
+            size = self._next_id
+            self._out.write(f"xref\n0 {size}\n".encode())
+            self._out.write(b"0000000000 65535 f \n")
+            for obj_id in range(1, size):
+                offset = self._offsets.get(obj_id)
+                if offset is None:
+                    self._out.write(b"0000000000 65535 f \n")
+                else:
+                    self._out.write(f"{offset:010d} 00000 n \n".encode())
+            self._out.write(f"trailer\n<< /Size {size} /Root {CATALOG_ID} 0 R >>\n"
+                            f"startxref\n{xref_offset}\n%%EOF\n".encode())
+            self._out.close()
+            self._out = None
+            os.replace(self.part_path, self.path)
+            logger.info(f"📄 Combined report finalized: {len(kids)} pages from {self.documents} PDFs")
+            return self.path
+
+    def abort(self):
+        with self._lock:
+            if self._out is not None:
+                self._out.close()
+                self._out = None
+                if os.path.exists(self.part_path):
+                    os.remove(self.part_path)
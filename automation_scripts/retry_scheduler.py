@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Bounded Retry Scheduler with Dead-Letter Queue
+Author: Izaz Ahamed
+------------------------------------------------------------
+✅ Failed rows go to the back of the run with exponential backoff + jitter
+✅ Fresh rows keep flowing while failed ones cool down
+✅ Per-row attempt limit and a global retry budget for the whole job
+✅ Rows that run out of attempts (or budget) land in a dead-letter list,
+   handed to a callback immediately so it can be written incrementally
+✅ abandon(): dead-letter everything left at once (portal down, circuit open)
+"""
+
+import os, time, heapq, random, logging, threading
+
+logger = logging.getLogger("RetryScheduler")
+
+RETRY_BASE_DELAY = float(os.environ.get("SPF_RETRY_BASE_DELAY", "15"))
+RETRY_MAX_DELAY = float(os.environ.get("SPF_RETRY_MAX_DELAY", "300"))
+# Total retries allowed per job, as a fraction of its rows (never below RETRY_BUDGET_MIN)
+RETRY_BUDGET_RATIO = float(os.environ.get("SPF_RETRY_BUDGET_RATIO", "0.5"))
+RETRY_BUDGET_MIN = 5
+
+
+class RetryItem:
+    __slots__ = ("payload", "attempt", "last_error")
+
+    def __init__(self, payload):
+        self.payload = payload
+        self.attempt = 1
+        self.last_error = None
+
+
+class RetryScheduler:
+    def __init__(self, payloads, max_attempts=3, budget=None, base_delay=RETRY_BASE_DELAY,
+                 max_delay=RETRY_MAX_DELAY, on_dead_letter=None, log=None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.on_dead_letter = on_dead_letter
+        self.log = log or logger
+        self.ready = [RetryItem(p) for p in payloads]
+        self.ready.reverse()                 # pop() from the end keeps input order
+        self.delayed = []                    # heap of (ready_at, seq, item)
+        self.dead_letters = []
+        self.budget = budget if budget is not None else max(RETRY_BUDGET_MIN, int(len(self.ready) * RETRY_BUDGET_RATIO))
+        self.retries = 0
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    # -------------------------------------------------------------
+    def backoff(self, attempt):
+        """Exponential backoff with equal jitter: half fixed, half random"""
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def next(self):
+        """Next row to try; waits for the earliest cooled-down retry when only retries remain.
+        Returns None when nothing is left."""
+        while True:
+            with self._lock:
+                now = time.time()
+                if self.delayed and self.delayed[0][0] <= now:
+                    return heapq.heappop(self.delayed)[2]
+                if self.ready:
+                    return self.ready.pop()
+                if not self.delayed:
+                    return None
+                wait_for = self.delayed[0][0] - now
+            self.log.info(f"⏳ Waiting {wait_for:.0f}s for the next retry window")
+            time.sleep(wait_for)
+
+    def fail(self, item, error=None):
+        """Reschedule a failed row; returns the delay in seconds, or None if it was dead-lettered"""
+        with self._lock:
+            item.last_error = str(error) if error is not None else None
+            if item.attempt >= self.max_attempts or self.retries >= self.budget:
+                reason = "attempts exhausted" if item.attempt >= self.max_attempts else "retry budget exhausted"
+                self.dead_letters.append(item)
+                dead = True
+            else:
+                delay = self.backoff(item.attempt)
+                item.attempt += 1
+                self.retries += 1
+                self._seq += 1
+                heapq.heappush(self.delayed, (time.time() + delay, self._seq, item))
+                dead = False
+        if dead:
+            if self.on_dead_letter:
+                self.on_dead_letter(item, reason)
+            return None
+        return delay
+
+    def abandon(self, reason, error=None):
+        """Dead-letter every row still waiting (fresh or cooling down) without trying it;
+        returns the abandoned items"""
+        with self._lock:
+            items = list(reversed(self.ready)) + [entry[2] for entry in sorted(self.delayed)]
+            self.ready, self.delayed = [], []
+            for item in items:
+                item.last_error = str(error) if error is not None else reason
+            self.dead_letters.extend(items)
+        if self.on_dead_letter:
+            for item in items:
+                self.on_dead_letter(item, reason)
+        return items
+
+    def remaining(self):
+        with self._lock:
+            return len(self.ready) + len(self.delayed)
+
+    def summary(self):
+        with self._lock:
+            return {"retries": self.retries, "budget": self.budget, "dead_letters": len(self.dead_letters)}
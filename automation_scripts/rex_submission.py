@@ -14,73 +14,98 @@ Workflow:
 6️⃣ Save + Back
 7️⃣ Repeat for each CSV row
 8️⃣ Generate results CSV with success/failure status
+9️⃣ Row checkpoint journal — a restarted job never re-submits a saved SOO
+🔟 Soft reset + re-login after a failed record, periodic browser recycling
+⏱️ Pre-flight: every row checked (attachments, select values, dates, numbers)
+   against a one-time index of the extracted ZIP before Chrome starts
+⚡ EPB_API_MODE=1: after the browser login, SOOs go through the portal's JSON
+   API (epb_api_engine); a failure before the SOO exists falls back to the
+   browser, one after it is reported and, on restart, read back — never re-added
+🔑 Encrypted session vault — a still-valid EPB session from an earlier job is
+   reused and the interactive login skipped
+🔌 Portal circuit breaker: while the EPB portal is down, remaining records fail
+   at once (PortalUnavailable, kept in the results CSV) instead of timing out
 ---------------------------------------------------------------------------------
-Usage: python rex_submission.py <csv_file> <output_dir> <job_id> <pdf_dir> <username> <password>
+Usage: python rex_submission.py <csv_file> <output_dir> <job_id> <pdf_dir> <username> <password> [--spf-user=<id>]
 """
 
-import os, sys, csv, time, logging
-from selenium import webdriver
+import os, re, sys, csv, time, logging
+from datetime import datetime
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait, Select
+from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
 
-# Argument validation
-if len(sys.argv) < 7:
-    print("❌ Usage: python rex_submission.py <csv_file> <output_dir> <job_id> <pdf_dir> <username> <password>")
-    sys.exit(1)
-
-CSV_FILE = sys.argv[1]
-OUTPUT_DIR = sys.argv[2]
-JOB_ID = sys.argv[3]
-PDF_DIR = sys.argv[4]
-USERNAME = sys.argv[5]
-PASSWORD = sys.argv[6]
+from attachment_index import AttachmentIndex, AmbiguousAttachment
+from browser_pool import get_pool, DriverHealth
+from circuit_breaker import CircuitBreaker, EXIT_PORTAL_DOWN
+from epb_api_engine import EpbApiEngine, EpbApiError
+from form_fill import FormFiller, FormFillStats, SELECT_VALUE, SELECT_TEXT
+from job_journal import JobJournal, row_key
+from progress import JobProgress
+from rate_governor import RateGovernor
+from session_vault import SessionVault, resume as resume_session, save as save_session
+from wait_engine import WaitEngine
 
 URL = "https://epb-exporttracker.gov.bd/#/login"
-RESULT_LOG = os.path.join(OUTPUT_DIR, f"soo_results_{JOB_ID}.csv")
 TIMEOUT = 30
-
-# Setup logging
-os.makedirs(OUTPUT_DIR, exist_ok=True)
-log_file = os.path.join(OUTPUT_DIR, f"rex_submission_{JOB_ID}.log")
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    handlers=[
-        logging.FileHandler(log_file),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
-
-logging.info("=" * 80)
-logging.info("🚀 EPB REX/SOO Submission Automation Started")
-logging.info("=" * 80)
-logging.info(f"📁 Input CSV: {CSV_FILE}")
-logging.info(f"📂 Output Directory: {OUTPUT_DIR}")
-logging.info(f"🆔 Job ID: {JOB_ID}")
-logging.info(f"📦 PDF Directory: {PDF_DIR}")
-logging.info(f"👤 Username: {USERNAME}")
-logging.info("=" * 80)
+LOGGED_IN_MARKER = (By.CSS_SELECTOR, "div.tile a[href*='sooList']")
+EPB_API_MODE = os.environ.get("EPB_API_MODE", "0") == "1"
+USAGE = ("❌ Usage: python rex_submission.py <csv_file> <output_dir> <job_id> <pdf_dir> <username> <password> "
+         "[--spf-user=<id>]")
+
+CSV_FILE = OUTPUT_DIR = JOB_ID = PDF_DIR = USERNAME = PASSWORD = SPF_USER = None
+RESULT_LOG = None
+WAITS = None
+JOURNAL = None
+PROGRESS = None
+ATTACHMENTS = None
+FORM_STATS = FormFillStats()
+VAULT = None
+BREAKER = None
+
+# Pre-flight rules
+REQUIRED_FIELDS = ("InvoiceNo", "RexImporterId", "DestinationCountryId", "FreightRoute", "BLNo", "Year",
+                   "HSCode", "Quantity", "UnitType", "Currency", "InvoiceValue")
+ID_SELECT_FIELDS = ("RexImporterId", "DestinationCountryId")       # select_by_value
+DATE_FIELDS = ("BLDate", "EXPDate", "BillOfExportDate", "InvoiceDate", "DeclarationDate")
+NUMBER_FIELDS = ("Quantity", "InvoiceValue")
+DATE_FORMATS = ("%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y", "%Y-%m-%d", "%d-%b-%Y", "%d %b %Y", "%m/%d/%Y")
+ATTACHMENT_TYPES = {"invoice": "Commercial Invoice", "bol": "Bill of Lading"}
+
+def configure(csv_file, output_dir, job_id, pdf_dir, username, password, spf_user=None):
+    """Bind job arguments and (re)initialise logging for this job"""
+    global CSV_FILE, OUTPUT_DIR, JOB_ID, PDF_DIR, USERNAME, PASSWORD, RESULT_LOG, SPF_USER
+    CSV_FILE, OUTPUT_DIR, JOB_ID, SPF_USER = csv_file, output_dir, job_id, spf_user
+    PDF_DIR, USERNAME, PASSWORD = pdf_dir, username, password
+    RESULT_LOG = os.path.join(OUTPUT_DIR, f"soo_results_{JOB_ID}.csv")
+
+    # Setup logging
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    log_file = os.path.join(OUTPUT_DIR, f"rex_submission_{JOB_ID}.log")
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(message)s",
+        handlers=[
+            logging.FileHandler(log_file),
+            logging.StreamHandler(sys.stdout)
+        ],
+        force=True
+    )
+
+    logging.info("=" * 80)
+    logging.info("🚀 EPB REX/SOO Submission Automation Started")
+    logging.info("=" * 80)
+    logging.info(f"📁 Input CSV: {CSV_FILE}")
+    logging.info(f"📂 Output Directory: {OUTPUT_DIR}")
+    logging.info(f"🆔 Job ID: {JOB_ID}")
+    logging.info(f"📦 PDF Directory: {PDF_DIR}")
+    logging.info(f"👤 Username: {USERNAME}")
+    logging.info("=" * 80)
 
 def setup_driver():
-    """Setup Chrome driver with headless configuration"""
-    opts = Options()
-    opts.add_argument("--headless=new")
-    opts.add_argument("--no-sandbox")
-    opts.add_argument("--disable-dev-shm-usage")
-    opts.add_argument("--window-size=1920,1080")
-    opts.add_argument("--disable-gpu")
-    opts.add_argument("--disable-blink-features=AutomationControlled")
-    opts.add_argument("--incognito")
-
-    for path in ["/usr/bin/google-chrome", "/usr/bin/chromium", "/usr/bin/chromium-browser"]:
-        if os.path.exists(path):
-            opts.binary_location = path
-            break
-
-    driver = webdriver.Chrome(options=opts)
+    """Lease headless Chrome for the EPB portal from the shared pool"""
+    driver = get_pool().lease("epb")
     logging.info("✅ Chrome driver initialized successfully")
     return driver
 
@@ -104,27 +129,95 @@ def write_result(data, success, message):
         ])
 
 def find_pdf_file(invoice_no, pdf_type):
-    """Find PDF file in extracted directory by invoice number and type"""
-    patterns = [
-        f"{invoice_no}_{pdf_type}.pdf",
-        f"{invoice_no}-{pdf_type}.pdf",
-        f"{pdf_type}_{invoice_no}.pdf",
-        f"{pdf_type}-{invoice_no}.pdf",
-    ]
-
-    for pattern in patterns:
-        pdf_path = os.path.join(PDF_DIR, pattern)
-        if os.path.exists(pdf_path):
-            return os.path.abspath(pdf_path)
-
-    for filename in os.listdir(PDF_DIR):
-        if invoice_no in filename and pdf_type.lower() in filename.lower():
-            return os.path.abspath(os.path.join(PDF_DIR, filename))
-
+    """Find PDF file in extracted directory by invoice number and type (indexed once per job)"""
+    global ATTACHMENTS
+    if ATTACHMENTS is None:
+        ATTACHMENTS = AttachmentIndex(PDF_DIR, log=logging.getLogger())
+    return ATTACHMENTS.find(invoice_no, pdf_type)
+
+# ---------------------------------------------------------------------
+# PRE-FLIGHT VALIDATION
+# ---------------------------------------------------------------------
+class PreflightError(ValueError):
+    """Row rejected before the browser starts"""
+
+def _parse_date(value):
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
     return None
 
+def check_row(row):
+    """List of problems with one CSV row (empty when it can be submitted).
+    Values are stripped in place: select_by_visible_text matches trimmed option text."""
+    for k, v in row.items():
+        if isinstance(v, str):
+            row[k] = v.strip()
+
+    problems = [f"{f} missing" for f in REQUIRED_FIELDS if not row.get(f)]
+    for f in ID_SELECT_FIELDS:
+        if row.get(f) and not re.fullmatch(r"[A-Za-z0-9_\-]+", row[f]):
+            problems.append(f"{f} '{row[f]}' is not an option value")
+    year = row.get("Year")
+    if year and not (year.isdigit() and 2000 <= int(year) <= datetime.now().year + 1):
+        problems.append(f"Year '{year}' out of range")
+    hs_code = row.get("HSCode")
+    if hs_code and not re.fullmatch(r"\d{4}(\.?\d{2}){0,3}", hs_code):
+        problems.append(f"HSCode '{hs_code}' malformed")
+    for f in NUMBER_FIELDS:
+        value = row.get(f)
+        if value:
+            try:
+                if float(value.replace(",", "")) <= 0:
+                    problems.append(f"{f} must be positive")
+            except ValueError:
+                problems.append(f"{f} '{value}' is not a number")
+    for f in DATE_FIELDS:
+        if row.get(f) and _parse_date(row[f]) is None:
+            problems.append(f"{f} '{row[f]}' is not a date")
+
+    invoice_no = row.get("InvoiceNo")
+    if invoice_no:
+        for doc_type, label in ATTACHMENT_TYPES.items():
+            try:
+                if not find_pdf_file(invoice_no, doc_type):
+                    problems.append(f"{label} PDF not found")
+            except AmbiguousAttachment as e:
+                problems.append(f"{label} PDF ambiguous ({e})")
+    return problems
+
+def preflight(pending):
+    """Reject unsubmittable rows up front; returns (rows to submit, rejected count)"""
+    started = time.time()
+    valid, rejected = [], 0
+    for idx, row in pending:
+        problems = check_row(row)
+        if not problems:
+            valid.append((idx, row))
+            continue
+        rejected += 1
+        message = "Pre-flight: " + "; ".join(problems)
+        logging.warning(f"🚫 Record {idx} (Invoice: {row.get('InvoiceNo') or 'N/A'}) rejected — {message}")
+        write_result(row, False, message)
+        PROGRESS.row_error(idx, PreflightError(message))
+        PROGRESS.row_finished(idx, ok=False, key=row.get('InvoiceNo'))
+    logging.info(f"🧪 Pre-flight: {len(valid)} row(s) ready, {rejected} rejected "
+                 f"in {(time.time() - started) * 1000:.0f}ms")
+    return valid, rejected
+
+def skip_record(idx, row):
+    """Fail a record without touching the portal (circuit open)"""
+    error = BREAKER.skip()
+    write_result(row, False, str(error))
+    PROGRESS.row_error(idx, error)
+    PROGRESS.row_finished(idx, ok=False, key=row.get('InvoiceNo'))
+
 def login(driver, wait):
     """Login to EPB Export Tracker portal"""
+    if VAULT and resume_session(VAULT, driver, "epb", LOGGED_IN_MARKER):
+        return True
     try:
         logging.info("🌐 Opening EPB Export Tracker...")
         driver.get(URL)
@@ -134,11 +227,15 @@ def login(driver, wait):
         driver.find_element(By.ID, "inputPassword").send_keys(PASSWORD)
         driver.find_element(By.CSS_SELECTOR, "button.btn i.icon-lock").find_element(By.XPATH, "..").click()
 
-        wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "div.tile a[href*='sooList']")))
+        wait.until(EC.presence_of_element_located(LOGGED_IN_MARKER))
         logging.info("✅ Login successful")
+        if VAULT:
+            save_session(VAULT, driver, "epb")
         return True
     except Exception as e:
         logging.error(f"❌ Login failed: {e}")
+        if BREAKER:
+            BREAKER.record(False)
         return False
 
 def process_soo_record(driver, wait, row, index, total):
@@ -152,98 +249,102 @@ def process_soo_record(driver, wait, row, index, total):
 
         # Navigate to SOO List
         driver.find_element(By.CSS_SELECTOR, "div.tile a[href*='sooList']").click()
-        time.sleep(2)
+        WAITS.settle("soo list", replaces=2)
 
         # Click Add SOO
         wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, "button[ng-click='checkSooFormEligibility()']"))).click()
-        time.sleep(1)
 
         # Confirm popup
-        wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, "button.btn.btn-primary[ng-click=\"close('yes')\"]"))).click()
+        WAITS.until(EC.element_to_be_clickable((By.CSS_SELECTOR, "button.btn.btn-primary[ng-click=\"close('yes')\"]")),
+                    "confirm popup", replaces=1).click()
         logging.info("☑️  Add SOO confirmed")
 
         # Wait for loading to complete
-        time.sleep(3)
+        WAITS.settle("soo created", replaces=3)
 
         # Open first record
         first_row = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, "div.k-grid-content tbody tr:first-child a")))
         driver.execute_script("arguments[0].click();", first_row)
         logging.info("📋 Opened SOO record")
-        time.sleep(2)
 
         # Click SOO Form Details tab
-        wait.until(EC.element_to_be_clickable((By.LINK_TEXT, "SoO Form Details"))).click()
-        time.sleep(2)
+        WAITS.until(EC.element_to_be_clickable((By.LINK_TEXT, "SoO Form Details")), "soo record", replaces=2).click()
+        WAITS.settle("form details", replaces=2)
 
         # Fill form fields
         logging.info("📝 Filling form fields...")
-        Select(wait.until(EC.presence_of_element_located((By.ID, "RexImporterId")))).select_by_value(row.get("RexImporterId", ""))
-        Select(driver.find_element(By.ID, "DestinationCountryId")).select_by_value(row.get("DestinationCountryId", ""))
-        Select(driver.find_element(By.ID, "inputFreightRoute")).select_by_visible_text(row.get("FreightRoute", ""))
-
-        driver.find_element(By.ID, "inputBLNo").send_keys(row.get("BLNo", ""))
-        driver.find_element(By.ID, "inputBLDate").send_keys(row.get("BLDate", ""))
-        driver.find_element(By.ID, "inputContainerNo").send_keys(row.get("ContainerNo", ""))
-        driver.find_element(By.ID, "adCode").send_keys(row.get("AdCode", ""))
-        driver.find_element(By.ID, "serial").send_keys(row.get("Serial", ""))
-        Select(driver.find_element(By.ID, "year")).select_by_visible_text(row.get("Year", ""))
-        driver.find_element(By.ID, "inputEXPDate").send_keys(row.get("EXPDate", ""))
-        driver.find_element(By.ID, "inputBillOfExportNo").send_keys(row.get("BillOfExportNo", ""))
-        driver.find_element(By.ID, "inputBillOfExportDate").send_keys(row.get("BillOfExportDate", ""))
-
-        Select(driver.find_element(By.ID, "inputHSCode")).select_by_visible_text(row.get("HSCode", ""))
-        driver.find_element(By.ID, "inputQnty").send_keys(row.get("Quantity", ""))
-        Select(driver.find_element(By.ID, "inputUnitType")).select_by_visible_text(row.get("UnitType", ""))
+        wait.until(EC.presence_of_element_located((By.ID, "RexImporterId")))
+        form = FormFiller(driver, FORM_STATS)
+        form.fill({
+            "RexImporterId": (row.get("RexImporterId", ""), SELECT_VALUE),
+            "DestinationCountryId": (row.get("DestinationCountryId", ""), SELECT_VALUE),
+            "inputFreightRoute": (row.get("FreightRoute", ""), SELECT_TEXT),
+            "inputBLNo": row.get("BLNo", ""),
+            "inputBLDate": row.get("BLDate", ""),
+            "inputContainerNo": row.get("ContainerNo", ""),
+            "adCode": row.get("AdCode", ""),
+            "serial": row.get("Serial", ""),
+            "year": (row.get("Year", ""), SELECT_TEXT),
+            "inputEXPDate": row.get("EXPDate", ""),
+            "inputBillOfExportNo": row.get("BillOfExportNo", ""),
+            "inputBillOfExportDate": row.get("BillOfExportDate", ""),
+            "inputHSCode": (row.get("HSCode", ""), SELECT_TEXT),
+            "inputQnty": row.get("Quantity", ""),
+            "inputUnitType": (row.get("UnitType", ""), SELECT_TEXT),
+        })
         driver.find_element(By.CSS_SELECTOR, "a[ng-click^='addHsCodeInfo']").click()
-        time.sleep(1)
+        WAITS.settle("hs code row", replaces=1)
 
-        driver.find_element(By.ID, "inputInvoiceNo").send_keys(invoice_no)
-        driver.find_element(By.ID, "inputInvoiceDate").send_keys(row.get("InvoiceDate", ""))
-        Select(driver.find_element(By.ID, "currency")).select_by_visible_text(row.get("Currency", ""))
-        driver.find_element(By.ID, "inputInvoiceValue").send_keys(row.get("InvoiceValue", ""))
-        driver.find_element(By.ID, "inputDate").send_keys(row.get("DeclarationDate", ""))
+        form.fill({
+            "inputInvoiceNo": invoice_no,
+            "inputInvoiceDate": row.get("InvoiceDate", ""),
+            "currency": (row.get("Currency", ""), SELECT_TEXT),
+            "inputInvoiceValue": row.get("InvoiceValue", ""),
+            "inputDate": row.get("DeclarationDate", ""),
+        })
 
         logging.info("✅ Form fields filled successfully")
 
         # Upload Commercial Invoice
         logging.info("📤 Uploading Commercial Invoice...")
         wait.until(EC.element_to_be_clickable((By.LINK_TEXT, "Commercial Invoice"))).click()
-        time.sleep(1)
 
         ci_file = find_pdf_file(invoice_no, "invoice")
         if not ci_file:
             raise FileNotFoundError(f"Commercial Invoice PDF not found for {invoice_no}")
 
-        ci_upload = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "input[type='file'][accept*='.pdf']")))
+        ci_upload = WAITS.until(EC.presence_of_element_located((By.CSS_SELECTOR, "input[type='file'][accept*='.pdf']")),
+                                "invoice tab", replaces=1)
         ci_upload.send_keys(ci_file)
+        WAITS.settle("invoice upload", replaces=2)
         logging.info(f"✅ Commercial Invoice uploaded: {os.path.basename(ci_file)}")
-        time.sleep(2)
 
         # Upload Bill of Lading
         logging.info("📦 Uploading Bill of Lading...")
         wait.until(EC.element_to_be_clickable((By.LINK_TEXT, "Bill of Lading"))).click()
-        time.sleep(1)
 
         bol_file = find_pdf_file(invoice_no, "bol")
         if not bol_file:
             raise FileNotFoundError(f"Bill of Lading PDF not found for {invoice_no}")
 
-        bol_upload = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "input[type='file'][accept*='.pdf']")))
+        bol_upload = WAITS.until(EC.presence_of_element_located((By.CSS_SELECTOR, "input[type='file'][accept*='.pdf']")),
+                                 "bol tab", replaces=1)
         bol_upload.send_keys(bol_file)
+        WAITS.settle("bol upload", replaces=2)
         logging.info(f"✅ Bill of Lading uploaded: {os.path.basename(bol_file)}")
-        time.sleep(2)
 
         # Save form
         logging.info("💾 Saving SOO form...")
         wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, "a.control-bar-save-btn[ng-click*='save()']"))).click()
-        time.sleep(4)
+        WAITS.settle("save", replaces=4)
 
         # Go back to list
         wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, "a[href*='sooList'].navigate-link"))).click()
         logging.info("⬅️  Returned to SOO list")
-        time.sleep(2)
+        WAITS.settle("back to list", replaces=2)
 
         write_result(row, True, "SOO submitted successfully")
+        JOURNAL.record(row_key(index, invoice_no), invoice=invoice_no)
         logging.info(f"✅ Record {index} completed successfully")
         return True
 
@@ -251,11 +352,151 @@ def process_soo_record(driver, wait, row, index, total):
         error_msg = str(e)
         logging.error(f"❌ Error processing record {index} (Invoice: {invoice_no}): {error_msg}")
         write_result(row, False, error_msg)
+        if PROGRESS:
+            PROGRESS.row_error(index, e)
         return False
 
-def main():
-    """Main execution function"""
-    driver = None
+# ---------------------------------------------------------------------
+# API FAST PATH
+# ---------------------------------------------------------------------
+def _iso_date(value):
+    parsed = _parse_date(value) if value else None
+    return parsed.strftime("%Y-%m-%d") if parsed else value
+
+def soo_payload(row):
+    """CSV row → (form details, HS-code line) as the SOO screens post them"""
+    payload = {
+        "rexImporterId": row.get("RexImporterId", ""),
+        "destinationCountryId": row.get("DestinationCountryId", ""),
+        "freightRoute": row.get("FreightRoute", ""),
+        "blNo": row.get("BLNo", ""),
+        "blDate": _iso_date(row.get("BLDate")),
+        "containerNo": row.get("ContainerNo", ""),
+        "adCode": row.get("AdCode", ""),
+        "serial": row.get("Serial", ""),
+        "year": row.get("Year", ""),
+        "expDate": _iso_date(row.get("EXPDate")),
+        "billOfExportNo": row.get("BillOfExportNo", ""),
+        "billOfExportDate": _iso_date(row.get("BillOfExportDate")),
+        "invoiceNo": row.get("InvoiceNo", ""),
+        "invoiceDate": _iso_date(row.get("InvoiceDate")),
+        "currency": row.get("Currency", ""),
+        "invoiceValue": row.get("InvoiceValue", "").replace(",", ""),
+        "declarationDate": _iso_date(row.get("DeclarationDate")),
+    }
+    hs_code = {
+        "hsCode": row.get("HSCode", ""),
+        "quantity": row.get("Quantity", "").replace(",", ""),
+        "unitType": row.get("UnitType", ""),
+    }
+    return payload, hs_code
+
+def submit_via_api(api, driver, row, index, submitted):
+    """True when the record went through the API, False when it failed after a SOO was
+    (or may have been) created, None to fall back to the browser (nothing created yet)"""
+    invoice_no = row.get('InvoiceNo', 'Unknown')
+    try:
+        payload, hs_code = soo_payload(row)
+        attachments = {doc_type: find_pdf_file(invoice_no, doc_type) for doc_type in ATTACHMENT_TYPES}
+        soo_id = api.submit(payload, hs_code, attachments, driver=driver)
+    except EpbApiError as e:
+        if not e.fallback_safe:
+            # Adding the SOO again in the browser would leave a duplicate on the portal
+            where = f"SOO {e.soo_id}" if e.soo_id else "a possible draft SOO"
+            logging.error(f"❌ Record {index} (Invoice: {invoice_no}) failed after create: {e}")
+            write_result(row, False, f"API: {e} — check {where} on the portal before resubmitting")
+            JOURNAL.record(row_key(index, invoice_no), status="failed", invoice=invoice_no,
+                           soo_id=e.soo_id, reconcile=True, error=str(e))
+            PROGRESS.row_error(index, e)
+            return False
+        api.fallbacks += 1
+        logging.warning(f"⚠️ API path failed for record {index} (Invoice: {invoice_no}): {e} — using the browser")
+        return None
+    except Exception as e:
+        api.fallbacks += 1
+        logging.warning(f"⚠️ API path failed for record {index} (Invoice: {invoice_no}): {e} — using the browser")
+        return None
+    write_result(row, True, f"SOO {soo_id} submitted via API")
+    JOURNAL.record(row_key(index, invoice_no), invoice=invoice_no, soo_id=soo_id)
+    submitted.append((soo_id, invoice_no))
+    return True
+
+def resume_rows(rows):
+    """Split the CSV against the journal of an earlier run of this job;
+    returns (rows to submit, rows whose SOO must be reconciled, rows already submitted)"""
+    pending, resumed, done = [], [], 0
+    for idx, row in enumerate(rows, start=1):
+        key = row_key(idx, row.get('InvoiceNo', 'Unknown'))
+        entry = JOURNAL.entry(key)
+        if JOURNAL.done(key):
+            logging.info(f"⏭️  Record {idx} already submitted in earlier run (Invoice: {row.get('InvoiceNo')})")
+            PROGRESS.row_finished(idx, ok=True, source="resumed", key=row.get('InvoiceNo'))
+            done += 1
+        elif entry and entry.get("reconcile"):
+            # An earlier run created (or may have created) its SOO: never add it again
+            resumed.append((idx, row, entry))
+        else:
+            pending.append((idx, row))
+    return pending, resumed, done
+
+def reconcile_resumed(api, driver, idx, row, entry):
+    """Settle a row whose SOO an earlier run left unfinished, without creating another one.
+    True if the portal shows that SOO saved; otherwise it is reported for a manual check"""
+    invoice_no = row.get('InvoiceNo', 'Unknown')
+    soo_id = entry.get("soo_id")
+    if soo_id and api and api.reconcile(soo_id, driver):
+        logging.info(f"🔁 Record {idx} (Invoice: {invoice_no}): SOO {soo_id} from an earlier run is saved")
+        write_result(row, True, f"SOO {soo_id} saved (earlier run)")
+        JOURNAL.record(row_key(idx, invoice_no), invoice=invoice_no, soo_id=soo_id)
+        return True
+    where = f"SOO {soo_id}" if soo_id else "A possible draft SOO"
+    message = f"{where} from an earlier run is not saved — finish or delete it on the portal, then resubmit"
+    logging.error(f"❌ Record {idx} (Invoice: {invoice_no}): {message}")
+    write_result(row, False, message)
+    PROGRESS.row_error(idx, EpbApiError(message, soo_id=soo_id))
+    return False
+
+def verify_api_submissions(api, driver, submitted):
+    """Read API-submitted SOOs back, then check the newest one shows in the browser's SOO list"""
+    try:
+        mismatched = api.verify(submitted, driver=driver)
+    except Exception as e:
+        # The SOOs are submitted either way: never let the read-back fail the job
+        logging.warning(f"⚠️ API verification stopped: {e}")
+        mismatched = [invoice_no for _, invoice_no in submitted]
+    for invoice_no in mismatched:
+        logging.warning(f"⚠️ Verification: SOO for invoice {invoice_no} not found as submitted")
+    try:
+        driver.find_element(By.CSS_SELECTOR, "div.tile a[href*='sooList']").click()
+        WAITS.settle("soo list", replaces=2)
+        grid = WebDriverWait(driver, TIMEOUT).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, "div.k-grid-content")))
+        newest = submitted[-1][1]
+        if newest in grid.text:
+            logging.info(f"🔍 Verified in browser: invoice {newest} is on the SOO list")
+        else:
+            logging.warning(f"⚠️ Invoice {newest} not visible on the SOO list")
+    except Exception as e:
+        logging.warning(f"⚠️ Browser verification skipped: {e}")
+    logging.info(f"⚡ API path: {api.submitted} submitted, {api.fallbacks} fell back to the browser, "
+                 f"{api.unfinished} left unfinished, {len(mismatched)} failed verification")
+
+def restore_session(driver):
+    """Log in again on a reset or relaunched browser"""
+    global WAITS
+    WAITS = WaitEngine(driver, "epb", WAITS.stats if WAITS else None)
+    if not login(driver, WebDriverWait(driver, TIMEOUT)):
+        raise RuntimeError("re-login failed")
+
+def run():
+    """Process the configured job, returns the process exit code"""
+    global WAITS, JOURNAL, PROGRESS, ATTACHMENTS, FORM_STATS, VAULT, BREAKER
+    driver = WAITS = ATTACHMENTS = None
+    FORM_STATS = FormFillStats()
+    VAULT = SessionVault(SPF_USER, USERNAME, PASSWORD, log=logging.getLogger())
+    BREAKER = CircuitBreaker.for_url(URL, log=logging.getLogger())
+    api = None
+    api_submitted = []
     success_count = 0
     failed_count = 0
 
@@ -279,22 +520,82 @@ def main():
             logging.warning("⚠️  No records found in CSV file")
             return 1
 
-        # Setup driver and login
-        driver = setup_driver()
-        wait = WebDriverWait(driver, TIMEOUT)
+        # Skip records already submitted by an earlier run of this job
+        JOURNAL = JobJournal(OUTPUT_DIR, JOB_ID)
+        PROGRESS = JobProgress(OUTPUT_DIR, total=total_rows, job_id=JOB_ID)
+        pending, resumed, success_count = resume_rows(rows)
 
-        if not login(driver, wait):
-            logging.error("❌ Failed to login. Aborting...")
-            return 1
+        # Validate every row before Chrome starts
+        pending, rejected = preflight(pending)
+        failed_count += rejected
+
+        if (pending or resumed) and not BREAKER.ready():
+            for idx, row in pending + [(idx, row) for idx, row, _ in resumed]:
+                skip_record(idx, row)
+            failed_count += len(pending) + len(resumed)
+            pending, resumed = [], []
+
+        # Setup driver and login
+        if pending or resumed:
+            driver = setup_driver()
+            wait = WebDriverWait(driver, TIMEOUT)
+            WAITS = WaitEngine(driver, "epb")
+            health = DriverHealth(driver, on_new_session=restore_session, log=logging.getLogger())
+
+            if not login(driver, wait):
+                logging.error("❌ Failed to login. Aborting...")
+                return 1
+
+            # The API also reads back SOOs an earlier run left unfinished
+            if EPB_API_MODE or any(entry.get("soo_id") for _, _, entry in resumed):
+                try:
+                    api = EpbApiEngine(driver, log=logging.getLogger())
+                except Exception as e:
+                    logging.warning(f"⚠️ EPB API mode unavailable ({e}), submitting through the browser")
+
+        for idx, row, entry in resumed:
+            PROGRESS.row_started(idx, row.get('InvoiceNo'))
+            ok = reconcile_resumed(api, driver, idx, row, entry)
+            PROGRESS.row_finished(idx, ok=ok, source="reconciled", key=row.get('InvoiceNo'))
+            if ok:
+                success_count += 1
+            else:
+                failed_count += 1
 
         # Process each record
-        for idx, row in enumerate(rows, start=1):
-            if process_soo_record(driver, wait, row, idx, total_rows):
+        governor = RateGovernor.for_url(URL, log=logging.getLogger())
+        for idx, row in pending:
+            if not BREAKER.ready():
+                skip_record(idx, row)
+                failed_count += 1
+                continue
+            governor.acquire()
+            PROGRESS.row_started(idx, row.get('InvoiceNo'))
+            started = time.time()
+            ok = submit_via_api(api, driver, row, idx, api_submitted) if api and EPB_API_MODE else None
+            if ok is None:
+                ok = process_soo_record(driver, wait, row, idx, total_rows)
+            latency = time.time() - started
+            governor.report(latency, server_error=BREAKER.record(ok))
+            PROGRESS.row_finished(idx, ok=ok, key=row.get('InvoiceNo'))
+            if ok:
                 success_count += 1
             else:
                 failed_count += 1
 
-            time.sleep(2)
+            # A failed record leaves the form half-filled: reset and log in again
+            try:
+                if not ok:
+                    health.recover()
+                health.row_done()
+            except Exception as e:
+                logging.error(f"❌ Browser recovery failed: {e}")
+            if health.driver is not driver:
+                driver = health.driver
+                wait = WebDriverWait(driver, TIMEOUT)
+
+        if api and api_submitted:
+            verify_api_submissions(api, driver, api_submitted)
 
         # Summary
         logging.info("\n" + "=" * 80)
@@ -304,6 +605,17 @@ def main():
         logging.info(f"❌ Failed: {failed_count}/{total_rows}")
         logging.info(f"📄 Results saved to: {RESULT_LOG}")
         logging.info("=" * 80)
+        if WAITS:
+            WAITS.stats.log_summary(logging.getLogger())
+            health.log_summary()
+            governor.log_summary()
+            BREAKER.log_summary()
+            FORM_STATS.log_summary(logging.getLogger())
+        if os.path.exists(RESULT_LOG):
+            PROGRESS.artifact(RESULT_LOG, kind="results")
+        PROGRESS.finish(**BREAKER.summary())
+        if BREAKER.skipped and not PROGRESS.ok:
+            return EXIT_PORTAL_DOWN
 
         return 0 if failed_count == 0 else 0
 
@@ -311,9 +623,27 @@ def main():
         logging.error(f"🚨 Fatal error: {e}")
         return 1
     finally:
+        if JOURNAL:
+            JOURNAL.close()
+            JOURNAL = None
+        PROGRESS = None
+        ATTACHMENTS = None
+        VAULT = BREAKER = None
+        if api:
+            api.close()
         if driver:
-            driver.quit()
-            logging.info("🔒 Browser closed")
+            get_pool().release(driver)
+            logging.info("🔒 Browser returned to pool")
+
+def main(argv=None):
+    argv = sys.argv if argv is None else argv
+    spf_user = next((a.split("=", 1)[1] for a in argv if a.startswith("--spf-user=")), None)
+    argv = [a for a in argv if not a.startswith("--spf-user=")]
+    if len(argv) < 7:
+        print(USAGE)
+        return 1
+    configure(*argv[1:7], spf_user=spf_user)
+    return run()
 
 if __name__ == "__main__":
     sys.exit(main())
@@ -3,20 +3,241 @@
 Automation Script Wrapper
 Provides a unified interface for executing automation scripts with proper error handling
 and result reporting back to the Node.js backend.
+
+Worker mode (``script_wrapper.py --worker [--socket PATH] [--warm portal,...]``) keeps one
+Python process alive: heavy modules are imported once and job requests are read as JSON
+lines, e.g. {"id": "<job_id>", "script": "bb_exp_search", "args": [<argv[1:]>]}. Every
+request streams back "started", "log" and "result" events as JSON lines.
 """
 
 import sys
 import json
+import time
+import threading
+import importlib
 import traceback
 import os
 from pathlib import Path
 
+SCRIPT_DIR = Path(__file__).resolve().parent
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPT_DIR))
+
+# Script name (as used by jobQueue.cjs, with or without .py) -> importable module
+SCRIPT_MODULES = {
+    'damco_tracking_maersk': 'damco_tracking_maersk',
+    'ctg_port_tracking': 'ctg_port_tracking',
+    'egm_download': 'egm_download',
+    'bb_exp_search': 'bb_exp_search',
+    'rex_submission': 'rex_submission',
+}
+
+PRELOAD_MODULES = [
+    'openpyxl',
+    'PyPDF2',
+    'selenium.webdriver',
+    'undetected_chromedriver',
+    'speech_recognition',
+]
+
+
+# -----------------------------------------------------------------------------
+# WORKER MODE
+# -----------------------------------------------------------------------------
+class EventStream:
+    """Writes JSON-line events; also acts as a file so job stdout becomes "log" events"""
+
+    def __init__(self, out, job_id=None):
+        self.out = out
+        self.job_id = job_id
+        self._buffer = ''
+        self._lock = threading.Lock()
+
+    def emit(self, event, **fields):
+        payload = {"event": event}
+        if self.job_id is not None:
+            payload["id"] = self.job_id
+        payload.update(fields)
+        with self._lock:
+            self.out.write(json.dumps(payload, default=str) + "\n")
+            self.out.flush()
+
+    def write(self, text):
+        self._buffer += text
+        while "\n" in self._buffer:
+            line, self._buffer = self._buffer.split("\n", 1)
+            if line.strip():
+                self.emit("log", line=line)
+        return len(text)
+
+    def flush(self):
+        if self._buffer.strip():
+            self.emit("log", line=self._buffer)
+        self._buffer = ''
+
+
+def preload():
+    """Import heavy modules once so every job starts warm"""
+    loaded = []
+    stdout = sys.stdout
+    sys.stdout = sys.stderr
+    try:
+        for name in PRELOAD_MODULES + list(SCRIPT_MODULES.values()):
+            try:
+                importlib.import_module(name)
+                loaded.append(name)
+            except Exception as e:
+                print(f"⚠️ Preload skipped for {name}: {e}", file=sys.stderr)
+    finally:
+        sys.stdout = stdout
+    return loaded
+
+
+def resolve_script(script_name):
+    name = os.path.basename(script_name or '')
+    if name.endswith('.py'):
+        name = name[:-3]
+    if name not in SCRIPT_MODULES:
+        raise ValueError(f"Unknown script: {script_name}")
+    return importlib.import_module(SCRIPT_MODULES[name])
+
+
+def run_job(request, out):
+    """Run one job request in-process and stream its events to ``out``"""
+    events = EventStream(out, request.get("id"))
+    started = time.time()
+    exit_code = 1
+    error = None
+
+    import progress
+    stdout = sys.stdout
+    sys.stdout = events
+    progress.set_sink(events.emit)
+    try:
+        module = resolve_script(request.get("script"))
+        events.emit("started", script=request.get("script"), pid=os.getpid())
+        argv = [module.__file__] + [str(a) for a in request.get("args", [])]
+        exit_code = module.main(argv)
+    except SystemExit as e:
+        exit_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except Exception as e:
+        error = str(e)
+        print(traceback.format_exc(), file=sys.stderr)
+    finally:
+        progress.set_sink(None)
+        events.flush()
+        sys.stdout = stdout
+
+    exit_code = 0 if exit_code is None else exit_code
+    pool_module = sys.modules.get("browser_pool")
+    events.emit("result",
+                exit_code=exit_code,
+                success=exit_code == 0,
+                error=error,
+                duration=round(time.time() - started, 3),
+                browser_launches=pool_module.get_pool().launch_stats() if pool_module else None)
+    return exit_code
+
+
+def serve_stdio():
+    out = sys.stdout
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            EventStream(out).emit("error", error=f"Invalid request: {e}")
+            continue
+        if request.get("command") == "shutdown":
+            break
+        run_job(request, out)
+
+
+def serve_socket(socket_path):
+    import socketserver
+
+    class JobHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            out = _SocketWriter(self.wfile)
+            for raw in self.rfile:
+                line = raw.decode("utf-8").strip()
+                if not line:
+                    continue
+                try:
+                    request = json.loads(line)
+                except ValueError as e:
+                    EventStream(out).emit("error", error=f"Invalid request: {e}")
+                    continue
+                run_job(request, out)
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    # UnixStreamServer handles one connection at a time: scripts keep per-job module state
+    with socketserver.UnixStreamServer(socket_path, JobHandler) as server:
+        server.serve_forever()
+
+
+class _SocketWriter:
+    def __init__(self, wfile):
+        self.wfile = wfile
+
+    def write(self, text):
+        self.wfile.write(text.encode("utf-8"))
+
+    def flush(self):
+        self.wfile.flush()
+
+
+def worker_main(argv):
+    socket_path = None
+    warm = []
+    if '--socket' in argv:
+        socket_path = argv[argv.index('--socket') + 1]
+    if '--warm' in argv:
+        warm = [p for p in argv[argv.index('--warm') + 1].split(',') if p]
+
+    loaded = preload()
+    try:
+        import driver_cache
+        driver_cache.ensure_driver()
+    except Exception as e:
+        print(f"⚠️ chromedriver cache not populated: {e}", file=sys.stderr)
+    if warm:
+        import profile_templates
+        from browser_pool import get_pool
+        for portal in warm:
+            try:
+                if portal in profile_templates.TEMPLATE_RECIPES and profile_templates.load_seed(portal) is None:
+                    profile_templates.build_template(portal)
+            except Exception as e:
+                print(f"⚠️ Could not build {portal} profile template: {e}", file=sys.stderr)
+            try:
+                get_pool().warm(portal)
+            except Exception as e:
+                print(f"⚠️ Could not warm {portal} browsers: {e}", file=sys.stderr)
+
+    EventStream(sys.stdout).emit("ready", pid=os.getpid(), preloaded=loaded, socket=socket_path)
+    if socket_path:
+        serve_socket(socket_path)
+    else:
+        serve_stdio()
+    sys.exit(0)
+
+
+# -----------------------------------------------------------------------------
+# ONE-SHOT MODE
+# -----------------------------------------------------------------------------
 def main():
+    if '--worker' in sys.argv:
+        worker_main(sys.argv)
+
     try:
         if len(sys.argv) < 3:
             print(json.dumps({
                 "success": False,
-                "error": "Usage: script_wrapper.py <script_name> <file_path>"
+                "error": "Usage: script_wrapper.py <script_name> <file_path> | script_wrapper.py --worker [--socket PATH]"
             }), file=sys.stderr)
             sys.exit(1)
 
@@ -43,12 +264,12 @@ def main():
         elif script_name == 'ctg_port_tracking':
             from ctg_port_tracking import CtgPortTrackingAutomation
             automation = CtgPortTrackingAutomation(headless=True)
-            success = automation.run_automation(file_path)
+            success = automation.run(file_path)
             results = getattr(automation, 'results', [])
 
         elif script_name == 'egm_download':
             from egm_download import main as egm_main
-            success = egm_main() == 0
+            success = egm_main(['egm_download.py', file_path, 'results']) == 0
             results = []
 
         elif script_name == 'example_automation':
@@ -94,4 +315,4 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Encrypted Portal Session Vault (shared by the login-based scripts)
+Author: Izaz Ahamed
+------------------------------------------------------------
+✅ After a login, the portal session (first-party cookies, localStorage, landing
+   URL) is saved per portal + SPF user + portal login, AES-GCM encrypted, with an expiry
+✅ The next job restores it and checks it with a cheap probe (one HTTP GET
+   and/or one page load looking for a logged-in marker) instead of logging in
+✅ Stale or rejected sessions are dropped on the spot, the caller logs in normally
+✅ Key from SPF_SESSION_VAULT_KEY (or the server's CREDENTIAL_ENCRYPTION_KEY);
+   no key or no `cryptography` package → vault off, every job logs in as before
+✅ Entries are keyed by a keyed hash of (SPF user id, portal username) and only
+   handed out when the stored password hash matches: another SPF user, or the
+   same user after a password change, never gets the session (changed → dropped)
+✅ No SPF user id (--spf-user, script run by hand) → vault off
+"""
+
+import os, json, time, hmac, hashlib, sqlite3, logging, threading
+
+from profile_templates import capture_seed
+
+logger = logging.getLogger("SessionVault")
+
+# -----------------------------------------------------------------------------
+# CONFIGURATION
+# -----------------------------------------------------------------------------
+VAULT_DB = os.environ.get(
+    "SPF_SESSION_VAULT",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "session_vault.sqlite3")
+)
+VAULT_SECRET = os.environ.get("SPF_SESSION_VAULT_KEY") or os.environ.get("CREDENTIAL_ENCRYPTION_KEY")
+VAULT_DISABLED = os.environ.get("SPF_SESSION_VAULT_DISABLE", "0") == "1"
+PROBE_TIMEOUT = 8
+HTTP_PROBE_TIMEOUT = 10
+
+# Seconds a saved session is trusted before it is not even probed (portal idle timeouts)
+VAULT_TTLS = {
+    "bb_exp": 20 * 60,
+    "epb": 30 * 60,
+}
+DEFAULT_TTL = 15 * 60
+
+# Entries of the first layout were keyed by portal username only: dropped on open
+SCHEMA = """
+DROP TABLE IF EXISTS sessions;
+CREATE TABLE IF NOT EXISTS portal_sessions (
+    portal     TEXT NOT NULL,
+    owner_hash TEXT NOT NULL,
+    cred_hash  TEXT NOT NULL,
+    blob       BLOB NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (portal, owner_hash)
+);
+"""
+
+
+class SessionVault:
+    """Saved sessions of one account: SPF user `owner` logged in as `username`/`password`"""
+
+    def __init__(self, owner, username, password, db_path=VAULT_DB, secret=VAULT_SECRET, log=None):
+        self.db_path = db_path
+        self.log = log or logger
+        self.reused = self.saved = self.rejected = 0
+        self._local = threading.local()
+        self._aead = None
+        self._mac_key = None
+        if VAULT_DISABLED or not secret:
+            return
+        if not owner:
+            self.log.info("ℹ️ Session vault off: no SPF user id for this job")
+            return
+        try:
+            from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+        except ImportError:
+            self.log.info("ℹ️ Session vault off: the cryptography package is not installed")
+            return
+        key = hashlib.sha256(b"spf-session-vault|" + secret.encode()).digest()
+        self._aead = AESGCM(key)
+        self._mac_key = hashlib.sha256(b"spf-session-user|" + secret.encode()).digest()
+        self._owner_hash = self._mac("owner", owner, username)
+        self._cred_hash = self._mac("cred", owner, username, password)
+        try:
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+            self._db().executescript(SCHEMA)
+        except sqlite3.Error as e:
+            self.log.warning(f"⚠️ Session vault unavailable: {e}")
+            self._aead = None
+
+    @property
+    def enabled(self):
+        return self._aead is not None
+
+    # -------------------------------------------------------------
+    # Storage helpers
+    # -------------------------------------------------------------
+    def _db(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _mac(self, *parts):
+        message = json.dumps([str(p) for p in parts]).encode()
+        return hmac.new(self._mac_key, message, hashlib.sha256).hexdigest()
+
+    def _aad(self, portal):
+        return f"{portal}|{self._owner_hash}|{self._cred_hash}".encode()
+
+    def _seal(self, portal, state):
+        nonce = os.urandom(12)
+        return nonce + self._aead.encrypt(nonce, json.dumps(state).encode(), self._aad(portal))
+
+    def _open(self, portal, blob):
+        blob = bytes(blob)
+        return json.loads(self._aead.decrypt(blob[:12], blob[12:], self._aad(portal)))
+
+    # -------------------------------------------------------------
+    # Public API
+    # -------------------------------------------------------------
+    def load(self, portal):
+        """Saved session state, or None (missing, expired, credentials changed or undecryptable)"""
+        if not self.enabled:
+            return None
+        row = self._db().execute("SELECT blob, expires_at, cred_hash FROM portal_sessions "
+                                 "WHERE portal=? AND owner_hash=?", (portal, self._owner_hash)).fetchone()
+        if row is None:
+            return None
+        if not hmac.compare_digest(row[2], self._cred_hash):
+            self.log.info(f"🔓 {portal} credentials changed since the session was saved, dropped")
+            self.drop(portal)
+            return None
+        if row[1] <= time.time():
+            self.drop(portal)
+            return None
+        try:
+            return self._open(portal, row[0])
+        except Exception:
+            self.log.warning(f"⚠️ Saved {portal} session could not be decrypted (key changed?), dropped")
+            self.drop(portal)
+            return None
+
+    def store(self, portal, state, ttl=None):
+        if not self.enabled:
+            return
+        now = time.time()
+        expires_at = now + (ttl or VAULT_TTLS.get(portal, DEFAULT_TTL))
+        # Never trust the session longer than its shortest-lived persistent cookie
+        cookie_expiry = [c["expires"] for c in state.get("cookies", []) if c.get("expires", -1) > 0]
+        if cookie_expiry:
+            expires_at = min(expires_at, min(cookie_expiry))
+        db = self._db()
+        with db:
+            db.execute("INSERT OR REPLACE INTO portal_sessions (portal, owner_hash, cred_hash, blob, created_at, "
+                       "expires_at) VALUES (?, ?, ?, ?, ?, ?)",
+                       (portal, self._owner_hash, self._cred_hash, self._seal(portal, state), now, expires_at))
+            db.execute("DELETE FROM portal_sessions WHERE expires_at <= ?", (now,))
+        self.saved += 1
+
+    def drop(self, portal):
+        if not self.enabled:
+            return
+        db = self._db()
+        with db:
+            db.execute("DELETE FROM portal_sessions WHERE portal=? AND owner_hash=?", (portal, self._owner_hash))
+
+
+# -----------------------------------------------------------------------------
+# BROWSER HELPERS
+# -----------------------------------------------------------------------------
+def capture_session(driver):
+    """Cookies + localStorage + current URL of a logged-in tab"""
+    state = capture_seed(driver)
+    state["url"] = driver.current_url
+    return state
+
+
+def http_probe(state, marker, user_agent=None):
+    """One plain GET of the saved landing URL with the saved cookies; True if the
+    logged-in marker text is in the page"""
+    import requests
+
+    jar = requests.cookies.RequestsCookieJar()
+    for c in state.get("cookies", []):
+        jar.set(c["name"], c["value"], domain=c.get("domain"), path=c.get("path", "/"))
+    headers = {"User-Agent": user_agent} if user_agent else {}
+    try:
+        resp = requests.get(state["url"], cookies=jar, headers=headers, timeout=HTTP_PROBE_TIMEOUT)
+    except requests.RequestException:
+        return False
+    return resp.ok and marker in resp.text
+
+
+def resume(vault, driver, portal, marker, http_marker=None):
+    """Restore a saved session into driver and confirm it; True if the job can skip login.
+    marker: (By, value) present only when logged in; http_marker: text for the HTTP probe"""
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.common.exceptions import TimeoutException
+
+    state = vault.load(portal)
+    if not state:
+        return False
+    started = time.time()
+    if http_marker:
+        user_agent = driver.execute_script("return navigator.userAgent")
+        if not http_probe(state, http_marker, user_agent):
+            vault.rejected += 1
+            vault.drop(portal)
+            vault.log.info(f"🔓 Saved {portal} session no longer valid, logging in")
+            return False
+
+    if state.get("cookies"):
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setCookies", {"cookies": state["cookies"]})
+    driver.get(state["url"])
+    if state.get("local_storage"):
+        driver.execute_script("var items = arguments[0]; for (var k in items) localStorage.setItem(k, items[k]);",
+                              state["local_storage"])
+        driver.refresh()
+    try:
+        WebDriverWait(driver, PROBE_TIMEOUT).until(EC.presence_of_element_located(marker))
+    except TimeoutException:
+        vault.rejected += 1
+        vault.drop(portal)
+        vault.log.info(f"🔓 Saved {portal} session rejected by the portal, logging in")
+        return False
+
+    vault.reused += 1
+    vault.log.info(f"♻️ Reused saved {portal} session ({(time.time() - started) * 1000:.0f}ms, login skipped)")
+    # Cookies may have rotated; keep the vault copy fresh
+    save(vault, driver, portal)
+    return True
+
+
+def save(vault, driver, portal):
+    """Store the session of a freshly logged-in driver (never fails the job)"""
+    if not vault.enabled:
+        return
+    try:
+        vault.store(portal, capture_session(driver))
+    except Exception as e:
+        vault.log.warning(f"⚠️ Could not save {portal} session: {e}")
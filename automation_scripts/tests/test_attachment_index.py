@@ -0,0 +1,41 @@
+"""AttachmentIndex lookups: whole-token fuzzy matches, ambiguity"""
+
+import os, sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from attachment_index import AttachmentIndex, AmbiguousAttachment
+
+
+@pytest.fixture
+def index(tmp_path):
+    for name in ("2025_001_invoice.pdf", "A12_invoice.pdf", "INV-2025-01 commercial invoice.pdf",
+                 "X_77_2026_bol.pdf", "X_77_2027_bol.pdf", "2025001bol.pdf"):
+        (tmp_path / name).write_bytes(b"%PDF")
+    return AttachmentIndex(str(tmp_path))
+
+
+def found(path):
+    return os.path.basename(path) if path else None
+
+
+@pytest.mark.parametrize("invoice_no", ["5001", "1", "A1"])
+def test_part_of_a_token_never_matches(index, invoice_no):
+    assert index.find(invoice_no, "invoice") is None
+
+
+@pytest.mark.parametrize("invoice_no, doc_type, name", [
+    ("2025001", "invoice", "2025_001_invoice.pdf"),
+    ("A12", "invoice", "A12_invoice.pdf"),
+    ("inv 2025/01", "invoice", "INV-2025-01 commercial invoice.pdf"),
+    ("2025001", "bol", "2025001bol.pdf"),
+])
+def test_whole_token_matches(index, invoice_no, doc_type, name):
+    assert found(index.find(invoice_no, doc_type)) == name
+
+
+def test_several_fuzzy_matches_are_ambiguous(index):
+    with pytest.raises(AmbiguousAttachment):
+        index.find("77", "bol")
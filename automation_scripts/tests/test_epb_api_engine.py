@@ -0,0 +1,169 @@
+"""EpbApiEngine submit/verify against the local stand-in (epb_api_standin.py)"""
+
+import os, sys
+
+import pytest
+
+pytest.importorskip("requests")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from epb_api_engine import EpbApiEngine, EpbApiError
+from epb_api_standin import EpbStandIn, STANDIN_TOKEN
+
+
+class FakeDriver:
+    """Just enough of a logged-in Chrome for sync_auth()"""
+
+    def execute_script(self, script):
+        return "Mozilla/5.0" if "userAgent" in script else STANDIN_TOKEN
+
+    def get_cookies(self):
+        return [{"name": "JSESSIONID", "value": "standin", "path": "/"}]
+
+    def get_log(self, kind):
+        return []
+
+
+@pytest.fixture
+def standin():
+    server = EpbStandIn()
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def engine(standin):
+    eng = EpbApiEngine(FakeDriver(), base_url=standin.base_url)
+    yield eng
+    eng.close()
+
+
+@pytest.fixture
+def attachments(tmp_path):
+    paths = {}
+    for doc_type in ("invoice", "bol"):
+        path = tmp_path / f"{doc_type}.pdf"
+        path.write_bytes(b"%PDF-1.4 stand-in")
+        paths[doc_type] = str(path)
+    return paths
+
+
+PAYLOAD = {"invoiceNo": "INV-001", "invoiceDate": "2026-01-15"}
+HS_CODE = {"hsCode": "6109.10", "quantity": 100}
+
+
+def test_submit_and_verify(standin, engine, attachments):
+    soo_id = engine.submit(PAYLOAD, HS_CODE, attachments)
+
+    record = standin.records[soo_id]
+    assert record["status"] == "SAVED"
+    assert sorted(record["documents"]) == ["BILL_OF_LADING", "COMMERCIAL_INVOICE"]
+    assert engine.verify([(soo_id, "INV-001")]) == []
+    assert engine.verify([(soo_id, "INV-999")]) == ["INV-999"]
+
+
+def test_lost_save_answer_is_reconciled(standin, engine, attachments):
+    standin.faults["save"] = 502
+
+    soo_id = engine.submit(PAYLOAD, HS_CODE, attachments)
+
+    assert standin.records[soo_id]["status"] == "SAVED"
+    assert standin.calls.count("create") == 1
+    assert engine.submitted == 1 and engine.unfinished == 0
+
+
+def test_failure_after_create_reports_the_soo(standin, engine, attachments):
+    standin.faults["upload"] = 500
+
+    with pytest.raises(EpbApiError) as info:
+        engine.submit(PAYLOAD, HS_CODE, attachments)
+
+    assert not info.value.fallback_safe
+    assert info.value.soo_id in standin.records
+    assert standin.records[info.value.soo_id]["status"] == "DRAFT"
+    assert engine.unfinished == 1
+
+
+def test_refused_create_is_safe_to_retry_in_browser(standin, engine, attachments):
+    standin.faults["create"] = 403
+
+    with pytest.raises(EpbApiError) as info:
+        engine.submit(PAYLOAD, HS_CODE, attachments)
+
+    assert info.value.fallback_safe
+
+
+def test_create_gateway_error_is_ambiguous(standin, engine, attachments):
+    standin.faults["create"] = 504
+
+    with pytest.raises(EpbApiError) as info:
+        engine.submit(PAYLOAD, HS_CODE, attachments)
+
+    assert info.value.ambiguous and not info.value.fallback_safe
+
+
+@pytest.fixture
+def rex(tmp_path, monkeypatch, attachments):
+    """rex_submission wired to a temp job directory, as run() sets it up"""
+    pytest.importorskip("selenium")
+    import rex_submission
+    from progress import JobProgress
+
+    monkeypatch.setattr(rex_submission, "OUTPUT_DIR", str(tmp_path))
+    monkeypatch.setattr(rex_submission, "RESULT_LOG", str(tmp_path / "results.csv"))
+    monkeypatch.setattr(rex_submission, "PROGRESS", JobProgress(str(tmp_path), total=1, job_id="t"))
+    monkeypatch.setattr(rex_submission, "find_pdf_file", lambda invoice_no, doc_type: attachments[doc_type])
+    monkeypatch.setattr(rex_submission, "JOURNAL", None)
+    restart(rex_submission)
+    yield rex_submission
+    rex_submission.JOURNAL.close()
+
+
+def restart(rex):
+    """What a restarted job sees: the journal reloaded from disk"""
+    from job_journal import JobJournal
+
+    if rex.JOURNAL:
+        rex.JOURNAL.close()
+    rex.JOURNAL = JobJournal(rex.OUTPUT_DIR, "t")
+
+
+ROW = {"InvoiceNo": "INV-001", "InvoiceDate": "15/01/2026", "HSCode": "6109.10", "Quantity": "100"}
+
+
+def test_restart_after_failed_upload_never_creates_again(standin, engine, rex):
+    standin.faults["upload"] = 500
+    assert rex.submit_via_api(engine, FakeDriver(), ROW, 1, []) is False
+
+    standin.faults.clear()
+    restart(rex)
+    pending, resumed, done = rex.resume_rows([ROW])
+    assert pending == [] and done == 0 and len(resumed) == 1
+
+    idx, row, entry = resumed[0]
+    assert rex.reconcile_resumed(engine, FakeDriver(), idx, row, entry) is False
+    assert standin.calls.count("create") == 1
+
+
+def test_restart_counts_soo_saved_on_the_portal_as_done(standin, engine, rex):
+    standin.faults["upload"] = 500
+    assert rex.submit_via_api(engine, FakeDriver(), ROW, 1, []) is False
+    soo_id = next(iter(standin.records))
+    standin.records[soo_id]["status"] = "SAVED"      # finished by hand on the portal
+
+    restart(rex)
+    _, resumed, _ = rex.resume_rows([ROW])
+    assert rex.reconcile_resumed(engine, FakeDriver(), *resumed[0]) is True
+
+    restart(rex)
+    pending, resumed, done = rex.resume_rows([ROW])
+    assert (pending, resumed, done) == ([], [], 1)
+    assert standin.calls.count("create") == 1
+
+
+def test_verify_counts_unreachable_soo_as_unverified(standin, engine, attachments):
+    soo_id = engine.submit(PAYLOAD, HS_CODE, attachments)
+    standin.stop()        # connection refused from here on
+
+    assert engine.verify([(soo_id, "INV-001")]) == ["INV-001"]
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Event-Driven Wait Engine (replaces fixed time.sleep calls)
+Author: Izaz Ahamed
+------------------------------------------------------------
+✅ Waits on real readiness signals instead of fixed sleeps:
+   DOM readyState, jQuery/APEX, Angular $http and PrimeFaces (JSF) pending
+   requests, in-flight XHR/fetch and resource-timing network idle
+✅ Download-complete check (no .crdownload/.part, size stable)
+✅ Per-portal wait profiles (timeouts, idle window, busy overlays)
+✅ Records how much time each replaced sleep saved
+"""
+
+import os, time, logging, threading
+
+from selenium.webdriver.support.ui import WebDriverWait
+
+logger = logging.getLogger("WaitEngine")
+
+# idle_ms: how long the network must stay quiet; busy_selectors: loading overlays
+WAIT_PROFILES = {
+    "default": {"timeout": 20, "poll": 0.1, "idle_ms": 300, "busy_selectors": []},
+    "maersk": {"timeout": 20, "poll": 0.1, "idle_ms": 500, "busy_selectors": []},
+    "cpatos": {"timeout": 20, "poll": 0.1, "idle_ms": 300, "busy_selectors": []},
+    "customs": {"timeout": 25, "poll": 0.1, "idle_ms": 300, "busy_selectors": [".ui-blockui", ".ui-dialog-loading"]},
+    "bb_exp": {"timeout": 25, "poll": 0.1, "idle_ms": 300, "busy_selectors": [".u-Processing"]},
+    "epb": {"timeout": 30, "poll": 0.1, "idle_ms": 300, "busy_selectors": [".k-loading-mask"]},
+}
+
+# Counts in-flight XHR/fetch in every frame; installed once per browser
+INFLIGHT_TRACKER_JS = """
+(function () {
+  if (window.__spfInflightInstalled) return;
+  window.__spfInflightInstalled = true;
+  window.__spfInflight = 0;
+  var done = function () { window.__spfInflight = Math.max(0, window.__spfInflight - 1); };
+  var send = XMLHttpRequest.prototype.send;
+  XMLHttpRequest.prototype.send = function () {
+    window.__spfInflight++;
+    this.addEventListener('loadend', done);
+    return send.apply(this, arguments);
+  };
+  if (window.fetch) {
+    var origFetch = window.fetch;
+    window.fetch = function () {
+      window.__spfInflight++;
+      return origFetch.apply(this, arguments).finally(done);
+    };
+  }
+})();
+"""
+
+BUSY_STATE_JS = """
+var busy = [];
+if (document.readyState !== 'complete') busy.push('document');
+try { if (window.jQuery && jQuery.active > 0) busy.push('jquery'); } catch (e) {}
+try { if (window.apex && apex.jQuery && apex.jQuery.active > 0) busy.push('apex'); } catch (e) {}
+try {
+  if (window.angular) {
+    var inj = angular.element(document.body).injector();
+    if (inj && inj.get('$http').pendingRequests.length > 0) busy.push('angular');
+  }
+} catch (e) {}
+try {
+  if (window.PrimeFaces && PrimeFaces.ajax && PrimeFaces.ajax.Queue && !PrimeFaces.ajax.Queue.isEmpty()) busy.push('jsf');
+} catch (e) {}
+if (window.__spfInflight > 0) busy.push('xhr');
+var sels = arguments[0] || [];
+for (var i = 0; i < sels.length; i++) {
+  var els = document.querySelectorAll(sels[i]);
+  for (var j = 0; j < els.length; j++) {
+    if (els[j].offsetParent !== null) { busy.push(sels[i]); break; }
+  }
+}
+return {busy: busy, resources: performance.getEntriesByType('resource').length};
+"""
+
+
+class WaitStats:
+    """Time saved per replaced sleep, shared by every engine of a job"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.by_label = {}
+
+    def record(self, label, waited, replaces):
+        with self._lock:
+            entry = self.by_label.setdefault(label, {"count": 0, "waited": 0.0, "replaced": 0.0})
+            entry["count"] += 1
+            entry["waited"] += waited
+            entry["replaced"] += replaces
+
+    def summary(self):
+        with self._lock:
+            waited = sum(e["waited"] for e in self.by_label.values())
+            replaced = sum(e["replaced"] for e in self.by_label.values())
+            return {"waited": round(waited, 2), "replaced": round(replaced, 2),
+                    "saved": round(max(0.0, replaced - waited), 2),
+                    "by_label": {k: dict(v) for k, v in self.by_label.items()}}
+
+    def log_summary(self, log=None):
+        log = log or logger
+        s = self.summary()
+        log.info(f"⏱️ Waits: {s['waited']:.1f}s spent vs {s['replaced']:.1f}s of fixed sleeps "
+                 f"(saved {s['saved']:.1f}s)")
+        for label, e in s["by_label"].items():
+            log.info(f"   • {label}: {e['count']}× avg {e['waited'] / e['count']:.2f}s "
+                     f"(was {e['replaced'] / e['count']:.1f}s)")
+
+
+class WaitEngine:
+    def __init__(self, driver, portal="default", stats=None):
+        self.driver = driver
+        self.profile = WAIT_PROFILES.get(portal, WAIT_PROFILES["default"])
+        self.stats = stats or WaitStats()
+        try:
+            driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": INFLIGHT_TRACKER_JS})
+            driver.execute_script(INFLIGHT_TRACKER_JS)
+        except Exception as e:
+            logger.debug(f"In-flight tracker not installed: {e}")
+
+    def _finish(self, label, started, replaces):
+        waited = time.time() - started
+        self.stats.record(label, waited, replaces)
+        if replaces:
+            logger.debug(f"⏱️ {label}: {waited:.2f}s (fixed sleep was {replaces:.1f}s)")
+        return waited
+
+    # -------------------------------------------------------------
+    def until(self, condition, label, replaces=0.0, timeout=None):
+        """WebDriverWait on a condition; raises TimeoutException like WebDriverWait"""
+        started = time.time()
+        try:
+            return WebDriverWait(self.driver, timeout or self.profile["timeout"],
+                                 poll_frequency=self.profile["poll"]).until(condition)
+        finally:
+            self._finish(label, started, replaces)
+
+    def settle(self, label, replaces=0.0, timeout=None):
+        """Wait until the page is loaded, no framework/XHR work is pending and
+        the network has been quiet for the profile's idle window.
+        Never raises: on timeout it returns False and the caller carries on,
+        exactly like the fixed sleep it replaces."""
+        started = time.time()
+        deadline = started + (timeout or self.profile["timeout"])
+        idle_s = self.profile["idle_ms"] / 1000.0
+        last_resources, quiet_since = None, None
+        settled = False
+        while time.time() < deadline:
+            try:
+                state = self.driver.execute_script(BUSY_STATE_JS, self.profile["busy_selectors"])
+            except Exception:
+                state = None
+            now = time.time()
+            if state and not state["busy"]:
+                if state["resources"] != last_resources:
+                    last_resources, quiet_since = state["resources"], now
+                elif now - quiet_since >= idle_s:
+                    settled = True
+                    break
+            else:
+                last_resources, quiet_since = None, None
+            time.sleep(self.profile["poll"])
+        self._finish(label, started, replaces)
+        if not settled:
+            logger.debug(f"⚠️ {label}: page still busy after timeout, continuing")
+        return settled
+
+    def download_complete(self, path, label="download", replaces=0.0, timeout=None):
+        """Wait until a browser download at path is complete and its size is stable"""
+        started = time.time()
+        deadline = started + (timeout or self.profile["timeout"])
+        last_size = -1
+        try:
+            while time.time() < deadline:
+                if os.path.exists(path) and not any(os.path.exists(path + ext) for ext in (".crdownload", ".part")):
+                    size = os.path.getsize(path)
+                    if size > 0 and size == last_size:
+                        return True
+                    last_size = size
+                time.sleep(max(self.profile["poll"], 0.2))
+            return False
+        finally:
+            self._finish(label, started, replaces)
@@ -3,6 +3,13 @@ const fs = require('fs');
 const path = require('path');
 const { spawn } = require('child_process');
 const archiver = require('archiver');
+const pythonWorkerPool = require('./services/pythonWorkerPool.cjs');
+const jobQueue = require('./services/jobQueue.cjs');
+
+const RESULTS_DIR = path.join(__dirname, '../results');
+const PUBLISHED_PDFS_DIR = path.join(RESULTS_DIR, 'pdfs');
+// Script exit code when the portal's circuit breaker is open (automation_scripts/circuit_breaker.py)
+const EXIT_PORTAL_DOWN = 3;
 
 class BulkUploadService {
   static async parseCSVFile(filePath) {
@@ -87,12 +94,73 @@ class BulkUploadService {
     }
   }
 
-  static async runAutomationScript(scriptPath, inputFile, rowData) {
-    return new Promise((resolve, reject) => {
-      const pythonProcess = spawn('python3', [scriptPath, inputFile]);
+  /**
+   * Hard-link (or copy) the row's result out of its private output directory into
+   * results/pdfs, where the bulk zip and /api/download/pdf read it from.
+   * The file comes from the row's manifest.json — results/pdfs is never scanned.
+   */
+  static publishRowResult(outputDir, rowJobId) {
+    const manifest = jobQueue.readManifest(outputDir);
+    const artifacts = (manifest && manifest.artifacts) || [];
+    const primary = artifacts.find(a => a.kind === 'row') || artifacts.find(a => a.kind === 'report');
+    if (!primary) return [];
+
+    const source = path.join(outputDir, primary.path);
+    const published = `${rowJobId}_${path.basename(primary.path)}`;
+    const target = path.join(PUBLISHED_PDFS_DIR, published);
+    fs.mkdirSync(PUBLISHED_PDFS_DIR, { recursive: true });
+    try {
+      fs.linkSync(source, target);
+    } catch (error) {
+      fs.copyFileSync(source, target);
+    }
+    return [published];
+  }
 
+  static async runAutomationScript(scriptPath, inputFile, rowData) {
+    return new Promise(async (resolve, reject) => {
       let outputData = '';
       let errorData = '';
+      const rowJobId = `bulk_${path.basename(inputFile, '.csv')}`;
+      const outputDir = path.join(RESULTS_DIR, 'bulk', rowJobId);
+      fs.mkdirSync(outputDir, { recursive: true });
+      const args = [inputFile, outputDir, rowJobId];
+
+      const handleExit = (code) => {
+        let result;
+        if (code === 0) {
+          try {
+            result = {
+              success: true,
+              resultFiles: this.publishRowResult(outputDir, rowJobId),
+              output: outputData
+            };
+          } catch (error) {
+            result = { success: false, error: `Could not publish result: ${error.message}` };
+          }
+        } else if (code === EXIT_PORTAL_DOWN) {
+          result = { success: false, error: 'Portal not responding, row not attempted' };
+        } else {
+          result = {
+            success: false,
+            error: errorData || 'Script execution failed'
+          };
+        }
+        fs.rmSync(outputDir, { recursive: true, force: true });
+        resolve(result);
+      };
+
+      if (pythonWorkerPool.isEnabled()) {
+        const { code } = await pythonWorkerPool.runScript(path.basename(scriptPath), args, {
+          jobId: rowJobId,
+          onStdout: (text) => { outputData += text; },
+          onStderr: (text) => { errorData += text; }
+        });
+        handleExit(code);
+        return;
+      }
+
+      const pythonProcess = spawn('python3', [scriptPath, ...args]);
 
       pythonProcess.stdout.on('data', (data) => {
         outputData += data.toString();
@@ -102,31 +170,7 @@ class BulkUploadService {
         errorData += data.toString();
       });
 
-      pythonProcess.on('close', (code) => {
-        if (code === 0) {
-          const resultsDir = path.join(__dirname, '../results/pdfs');
-          const resultFiles = fs.existsSync(resultsDir)
-            ? fs.readdirSync(resultsDir)
-                .filter(f => f.includes(Date.now().toString().substring(0, 8)))
-                .sort((a, b) => {
-                  const statA = fs.statSync(path.join(resultsDir, a));
-                  const statB = fs.statSync(path.join(resultsDir, b));
-                  return statB.mtimeMs - statA.mtimeMs;
-                })
-            : [];
-
-          resolve({
-            success: true,
-            resultFiles: resultFiles.slice(0, 1),
-            output: outputData
-          });
-        } else {
-          resolve({
-            success: false,
-            error: errorData || 'Script execution failed'
-          });
-        }
-      });
+      pythonProcess.on('close', handleExit);
 
       pythonProcess.on('error', (error) => {
         resolve({
@@ -962,7 +962,8 @@ app.post('/api/credentials/test', async (req, res) => {
       'test',
       credentials.username,
       credentials.password,
-      '--test-only'
+      '--test-only',
+      `--spf-user=${userId}`
     ], { timeout: 60000 });
 
     let output = '';
@@ -1000,6 +1001,8 @@ app.post('/api/credentials/test', async (req, res) => {
         let errorMessage = 'Invalid credentials';
         if (code === 2) {
           errorMessage = 'Invalid username or password';
+        } else if (code === 3) {
+          errorMessage = 'Portal not responding - credentials were not checked, try again later';
         } else if (errorOutput.includes('CONNECTION')) {
           errorMessage = 'Connection error - please check your internet connection';
         } else if (errorOutput.includes('timeout')) {
@@ -1356,6 +1359,19 @@ app.get('/api/download/job/:jobId/:filename', async (req, res) => {
     }
 
     const filePath = path.join(job.output_directory, filename);
+    const manifest = JobQueue.readManifest(job.output_directory);
+
+    if (manifest) {
+      // Listed files only; size and hash come from the manifest, no directory lookups
+      const entry = manifest.byPath.get(filename.split(path.sep).join('/'));
+      if (!entry) {
+        return res.status(404).json({ error: 'File not found' });
+      }
+      if (entry.sha256) res.set('ETag', `"${entry.sha256}"`);
+      return res.download(filePath, (error) => {
+        if (error && !res.headersSent) res.status(404).json({ error: 'File not found' });
+      });
+    }
 
     if (!fs.existsSync(filePath)) {
       return res.status(404).json({ error: 'File not found' });
@@ -1368,6 +1384,26 @@ app.get('/api/download/job/:jobId/:filename', async (req, res) => {
   }
 });
 
+app.get('/api/jobs/:jobId/manifest', async (req, res) => {
+  try {
+    const job = await DatabaseService.getJob(req.params.jobId);
+
+    if (!job) {
+      return res.status(404).json({ success: false, message: 'Job not found' });
+    }
+
+    const manifest = job.output_directory ? JobQueue.readManifest(job.output_directory) : null;
+    if (!manifest) {
+      return res.status(404).json({ success: false, message: 'No manifest for this job' });
+    }
+
+    res.json({ success: true, manifest });
+  } catch (error) {
+    console.error('Manifest error:', error);
+    res.status(500).json({ success: false, message: error.message });
+  }
+});
+
 app.get('/api/jobs/:jobId/status', async (req, res) => {
   try {
     const { jobId } = req.params;
@@ -1383,8 +1419,11 @@ app.get('/api/jobs/:jobId/status', async (req, res) => {
     }
 
     let progress = 0;
+    const rowProgress = job.status === 'processing' ? JobQueue.getProgress(jobId) : null;
     if (job.status === 'processing') {
-      if (job.started_at) {
+      if (rowProgress && rowProgress.total > 0) {
+        progress = Math.min(rowProgress.percent, 99);
+      } else if (job.started_at) {
         const elapsedSeconds = Math.floor((Date.now() - new Date(job.started_at).getTime()) / 1000);
         const estimatedDuration = 30;
         progress = Math.min(Math.floor((elapsedSeconds / estimatedDuration) * 100), 95);
@@ -1400,6 +1439,7 @@ app.get('/api/jobs/:jobId/status', async (req, res) => {
         status: job.status,
         queuePosition,
         progress,
+        rows: rowProgress,
         serviceName: job.service_name,
         fileName: job.input_file_name,
         resultFiles: job.result_files,
@@ -1456,64 +1496,48 @@ app.post('/api/track-container', async (req, res) => {
     fs.writeFileSync(tempFile, `FCR Number\n${trackingNumber}`);
 
     const scriptPath = path.join(__dirname, '..', 'automation_scripts/damco_tracking_maersk.py');
-    const pythonProcess = spawn('python3', [scriptPath, tempFile]);
-
-    let outputData = '';
-    let errorData = '';
-
-    pythonProcess.stdout.on('data', (data) => {
-      outputData += data.toString();
-    });
-
-    pythonProcess.stderr.on('data', (data) => {
-      errorData += data.toString();
-    });
-
-    pythonProcess.on('close', async (code) => {
-      fs.unlinkSync(tempFile);
-
-      if (code === 0) {
-        const resultsDir = path.join(__dirname, '../results/pdfs');
-        const resultFiles = fs.existsSync(resultsDir)
-          ? fs.readdirSync(resultsDir).filter(f => f.includes(trackingNumber))
-          : [];
-
-        const downloadUrl = resultFiles.length > 0
-          ? `/api/download/pdf/${resultFiles[0]}`
-          : null;
-
-        await DatabaseService.addWorkHistory(userId, {
-          serviceId: 'damco-tracking-maersk',
-          serviceName: 'Damco (APM) Tracking',
-          fileName: trackingNumber,
-          creditsUsed: 1,
-          status: 'completed',
-          resultFiles: resultFiles,
-          downloadUrl
-        });
+    // Same one-row path as bulk uploads: private output dir, result taken from its manifest
+    const result = await BulkUploadService.runAutomationScript(scriptPath, tempFile);
+    fs.unlinkSync(tempFile);
+
+    if (result.success) {
+      const resultFiles = result.resultFiles;
+
+      const downloadUrl = resultFiles.length > 0
+        ? `/api/download/pdf/${resultFiles[0]}`
+        : null;
+
+      await DatabaseService.addWorkHistory(userId, {
+        serviceId: 'damco-tracking-maersk',
+        serviceName: 'Damco (APM) Tracking',
+        fileName: trackingNumber,
+        creditsUsed: 1,
+        status: 'completed',
+        resultFiles: resultFiles,
+        downloadUrl
+      });
 
-        res.json({
-          success: true,
-          trackingData: {
-            containerNumber: trackingNumber,
-            bookingNumber: trackingNumber,
-            vessel: 'Retrieved from Maersk',
-            voyage: 'N/A',
-            status: 'In Transit',
-            location: 'Retrieved from tracking',
-            estimatedArrival: new Date(Date.now() + 7 * 24 * 60 * 60 * 1000).toLocaleDateString(),
-            events: []
-          },
-          downloadUrl
-        });
-      } else {
-        res.status(500).json({
-          success: false,
-          message: 'Tracking failed',
-          error: errorData
-        });
-      }
-    });
+      res.json({
+        success: true,
+        trackingData: {
+          containerNumber: trackingNumber,
+          bookingNumber: trackingNumber,
+          vessel: 'Retrieved from Maersk',
+          voyage: 'N/A',
+          status: 'In Transit',
+          location: 'Retrieved from tracking',
+          estimatedArrival: new Date(Date.now() + 7 * 24 * 60 * 60 * 1000).toLocaleDateString(),
+          events: []
+        },
+        downloadUrl
+      });
+    } else {
+      res.status(500).json({
+        success: false,
+        message: 'Tracking failed',
+        error: result.error
+      });
+    }
 
   } catch (error) {
     console.error('Tracking error:', error);
@@ -3,11 +3,169 @@ const path = require('path');
 const fs = require('fs');
 const { v4: uuidv4 } = require('uuid');
 const { DatabaseService } = require('../database.cjs');
+const readline = require('readline');
+const pythonWorkerPool = require('./pythonWorkerPool.cjs');
+
+// Only the tail of a job's stdout/stderr is kept (friendly-error matching needs the end)
+const MAX_LOG_TAIL = 64 * 1024;
+const MAX_ROW_ERRORS = 20;
+// Written by every script on success (automation_scripts/progress.py)
+const MANIFEST_NAME = 'manifest.json';
+const MAX_CACHED_MANIFESTS = 200;
+// Script exit code when the portal's circuit breaker is open and no row was delivered
+// (automation_scripts/circuit_breaker.py)
+const EXIT_PORTAL_DOWN = 3;
+
+function appendTail(buffer, text) {
+  const next = buffer + text;
+  return next.length > MAX_LOG_TAIL ? next.slice(next.length - MAX_LOG_TAIL) : next;
+}
 
 class JobQueue {
   constructor() {
     this.processing = new Map();
+    this.progress = new Map();
+    this.manifests = new Map();
     this.maxConcurrent = 3;
+    pythonWorkerPool.size = this.maxConcurrent;
+  }
+
+  /**
+   * Live state of a job fed by the scripts' JSON-lines progress events
+   * (automation_scripts/progress.py): job_started, row_started, row_finished,
+   * artifact, job_summary.
+   */
+  createProgressTracker(jobId) {
+    const tracker = {
+      total: 0,
+      done: 0,
+      ok: 0,
+      failed: 0,
+      startedAt: Date.now(),
+      currentRow: null,
+      rowArtifacts: new Map(),
+      jobArtifacts: [],
+      errorClasses: {},
+      recentErrors: [],
+      summary: null
+    };
+    this.progress.set(jobId, tracker);
+    return tracker;
+  }
+
+  handleProgressEvent(jobId, tracker, event) {
+    switch (event.event) {
+      case 'job_started':
+      case 'job_total':
+        tracker.total = event.total || 0;
+        break;
+      case 'row_started':
+        tracker.currentRow = { index: event.index, key: event.key };
+        break;
+      case 'row_finished':
+        tracker.done = event.done;
+        tracker.total = Math.max(tracker.total, event.total || 0);
+        if (event.status === 'ok') {
+          tracker.ok += 1;
+          if (event.artifact) tracker.rowArtifacts.set(event.index, event.artifact);
+        } else {
+          tracker.failed += 1;
+          tracker.errorClasses[event.error_class] = (tracker.errorClasses[event.error_class] || 0) + 1;
+          tracker.recentErrors.push({ index: event.index, key: event.key, errorClass: event.error_class, error: event.error });
+          if (tracker.recentErrors.length > MAX_ROW_ERRORS) tracker.recentErrors.shift();
+        }
+        console.log(`[${jobId}] 📈 Row ${event.index} ${event.status} in ${event.ms}ms (${tracker.done}/${tracker.total})`);
+        break;
+      case 'artifact':
+        tracker.jobArtifacts.push({ path: event.path, kind: event.kind });
+        break;
+      case 'job_summary':
+        tracker.summary = event;
+        break;
+      default:
+        break;
+    }
+  }
+
+  getProgress(jobId) {
+    const tracker = this.progress.get(jobId);
+    if (!tracker) return null;
+    const elapsedMinutes = (Date.now() - tracker.startedAt) / 60000;
+    return {
+      total: tracker.total,
+      done: tracker.done,
+      ok: tracker.ok,
+      failed: tracker.failed,
+      percent: tracker.total ? Math.floor((tracker.done / tracker.total) * 100) : 0,
+      rowsPerMinute: elapsedMinutes > 0 ? Math.round((tracker.done / elapsedMinutes) * 100) / 100 : 0,
+      currentRow: tracker.currentRow,
+      errorClasses: tracker.errorClasses,
+      recentErrors: tracker.recentErrors
+    };
+  }
+
+  /**
+   * Result files reported by the script: job-level reports first, then per-row
+   * PDFs in input order, then other job-level files (CSV/JSON).
+   * Returns null when the script reported nothing (older scripts) so the caller can fall back.
+   */
+  resultFilesFromProgress(tracker) {
+    if (!tracker || (tracker.jobArtifacts.length === 0 && tracker.rowArtifacts.size === 0)) {
+      return null;
+    }
+    const reports = tracker.jobArtifacts.filter(a => a.kind === 'report').map(a => a.path);
+    const others = tracker.jobArtifacts.filter(a => a.kind !== 'report').map(a => a.path);
+    const rows = [...tracker.rowArtifacts.entries()]
+      .sort((a, b) => a[0] - b[0])
+      .map(([, artifact]) => artifact)
+      .filter(artifact => artifact.startsWith('pdfs/'));
+    return [...new Set([...reports, ...rows, ...others])];
+  }
+
+  /**
+   * The job's manifest.json (artifacts with size/sha256/pages, row mapping), or null.
+   * One file read per output directory; cached until the file is replaced.
+   */
+  readManifest(outputDirectory) {
+    const manifestPath = path.join(outputDirectory, MANIFEST_NAME);
+    let mtimeMs;
+    try {
+      mtimeMs = fs.statSync(manifestPath).mtimeMs;
+    } catch (error) {
+      return null;
+    }
+    const cached = this.manifests.get(manifestPath);
+    if (cached && cached.mtimeMs === mtimeMs) return cached.manifest;
+
+    try {
+      const manifest = JSON.parse(fs.readFileSync(manifestPath, 'utf8'));
+      const byPath = new Map((manifest.artifacts || []).map(a => [a.path, a]));
+      Object.defineProperty(manifest, 'byPath', { value: byPath, enumerable: false });
+      this.manifests.delete(manifestPath);
+      this.manifests.set(manifestPath, { mtimeMs, manifest });
+      if (this.manifests.size > MAX_CACHED_MANIFESTS) {
+        this.manifests.delete(this.manifests.keys().next().value);
+      }
+      return manifest;
+    } catch (error) {
+      console.error(`❌ Unreadable ${manifestPath}:`, error.message);
+      return null;
+    }
+  }
+
+  /**
+   * Result files listed in the manifest, in the same order as resultFilesFromProgress.
+   * Returns null when there is no manifest.
+   */
+  resultFilesFromManifest(manifest) {
+    if (!manifest || !Array.isArray(manifest.artifacts)) return null;
+    const reports = manifest.artifacts.filter(a => a.kind === 'report').map(a => a.path);
+    const others = manifest.artifacts.filter(a => a.kind !== 'report' && a.kind !== 'row').map(a => a.path);
+    const rows = manifest.artifacts
+      .filter(a => a.kind === 'row' && a.path.startsWith('pdfs/'))
+      .sort((a, b) => (a.row || 0) - (b.row || 0))
+      .map(a => a.path);
+    return [...new Set([...reports, ...rows, ...others])];
   }
 
   async submitJob(userId, serviceId, uploadedFile, serviceName, creditsUsed, additionalFiles = {}) {
@@ -169,6 +327,7 @@ class JobQueue {
       }
     } finally {
       this.processing.delete(jobId);
+      this.progress.delete(jobId);
       this.processNextInQueue(serviceId, userId);
     }
   }
@@ -214,6 +373,8 @@ class JobQueue {
 
           console.log(`[${jobId}] 🔑 Using stored credentials for user: ${credentials.username}`);
           args.push(credentials.username, credentials.password);
+          // Saved portal sessions are only reused by the SPF user that logged in (session_vault.py)
+          args.push(`--spf-user=${userId}`);
         } catch (error) {
           console.error(`[${jobId}] ❌ Error fetching credentials:`, error);
           resolve({
@@ -224,40 +385,42 @@ class JobQueue {
         }
       }
 
-      const pythonProcess = spawn('python3', args, { env });
-
       let outputData = '';
       let errorData = '';
+      const tracker = this.createProgressTracker(jobId);
 
-      pythonProcess.stdout.on('data', (data) => {
-        const text = data.toString();
-        outputData += text;
+      const onStdout = (text) => {
+        outputData = appendTail(outputData, text);
         console.log(`[${jobId}]`, text.trim());
-      });
+      };
 
-      pythonProcess.stderr.on('data', (data) => {
-        const text = data.toString();
-        errorData += text;
+      const onStderr = (text) => {
+        errorData = appendTail(errorData, text);
         console.error(`[${jobId}]`, text.trim());
-      });
+      };
+
+      const onEvent = (event) => this.handleProgressEvent(jobId, tracker, event);
 
-      pythonProcess.on('close', (code) => {
+      const handleExit = (code) => {
         console.log(`[${jobId}] 🏁 Python process exited with code ${code}`);
 
         if (code === 0) {
-          const resultFiles = this.scanResultFiles(outputDirectory, jobId);
-
-          console.log(`[${jobId}] 📁 Result files:`, resultFiles);
-          console.log(`[${jobId}] 📊 PDF count from pdfs folder:`,
-            fs.existsSync(path.join(outputDirectory, 'pdfs'))
-              ? fs.readdirSync(path.join(outputDirectory, 'pdfs')).length
-              : 0
-          );
+          const fromManifest = this.resultFilesFromManifest(this.readManifest(outputDirectory));
+          const reported = fromManifest || this.resultFilesFromProgress(tracker);
+          const resultFiles = reported || this.scanResultFiles(outputDirectory, jobId);
+
+          const origin = fromManifest ? ' (manifest)' : reported ? ' (reported by script)' : '';
+          console.log(`[${jobId}] 📁 ${resultFiles.length} result file(s)${origin}`);
+          if (tracker.summary) {
+            console.log(`[${jobId}] 📊 Rows: ${tracker.summary.ok} ok, ${tracker.summary.failed} failed, ` +
+              `${tracker.summary.rows_per_min} rows/min`);
+          }
 
           resolve({
             success: true,
             resultFiles: resultFiles,
-            output: outputData
+            output: outputData,
+            summary: tracker.summary
           });
         } else if (code === 2) {
           // Exit code 2 means invalid credentials
@@ -286,6 +449,17 @@ class JobQueue {
             error: 'Invalid portal credentials. Please update your Bangladesh Bank login credentials and try again.',
             invalidCredentials: true
           });
+        } else if (code === EXIT_PORTAL_DOWN) {
+          const summary = tracker.summary || {};
+          const portal = summary.portal_down || 'the portal';
+          console.error(`[${jobId}] 🔌 ${portal} unreachable, ${summary.rows_skipped || 0} row(s) not attempted`);
+
+          resolve({
+            success: false,
+            error: `The ${portal} portal is not responding, so the job stopped without processing your rows. ` +
+              'Your credits have been refunded. Please try again later.',
+            portalUnavailable: true
+          });
         } else {
           let userFriendlyError = errorData || `Script exited with code ${code}`;
 
@@ -302,7 +476,36 @@ class JobQueue {
             error: userFriendlyError
           });
         }
+      };
+
+      if (pythonWorkerPool.isEnabled()) {
+        // Persistent worker: imports and warm browsers are reused across jobs
+        const { code } = await pythonWorkerPool.runScript(path.basename(scriptPath), args.slice(1), {
+          jobId,
+          onStdout,
+          onStderr,
+          onEvent
+        });
+        handleExit(code);
+        return;
+      }
+
+      // fd 3 carries the progress events, stdout/stderr stay plain logs
+      const pythonProcess = spawn('python3', args, {
+        env: { ...env, SPF_PROGRESS_FD: '3' },
+        stdio: ['ignore', 'pipe', 'pipe', 'pipe']
+      });
+
+      pythonProcess.stdout.on('data', (data) => onStdout(data.toString()));
+      pythonProcess.stderr.on('data', (data) => onStderr(data.toString()));
+      readline.createInterface({ input: pythonProcess.stdio[3] }).on('line', (line) => {
+        try {
+          onEvent(JSON.parse(line));
+        } catch (e) {
+          // not a progress event
+        }
       });
+      pythonProcess.on('close', handleExit);
 
       pythonProcess.on('error', (error) => {
         console.error(`[${jobId}] ❌ Process error:`, error);
@@ -336,6 +539,7 @@ class JobQueue {
         allFiles.push(...pdfFiles);
       }
 
+      // Names only, no per-file stat: row PDFs carry their zero-padded row index
       const sortedFiles = allFiles.sort((a, b) => {
         const aIsCombinedReport = a.name.includes('_report_') && a.name.endsWith('.pdf');
         const bIsCombinedReport = b.name.includes('_report_') && b.name.endsWith('.pdf');
@@ -349,9 +553,7 @@ class JobQueue {
         if (aIsPdf && !bIsPdf) return -1;
         if (!aIsPdf && bIsPdf) return 1;
 
-        const statA = fs.statSync(a.path);
-        const statB = fs.statSync(b.path);
-        return statB.mtimeMs - statA.mtimeMs;
+        return a.name.localeCompare(b.name);
       });
 
       resultFiles.push(...sortedFiles.map(f => f.prefix + f.name));
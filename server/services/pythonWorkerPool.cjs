@@ -0,0 +1,140 @@
+const { spawn } = require('child_process');
+const path = require('path');
+const readline = require('readline');
+
+const WRAPPER_PATH = path.join(__dirname, '../../automation_scripts/script_wrapper.py');
+
+/**
+ * Pool of long-running `script_wrapper.py --worker` processes.
+ * Each worker imports selenium/openpyxl/etc. once and keeps its browser pool warm,
+ * then runs one job at a time sent as a JSON line on stdin.
+ */
+class PythonWorkerPool {
+  constructor(size = 3) {
+    this.size = size;
+    this.workers = [];
+    this.waiting = [];
+  }
+
+  isEnabled() {
+    return process.env.PYTHON_WORKER_MODE === 'true';
+  }
+
+  spawnWorker() {
+    const args = [WRAPPER_PATH, '--worker'];
+    if (process.env.PYTHON_WORKER_WARM) {
+      args.push('--warm', process.env.PYTHON_WORKER_WARM);
+    }
+
+    const proc = spawn('python3', args, {
+      env: { ...process.env, PYTHONUNBUFFERED: '1' }
+    });
+
+    const worker = { proc, busy: false, ready: false, current: null };
+
+    readline.createInterface({ input: proc.stdout }).on('line', (line) => {
+      let event;
+      try {
+        event = JSON.parse(line);
+      } catch (e) {
+        if (worker.current) worker.current.onStdout(line + '\n');
+        return;
+      }
+
+      if (event.event === 'ready') {
+        worker.ready = true;
+        console.log(`🐍 Python worker ${proc.pid} ready (preloaded: ${event.preloaded.join(', ')})`);
+        return;
+      }
+
+      const job = worker.current;
+      if (!job || event.id !== job.id) return;
+
+      if (event.event === 'log') {
+        job.onStdout(event.line + '\n');
+      } else if (event.event === 'result') {
+        worker.current = null;
+        worker.busy = false;
+        job.resolve({ code: event.exit_code, error: event.error });
+        this.dispatch();
+      } else if (event.event !== 'started') {
+        job.onEvent(event);
+      }
+    });
+
+    proc.stderr.on('data', (data) => {
+      if (worker.current) {
+        worker.current.onStderr(data.toString());
+      } else {
+        console.error(`🐍 Python worker ${proc.pid}:`, data.toString().trim());
+      }
+    });
+
+    proc.on('exit', (code) => {
+      console.warn(`🐍 Python worker ${proc.pid} exited with code ${code}`);
+      this.workers = this.workers.filter(w => w !== worker);
+      if (worker.current) {
+        worker.current.resolve({ code: code || 1, error: 'Python worker exited unexpectedly' });
+      }
+      this.dispatch();
+    });
+
+    proc.on('error', (error) => {
+      console.error('🐍 Python worker spawn error:', error);
+    });
+
+    this.workers.push(worker);
+    return worker;
+  }
+
+  dispatch() {
+    while (this.waiting.length > 0) {
+      let worker = this.workers.find(w => !w.busy);
+      if (!worker && this.workers.length < this.size) {
+        worker = this.spawnWorker();
+      }
+      if (!worker) return;
+
+      const job = this.waiting.shift();
+      worker.busy = true;
+      worker.current = job;
+      worker.proc.stdin.write(JSON.stringify({ id: job.id, script: job.script, args: job.args }) + '\n');
+    }
+  }
+
+  /**
+   * Run a script in a persistent worker.
+   * Progress events (row_started, row_finished, ...) are passed to onEvent.
+   * Resolves with { code, error } once the worker reports the job result.
+   */
+  runScript(scriptName, args, { jobId, onStdout = () => {}, onStderr = () => {}, onEvent = () => {} } = {}) {
+    return new Promise((resolve) => {
+      this.waiting.push({
+        id: jobId,
+        script: scriptName,
+        args,
+        onStdout,
+        onStderr,
+        onEvent,
+        resolve
+      });
+      this.dispatch();
+    });
+  }
+
+  shutdown() {
+    for (const worker of this.workers) {
+      try {
+        worker.proc.stdin.write(JSON.stringify({ command: 'shutdown' }) + '\n');
+        worker.proc.stdin.end();
+      } catch (e) {
+        worker.proc.kill();
+      }
+    }
+    this.workers = [];
+  }
+}
+
+const pythonWorkerPoolInstance = new PythonWorkerPool();
+
+module.exports = pythonWorkerPoolInstance;